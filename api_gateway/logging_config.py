@@ -0,0 +1,157 @@
+"""
+Logging Configuration Module
+
+Configures the standard library logging once per process, modules only
+call `logging.getLogger(__name__)`.
+
+All records go through a QueueHandler to a single stderr handler, which a
+QueueListener thread writes in the background, so the request path never
+waits for I/O. The output is JSON (one object per line) unless LOG_FORMAT
+is `text`.
+
+- LOG_LEVEL: Default minimum level (INFO).
+- LOG_LEVELS: Minimum levels per logger, e.g. `httpx=WARNING,main=DEBUG`.
+- LOG_FORMAT: `json` (default) or `text`.
+- LOG_SAMPLE_RATE: Fraction of hot path records which are written.
+
+Key Components:
+- configure: Replaces the root handlers with the queue handler.
+- rate_limited: Logger for a key, which drops records above a rate.
+- sampled: Logger which drops all but a fraction of the records.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+
+TEXT_FORMAT = "%(levelname)s %(asctime)s %(name)s %(message)s"
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "name": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "suppressed", None):
+            data["suppressed"] = record.suppressed
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data)
+
+
+def parse_levels(spec: str) -> dict[str, str]:
+    """Parse `logger=LEVEL,logger=LEVEL` into a dict."""
+    levels = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure(
+    level: str = LOG_LEVEL,
+    levels: str | dict[str, str] = LOG_LEVELS,
+    format: str = LOG_FORMAT,
+    stream=sys.stderr,
+) -> None:
+    global _listener
+    if isinstance(levels, str):
+        levels = parse_levels(levels)
+
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(
+        JsonFormatter() if format == "json" else logging.Formatter(TEXT_FORMAT)
+    )
+    if _listener is not None:
+        _listener.stop()
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, handler)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(level.upper())
+    for name, module_level in levels.items():
+        logging.getLogger(name).setLevel(module_level)
+
+
+@atexit.register
+def _flush() -> None:
+    if _listener is not None:
+        _listener.stop()
+
+
+class _Discard:
+    """Stands in for the logger when a record is dropped."""
+
+    def _discard(self, *args, **kwargs) -> None:
+        pass
+
+    debug = info = warning = error = exception = log = _discard
+
+
+_DISCARD = _Discard()
+
+
+class _Bucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.suppressed = 0
+
+
+_buckets: dict[str, _Bucket] = {}
+_lock = threading.Lock()
+
+
+def rate_limited(logger: logging.Logger, key: str, rate: float = 1.0, burst: int = 10):
+    """
+    Return `logger` if records for `key` are below `rate` per second
+    (allowing bursts of `burst`), else a logger which drops the record.
+
+    Records after a suppressed period carry the number of dropped records in
+    the `suppressed` attribute.
+    """
+    with _lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = _buckets[key] = _Bucket(rate, burst)
+        now = time.monotonic()
+        bucket.tokens = min(
+            bucket.burst, bucket.tokens + (now - bucket.updated) * bucket.rate
+        )
+        bucket.updated = now
+        if bucket.tokens < 1:
+            bucket.suppressed += 1
+            return _DISCARD
+        bucket.tokens -= 1
+        suppressed, bucket.suppressed = bucket.suppressed, 0
+    if suppressed:
+        return logging.LoggerAdapter(logger, {"suppressed": suppressed})
+    return logger
+
+
+def sampled(logger: logging.Logger, rate: float = LOG_SAMPLE_RATE):
+    """Return `logger` for a `rate` fraction of calls, else drop the record."""
+    return logger if random.random() < rate else _DISCARD
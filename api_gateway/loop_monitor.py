@@ -0,0 +1,153 @@
+"""
+Loop Monitor Module
+
+Watches the asyncio event loop and the threadpool which runs the sync
+routes and dependencies.
+
+- A heartbeat task sleeps LOOP_MONITOR_INTERVAL seconds and records how
+  much later than scheduled it wakes up (event loop lag).
+- A watchdog thread checks the heartbeat. If it is overdue by more than
+  LOOP_BLOCK_THRESHOLD seconds, the loop is blocked by a callback, e.g. an
+  `async def` route doing blocking database calls, and the current stack of
+  the loop thread is logged.
+- A probe submits a no-op to the threadpool every interval and records how
+  long it waited for a free thread (threadpool queue wait).
+
+The threadpool size (THREADPOOL_SIZE, default 40 as in anyio) is set when
+the monitor starts. Active and waiting threadpool tasks are exposed as
+gauges.
+
+Key Components:
+- LoopMonitor: start / stop it from the application startup and shutdown.
+- monitor: The monitor of this process.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+import anyio.to_thread
+import logging_config
+import metrics
+
+
+LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.5"))
+LOOP_BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD", "0.1"))
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "40"))
+
+logger = logging.getLogger(__name__)
+
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+LOOP_LAG = metrics.Histogram(
+    "event_loop_lag_seconds",
+    "Delay of the event loop heartbeat behind its schedule.",
+    buckets=LAG_BUCKETS,
+)
+LOOP_BLOCKED = metrics.Counter(
+    "event_loop_blocked_total",
+    "Times the event loop was blocked longer than the threshold.",
+)
+THREADPOOL_WAIT = metrics.Histogram(
+    "threadpool_queue_wait_seconds",
+    "Time a probe task waited for a free threadpool thread.",
+    buckets=LAG_BUCKETS,
+)
+THREADPOOL_ACTIVE = metrics.Gauge(
+    "threadpool_active_threads",
+    "Threadpool threads currently running a task.",
+)
+THREADPOOL_WAITING = metrics.Gauge(
+    "threadpool_waiting_tasks",
+    "Tasks waiting for a free threadpool thread.",
+)
+THREADPOOL_LIMIT = metrics.Gauge(
+    "threadpool_size",
+    "Maximum number of threadpool threads.",
+)
+
+
+class LoopMonitor:
+    def __init__(
+        self,
+        interval: float = LOOP_MONITOR_INTERVAL,
+        threshold: float = LOOP_BLOCK_THRESHOLD,
+        threadpool_size: int = THREADPOOL_SIZE,
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self.threadpool_size = threadpool_size
+        self._tasks: list[asyncio.Task] = []
+        self._stop = threading.Event()
+        self._watchdog: threading.Thread | None = None
+        self._loop_thread: int | None = None
+        self._heartbeat = time.monotonic()
+
+    async def start(self) -> None:
+        """Start monitoring the running loop, call from the startup handler."""
+        limiter = anyio.to_thread.current_default_thread_limiter()
+        limiter.total_tokens = self.threadpool_size
+        THREADPOOL_ACTIVE.set_function(lambda: limiter.borrowed_tokens)
+        THREADPOOL_WAITING.set_function(lambda: limiter.statistics().tasks_waiting)
+        THREADPOOL_LIMIT.set_function(lambda: limiter.total_tokens)
+
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._tasks = [
+            asyncio.create_task(self._beat()),
+            asyncio.create_task(self._probe_threadpool()),
+        ]
+        self._watchdog = threading.Thread(
+            target=self._watch, name="loop-watchdog", daemon=True
+        )
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._watchdog is not None:
+            self._watchdog.join()
+            self._watchdog = None
+
+    async def _beat(self) -> None:
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self._heartbeat = time.monotonic()
+            LOOP_LAG.observe(max(0.0, self._heartbeat - start - self.interval))
+
+    async def _probe_threadpool(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            start = time.perf_counter()
+            await anyio.to_thread.run_sync(lambda: None)
+            THREADPOOL_WAIT.observe(time.perf_counter() - start)
+
+    def _watch(self) -> None:
+        reported = None
+        while not self._stop.wait(self.threshold / 2):
+            heartbeat = self._heartbeat
+            overdue = time.monotonic() - heartbeat - self.interval
+            if overdue < self.threshold or heartbeat == reported:
+                continue
+            # report every blocking callback once
+            reported = heartbeat
+            LOOP_BLOCKED.inc()
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = "".join(traceback.format_stack(frame)) if frame else ""
+            logging_config.rate_limited(logger, "loop_monitor.blocked").warning(
+                "Event loop blocked for more than %.3fs, stack of the loop thread:\n%s",
+                overdue,
+                stack,
+            )
+
+
+monitor = LoopMonitor()
@@ -13,21 +13,39 @@ Key features:
 - Health check endpoints for monitoring the gateway
 - Swagger documentation proxying for individual microservices
 - CORS middleware for cross-origin requests handling
+- Prometheus style metrics on /metrics, including upstream latencies
+- Distributed tracing, the trace context is propagated with `traceparent`
+- Opt-in sampling profiler for single requests (see profiling.py)
+- Event loop lag and threadpool saturation metrics (see loop_monitor.py)
 """
 
 import logging
 import os
+import time
+from contextlib import asynccontextmanager
 
 import httpx
+import logging_config
+import loop_monitor
+import metrics
+import profiling
+import tracing
 from fastapi import FastAPI, HTTPException, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logging_config.configure()
+    await loop_monitor.monitor.start()
+    yield
+    await loop_monitor.monitor.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
 
 USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "http://user-service:8001")
 TRACKING_SERVICE_URL = os.getenv("TRACKING_SERVICE_URL", "http://tracking-service:8002")
@@ -42,6 +60,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(metrics.MetricsMiddleware)
+app.add_route("/metrics", metrics.metrics_endpoint, include_in_schema=False)
+
+tracing.configure(service_name="api-gateway")
+app.add_middleware(tracing.TracingMiddleware)
+app.add_middleware(profiling.ProfilingMiddleware)
+
 templates = Jinja2Templates(directory="templates")
 
 
@@ -112,20 +137,33 @@ async def proxy(
         )
 
     url = f"{service_url}/{full_path}"
+    body = await request.body()
     async with httpx.AsyncClient() as client:
+        start = time.perf_counter()
         try:
-            response = await client.request(
-                method=request.method,
-                url=url,
-                headers=headers,
-                params=params,
-                data=await request.body(),
-            )
+            with tracing.start_span(
+                f"proxy {request.method} {service_url}",
+                kind=tracing.SPAN_KIND_CLIENT,
+                attributes={"http.url": url},
+            ):
+                response = await client.request(
+                    method=request.method,
+                    url=url,
+                    headers=tracing.inject(headers),
+                    params=params,
+                    data=body,
+                )
         except (httpx.RequestError, Exception) as e:
+            metrics.UPSTREAM_LATENCY.labels(service_url, "error").observe(
+                time.perf_counter() - start
+            )
             raise HTTPException(
                 status_code=status.HTTP_502_BAD_GATEWAY,
                 detail=f"Error in proxy request: {e}",
             )
+        metrics.UPSTREAM_LATENCY.labels(service_url, response.status_code).observe(
+            time.perf_counter() - start
+        )
 
         return Response(
             content=response.content,
@@ -1,4 +1,5 @@
 import pytest
+from fastapi.testclient import TestClient
 from httpx import AsyncClient
 from main import app
 
@@ -69,6 +70,26 @@ async def test_user_service_proxy(monkeypatch):
     assert response.text == "User Service Response"
 
 
+def test_metrics_record_route_and_upstream_latency(monkeypatch):
+    async def mock_request(*args, **kwargs):
+        return MockResponse(content="User Service Response", status_code=200)
+
+    monkeypatch.setattr("httpx.AsyncClient.request", mock_request)
+
+    # the sync TestClient is not affected by the mocked AsyncClient.request
+    with TestClient(app) as test_client:
+        test_client.get("/users/profile")
+        response = test_client.get("/metrics")
+
+    assert response.status_code == 200
+    assert (
+        'http_request_duration_seconds_count{route="/{full_path:path}",'
+        'method="GET",status="200"}' in response.text
+    )
+    assert "upstream_request_duration_seconds_bucket{" in response.text
+    assert "http_requests_in_flight 1.0" in response.text
+
+
 # Test service not found (404) case
 @pytest.mark.asyncio
 async def test_service_not_found():
@@ -0,0 +1,342 @@
+"""
+Tracing Module
+
+Lightweight distributed tracing with W3C trace context propagation.
+
+Spans are propagated between services with the `traceparent` header (HTTP)
+and the `traceparent` message header (broker). Finished spans are batched
+in a background thread and exported as OTLP/JSON, either appended to a
+local file (TRACE_EXPORT_FILE) or posted to an OTLP/HTTP compatible
+collector (TRACE_OTLP_ENDPOINT, e.g. http://localhost:4318/v1/traces).
+Without any of the two variables tracing is disabled, and starting a span
+costs a single check.
+
+Key Components:
+- configure: Sets the service name and the exporter from the environment.
+- start_span: Context manager creating a child span of the current span.
+- begin_span / end_span: The same without a context manager, for hooks.
+- inject / extract: Write and read the `traceparent` header.
+- TracingMiddleware: ASGI middleware creating one server span per request.
+"""
+
+import json
+import os
+import queue
+import secrets
+import threading
+import time
+import urllib.request
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT")
+TRACEPARENT = "traceparent"
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+SPAN_KIND_CONSUMER = 5
+
+
+@dataclass
+class SpanContext:
+    trace_id: str
+    span_id: str
+    sampled: bool = True
+
+
+@dataclass
+class Span:
+    name: str
+    context: SpanContext
+    parent_id: str | None = None
+    kind: int = SPAN_KIND_INTERNAL
+    attributes: dict = field(default_factory=dict)
+    start_time: int = field(default_factory=time.time_ns)
+    end_time: int | None = None
+    error: bool = False
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def to_otlp(self) -> dict:
+        def value(v) -> dict:
+            if isinstance(v, bool):
+                return {"boolValue": v}
+            if isinstance(v, int):
+                return {"intValue": str(v)}
+            if isinstance(v, float):
+                return {"doubleValue": v}
+            return {"stringValue": str(v)}
+
+        return {
+            "traceId": self.context.trace_id,
+            "spanId": self.context.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_time),
+            "endTimeUnixNano": str(self.end_time),
+            "attributes": [
+                {"key": k, "value": value(v)} for k, v in self.attributes.items()
+            ],
+            "status": {"code": 2 if self.error else 1},
+        }
+
+
+current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+class Exporter:
+    """Receives finished spans."""
+
+    def export(self, span: Span) -> None:
+        raise NotImplementedError
+
+
+class InMemoryExporter(Exporter):
+    """Keeps finished spans in a list, e.g. for tests."""
+
+    def __init__(self):
+        self.spans: list[Span] = []
+
+    def export(self, span: Span) -> None:
+        self.spans.append(span)
+
+
+class BatchExporter(Exporter):
+    """Batches finished spans and exports them from a background thread."""
+
+    def __init__(
+        self,
+        service_name: str,
+        path: str | None = None,
+        endpoint: str | None = None,
+        max_batch: int = 512,
+        interval: float = 1.0,
+    ):
+        self.service_name = service_name
+        self.path = path
+        self.endpoint = endpoint
+        self.max_batch = max_batch
+        self.interval = interval
+        self._queue: queue.Queue = queue.Queue(maxsize=10_000)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            pass  # never block a request because of tracing
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, spans: list[Span]) -> None:
+        payload = json.dumps(
+            {
+                "resourceSpans": [
+                    {
+                        "resource": {
+                            "attributes": [
+                                {
+                                    "key": "service.name",
+                                    "value": {"stringValue": self.service_name},
+                                }
+                            ]
+                        },
+                        "scopeSpans": [
+                            {
+                                "scope": {"name": "rls-buddy"},
+                                "spans": [span.to_otlp() for span in spans],
+                            }
+                        ],
+                    }
+                ]
+            }
+        )
+        try:
+            if self.path:
+                with open(self.path, "a") as f:
+                    f.write(payload + "\n")
+            if self.endpoint:
+                request = urllib.request.Request(
+                    self.endpoint,
+                    data=payload.encode(),
+                    headers={"Content-Type": "application/json"},
+                )
+                urllib.request.urlopen(request, timeout=5).close()
+        except Exception:
+            pass  # tracing must never break the service
+
+
+_exporter: Exporter | None = None
+
+
+def configure(
+    service_name: str,
+    path: str | None = TRACE_EXPORT_FILE,
+    endpoint: str | None = TRACE_OTLP_ENDPOINT,
+) -> None:
+    """Enable tracing if an export file or collector endpoint is configured."""
+    if path or endpoint:
+        set_exporter(BatchExporter(service_name, path, endpoint))
+    else:
+        set_exporter(None)
+
+
+def set_exporter(exporter: Exporter | None) -> None:
+    """Replace the exporter, None disables tracing."""
+    global _exporter
+    _exporter = exporter
+
+
+def parse_traceparent(header: str | None) -> SpanContext | None:
+    """Parse a W3C traceparent header, returns None if invalid."""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    version, trace_id, span_id, flags = parts
+    if version == "ff" or trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    try:
+        int(trace_id, 16)
+        int(span_id, 16)
+        sampled = bool(int(flags, 16) & 1)
+    except ValueError:
+        return None
+    return SpanContext(trace_id, span_id, sampled)
+
+
+def format_traceparent(context: SpanContext) -> str:
+    flags = "01" if context.sampled else "00"
+    return f"00-{context.trace_id}-{context.span_id}-{flags}"
+
+
+def extract(headers) -> SpanContext | None:
+    """Read the span context from HTTP or message headers."""
+    return parse_traceparent(headers.get(TRACEPARENT)) if headers else None
+
+
+def inject(headers: dict) -> dict:
+    """Write the current span context into `headers` and return them."""
+    span = current_span.get()
+    if span is not None:
+        headers[TRACEPARENT] = format_traceparent(span.context)
+    return headers
+
+
+def begin_span(
+    name: str,
+    kind: int = SPAN_KIND_INTERNAL,
+    attributes: dict | None = None,
+    parent: SpanContext | None = None,
+) -> Span | None:
+    """Start a span without making it current. Returns None if disabled."""
+    if _exporter is None:
+        return None
+    if parent is None:
+        parent_span = current_span.get()
+        parent = parent_span.context if parent_span is not None else None
+    if parent is not None and not parent.sampled:
+        return None
+    context = SpanContext(
+        trace_id=parent.trace_id if parent else secrets.token_hex(16),
+        span_id=secrets.token_hex(8),
+    )
+    return Span(
+        name=name,
+        context=context,
+        parent_id=parent.span_id if parent else None,
+        kind=kind,
+        attributes=attributes or {},
+    )
+
+
+def end_span(span: Span | None, error: bool = False) -> None:
+    if span is None or _exporter is None:
+        return
+    span.end_time = time.time_ns()
+    span.error = span.error or error
+    _exporter.export(span)
+
+
+@contextmanager
+def start_span(
+    name: str,
+    kind: int = SPAN_KIND_INTERNAL,
+    attributes: dict | None = None,
+    parent: SpanContext | None = None,
+) -> Iterator[Span | None]:
+    """Run the block in a new span, which is current for nested spans."""
+    span = begin_span(name, kind, attributes, parent)
+    if span is None:
+        yield None
+        return
+
+    token = current_span.set(span)
+    try:
+        yield span
+    except BaseException:
+        span.error = True
+        raise
+    finally:
+        current_span.reset(token)
+        end_span(span)
+
+
+class TracingMiddleware:
+    """ASGI middleware creating a server span per request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _exporter is None:
+            return await self.app(scope, receive, send)
+
+        headers = {
+            key.decode("latin-1"): value.decode("latin-1")
+            for key, value in scope["headers"]
+            if key == b"traceparent"
+        }
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                span.set_attribute("http.status_code", message["status"])
+                span.error = message["status"] >= 500
+            await send(message)
+
+        with start_span(
+            f"{scope['method']} {scope['path']}",
+            kind=SPAN_KIND_SERVER,
+            attributes={"http.method": scope["method"], "http.target": scope["path"]},
+            parent=extract(headers),
+        ) as span:
+            if span is None:
+                return await self.app(scope, receive, send)
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = scope.get("route")
+                if route is not None:
+                    span.name = f"{scope['method']} {route.path}"
+                    span.set_attribute("http.route", route.path)
@@ -0,0 +1,338 @@
+"""
+Open-loop load generator for RLS-BUDDY.
+
+Requests arrive as a Poisson process with a fixed rate, independent of how
+fast the services answer (open loop), so slow responses show up as higher
+latencies instead of a lower request rate. Latencies are measured from the
+scheduled arrival time, which avoids coordinated omission.
+
+The request mix replays what the app does: logins, reading the own
+trackings, creating and updating sleep and day entries and reading the
+symptom and trigger catalogs.
+
+Usage:
+
+    python loadtest/run.py --url http://localhost:8000 --rate 50 --duration 60
+    python loadtest/run.py --rate 200 --json result.json --max-p95-ms 250
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+
+
+# operation name -> weight
+DEFAULT_MIX = {
+    "login": 5,
+    "get_sleeps": 30,
+    "get_days": 15,
+    "create_sleep": 15,
+    "update_sleep": 5,
+    "create_day": 10,
+    "update_day": 5,
+    "get_symptoms": 10,
+    "get_triggers": 5,
+}
+
+# operation name -> route key of the statistics
+ROUTES = {
+    "login": "POST /token",
+    "get_sleeps": "GET /trackings/me?type=sleep",
+    "get_days": "GET /trackings/me?type=day",
+    "create_sleep": "POST /trackings/sleep",
+    "update_sleep": "PUT /trackings/sleep/{id}",
+    "create_day": "POST /trackings/day",
+    "update_day": "PUT /trackings/day/{id}",
+    "get_symptoms": "GET /details/symptoms",
+    "get_triggers": "GET /details/triggers",
+}
+
+
+@dataclass
+class User:
+    email: str
+    password: str
+    token: str = ""
+    dates: itertools.count = field(default_factory=lambda: itertools.count())
+    sleep_ids: list[int] = field(default_factory=list)
+    day_ids: list[int] = field(default_factory=list)
+
+    def next_date(self) -> str:
+        return (date(2000, 1, 1) + timedelta(days=next(self.dates))).isoformat()
+
+
+@dataclass
+class RouteStats:
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+
+    def summary(self, duration: float) -> dict:
+        latencies = sorted(self.latencies)
+
+        def percentile(q: float) -> float:
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+
+        return {
+            "requests": len(latencies),
+            "errors": self.errors,
+            "throughput": len(latencies) / duration,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+        }
+
+
+class LoadTest:
+    def __init__(self, client, users: list[User], symptoms, triggers, stats):
+        self.client = client
+        self.users = users
+        self.symptoms = symptoms
+        self.triggers = triggers
+        self.stats = stats
+
+    def headers(self, user: User) -> dict:
+        return {"Authorization": f"Bearer {user.token}"}
+
+    async def login(self, user: User):
+        response = await self.client.post(
+            "/token", data={"username": user.email, "password": user.password}
+        )
+        if response.status_code == 200:
+            user.token = response.json()["access_token"]
+        return response
+
+    async def get_sleeps(self, user: User):
+        response = await self.client.get(
+            "/trackings/me", params={"type": "sleep"}, headers=self.headers(user)
+        )
+        return response
+
+    async def get_days(self, user: User):
+        response = await self.client.get(
+            "/trackings/me", params={"type": "day"}, headers=self.headers(user)
+        )
+        return response
+
+    async def create_sleep(self, user: User):
+        response = await self.client.post(
+            "/trackings/sleep",
+            json={
+                "date": user.next_date(),
+                "duration": random.randint(3, 10),
+                "quality": random.choice(["bad", "moderate", "good"]),
+                "comment": "load test",
+                "symptoms": random.sample(self.symptoms, k=2),
+            },
+            headers=self.headers(user),
+        )
+        if response.status_code == 201:
+            user.sleep_ids.append(response.json()["id"])
+        return response
+
+    async def update_sleep(self, user: User):
+        response = await self.client.put(
+            f"/trackings/sleep/{random.choice(user.sleep_ids)}",
+            json={
+                "duration": random.randint(3, 10),
+                "quality": random.choice(["bad", "moderate", "good"]),
+                "comment": "updated",
+                "symptoms": random.sample(self.symptoms, k=1),
+            },
+            headers=self.headers(user),
+        )
+        return response
+
+    async def create_day(self, user: User):
+        response = await self.client.post(
+            "/trackings/day",
+            json={
+                "date": user.next_date(),
+                "comment": "load test",
+                "triggers": random.sample(self.triggers, k=2),
+                "late_morning_symptoms": random.sample(self.symptoms, k=1),
+                "afternoon_symptoms": random.sample(self.symptoms, k=2),
+            },
+            headers=self.headers(user),
+        )
+        if response.status_code == 201:
+            user.day_ids.append(response.json()["id"])
+        return response
+
+    async def update_day(self, user: User):
+        response = await self.client.put(
+            f"/trackings/day/{random.choice(user.day_ids)}",
+            json={
+                "comment": "updated",
+                "triggers": random.sample(self.triggers, k=1),
+                "late_morning_symptoms": [],
+                "afternoon_symptoms": random.sample(self.symptoms, k=1),
+            },
+            headers=self.headers(user),
+        )
+        return response
+
+    async def get_symptoms(self, user: User):
+        return await self.client.get("/details/symptoms/")
+
+    async def get_triggers(self, user: User):
+        return await self.client.get("/details/triggers/")
+
+    @staticmethod
+    def resolve(operation: str, user: User) -> str:
+        """Updates of a user without entries create one instead."""
+        if operation == "update_sleep" and not user.sleep_ids:
+            return "create_sleep"
+        if operation == "update_day" and not user.day_ids:
+            return "create_day"
+        return operation
+
+    async def execute(self, operation: str, scheduled: float) -> None:
+        user = random.choice(self.users)
+        operation = self.resolve(operation, user)
+        try:
+            response = await getattr(self, operation)(user)
+            failed = response.status_code >= 400 and response.status_code != 404
+        except Exception:
+            failed = True
+        stats = self.stats[ROUTES[operation]]
+        stats.latencies.append(time.perf_counter() - scheduled)
+        if failed:
+            stats.errors += 1
+
+
+async def setup(client, n_users: int) -> tuple[list[User], list[int], list[int]]:
+    """Create users with tokens and make sure the catalogs are not empty."""
+    run_id = uuid.uuid4().hex[:8]
+    for i in range(4):
+        await client.post("/details/symptoms/", json={"name": f"lt-{run_id}-s{i}"})
+    for i in range(4):
+        await client.post(
+            "/details/triggers/",
+            json={"name": f"lt-{run_id}-t{i}", "category": "lifestyle"},
+        )
+    symptoms = [s["id"] for s in (await client.get("/details/symptoms/")).json()]
+    triggers = [t["id"] for t in (await client.get("/details/triggers/")).json()]
+
+    users = []
+    for i in range(n_users):
+        user = User(email=f"lt_{run_id}_{i}@example.com", password="loadtest")
+        response = await client.post(
+            "/users/",
+            json={
+                "name": f"lt_{run_id}_{i}",
+                "email": user.email,
+                "password": user.password,
+            },
+        )
+        response.raise_for_status()
+        users.append(user)
+
+    test = LoadTest(client, users, symptoms, triggers, defaultdict(RouteStats))
+    for user in users:
+        response = await test.login(user)
+        response.raise_for_status()
+    return users, symptoms, triggers
+
+
+async def run(args) -> dict:
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.max_in_flight)
+    async with httpx.AsyncClient(
+        base_url=args.url, limits=limits, timeout=args.timeout
+    ) as client:
+        users, symptoms, triggers = await setup(client, args.users)
+        stats: dict[str, RouteStats] = defaultdict(RouteStats)
+        test = LoadTest(client, users, symptoms, triggers, stats)
+
+        operations = list(DEFAULT_MIX)
+        weights = list(DEFAULT_MIX.values())
+        tasks: set[asyncio.Task] = set()
+        dropped = 0
+
+        started = time.perf_counter()
+        scheduled = started
+        while scheduled - started < args.duration:
+            scheduled += random.expovariate(args.rate)
+            await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+            if len(tasks) >= args.max_in_flight:
+                dropped += 1
+                continue
+            operation = random.choices(operations, weights)[0]
+            task = asyncio.create_task(test.execute(operation, scheduled))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        if tasks:
+            await asyncio.wait(tasks)
+        duration = time.perf_counter() - started
+
+    routes = {route: s.summary(duration) for route, s in sorted(stats.items())}
+    total = RouteStats(
+        latencies=[lat for s in stats.values() for lat in s.latencies],
+        errors=sum(s.errors for s in stats.values()),
+    )
+    return {
+        "rate": args.rate,
+        "duration": duration,
+        "dropped": dropped,
+        "total": total.summary(duration),
+        "routes": routes,
+    }
+
+
+def print_report(result: dict) -> None:
+    header = f"{'route':<32}{'req':>8}{'err':>6}{'req/s':>9}"
+    header += f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for route, s in [*result["routes"].items(), ("TOTAL", result["total"])]:
+        print(
+            f"{route:<32}{s['requests']:>8}{s['errors']:>6}{s['throughput']:>9.1f}"
+            f"{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}"
+        )
+    print(f"\ndropped arrivals (max in flight reached): {result['dropped']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Open-loop load test.")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--rate", type=float, default=20, help="requests per second")
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--max-in-flight", type=int, default=500)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", help="write the result to this file")
+    parser.add_argument("--max-p95-ms", type=float, help="fail above this p95")
+    parser.add_argument("--max-error-rate", type=float, help="fail above, e.g. 0.01")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    result = asyncio.run(run(args))
+    print_report(result)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+    total = result["total"]
+    error_rate = total["errors"] / total["requests"] if total["requests"] else 0
+    if args.max_p95_ms is not None and total["p95_ms"] > args.max_p95_ms:
+        sys.exit(f"p95 {total['p95_ms']:.1f} ms exceeds {args.max_p95_ms} ms")
+    if args.max_error_rate is not None and error_rate > args.max_error_rate:
+        sys.exit(f"error rate {error_rate:.3f} exceeds {args.max_error_rate}")
+
+
+if __name__ == "__main__":
+    main()
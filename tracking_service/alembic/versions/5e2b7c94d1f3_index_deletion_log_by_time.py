@@ -0,0 +1,28 @@
+"""index the deletion log by time for pruning
+
+Revision ID: 5e2b7c94d1f3
+Revises: 8cb6331a01e0
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5e2b7c94d1f3"
+down_revision: Union[str, None] = "8cb6331a01e0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_deleted_trackings_deleted", "deleted_trackings", ["deleted"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_deleted_trackings_deleted", table_name="deleted_trackings")
@@ -0,0 +1,52 @@
+"""add deletion log and updated indexes for delta sync
+
+Revision ID: 9ce79c671075
+Revises: a3d8a1e6a447
+Create Date: 2026-10-19 12:30:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9ce79c671075"
+down_revision: Union[str, None] = "a3d8a1e6a447"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "deleted_trackings",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("tracking_type", sa.String(), nullable=False),
+        sa.Column("tracking_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("deleted", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_deleted_trackings_user_id_deleted",
+        "deleted_trackings",
+        ["user_id", "deleted"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_sleeps_user_id_updated", "sleeps", ["user_id", "updated"], unique=False
+    )
+    op.create_index(
+        "ix_days_user_id_updated", "days", ["user_id", "updated"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_days_user_id_updated", table_name="days")
+    op.drop_index("ix_sleeps_user_id_updated", table_name="sleeps")
+    op.drop_index(
+        "ix_deleted_trackings_user_id_deleted", table_name="deleted_trackings"
+    )
+    op.drop_table("deleted_trackings")
@@ -23,11 +23,13 @@ Author: Bernd Fischer, 2024
 """
 
 import os
-import sys
+import time
 
 import httpx
 import jwt
+import metrics
 import schemas as schemes
+import tracing
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, SecurityScopes
 from loguru import logger
@@ -42,7 +44,6 @@ oauth2_scheme = OAuth2PasswordBearer(
 )
 
 USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "http://user-service:8001")
-logger.add(sys.stderr, format="{level} {time} {message}", colorize=True, level="INFO")
 
 
 # def verify_token(
@@ -87,10 +88,15 @@ async def get_user_id_from_token(
     s = ",".join(security_scopes.scopes)
 
     async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{USER_SERVICE_URL}/token-validate?scopes={s}",
-            headers=headers,
-        )
+        start = time.perf_counter()
+        with tracing.start_span("token validation", kind=tracing.SPAN_KIND_CLIENT):
+            response = await client.get(
+                f"{USER_SERVICE_URL}/token-validate?scopes={s}",
+                headers=tracing.inject(headers),
+            )
+        metrics.UPSTREAM_LATENCY.labels(
+            "user-service/token-validate", response.status_code
+        ).observe(time.perf_counter() - start)
         if response.status_code == status.HTTP_200_OK:
             try:
                 return int(response.json().get("user_id"))
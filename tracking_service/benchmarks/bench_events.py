@@ -0,0 +1,112 @@
+"""
+Benchmark for the USER_DELETED event path on the in-memory broker.
+
+Publishes USER_DELETED events for users with seeded trackings and measures
+the throughput and latency (publish until the trackings are deleted) of
+the consumer in `events.py`. No RabbitMQ is needed.
+
+Run from the tracking_service directory:
+
+    python -m benchmarks.bench_events --events 2000 --trackings-per-user 10
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{tempfile.gettempdir()}/bench_events.db"
+)
+os.environ["BROKER_BACKEND"] = "memory"
+
+import broker  # noqa: E402
+import events  # noqa: E402
+import models  # noqa: E402
+from database import Base, SessionLocal, engine  # noqa: E402
+from enums import SleepQuality  # noqa: E402
+from loguru import logger  # noqa: E402
+
+
+def seed(users: int, trackings_per_user: int) -> None:
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    start = datetime(2024, 1, 1)
+    sleeps = [
+        {
+            "user_id": user_id,
+            "date": start + timedelta(days=day),
+            "duration": 7,
+            "quality": SleepQuality.GOOD,
+        }
+        for user_id in range(1, users + 1)
+        for day in range(trackings_per_user)
+    ]
+    with SessionLocal() as db:
+        db.execute(models.Sleep.__table__.insert(), sleeps)
+        db.commit()
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run(n_events: int, trackings_per_user: int) -> None:
+    seed(n_events, trackings_per_user)
+    bus = broker.InMemoryBroker()
+    broker.set_broker(bus)
+
+    latencies: list[float] = []
+    done = threading.Event()
+
+    def handler(message: broker.Message) -> None:
+        events.callback(message, bus)
+        latencies.append(time.time() - message.published_at)
+        if len(latencies) == n_events:
+            done.set()
+
+    consumer = threading.Thread(target=bus.subscribe, args=(handler,))
+    consumer.start()
+    bus.subscribed.wait()
+
+    started = time.perf_counter()
+    bus.publish_batch(
+        [{"type": "USER_DELETED", "user_id": i} for i in range(1, n_events + 1)]
+    )
+    done.wait()
+    elapsed = time.perf_counter() - started
+    bus.close()
+    consumer.join()
+
+    with SessionLocal() as db:
+        remaining = db.query(models.Sleep).count()
+
+    print(f"events:      {n_events} ({trackings_per_user} trackings per user)")
+    print(f"throughput:  {n_events / elapsed:,.0f} events/s")
+    print(f"latency p50: {percentile(latencies, 0.50) * 1000:.2f} ms")
+    print(f"latency p95: {percentile(latencies, 0.95) * 1000:.2f} ms")
+    print(f"latency p99: {percentile(latencies, 0.99) * 1000:.2f} ms")
+    print(f"latency max: {max(latencies) * 1000:.2f} ms")
+    print(f"mean:        {statistics.mean(latencies) * 1000:.2f} ms")
+    print(f"remaining trackings: {remaining}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=1000)
+    parser.add_argument("--trackings-per-user", type=int, default=10)
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    run(args.events, args.trackings_per_user)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Fixtures for the crud micro-benchmarks.
+
+The benchmarks run on an in-memory SQLite database by default. Set
+BENCH_DATABASE_URL to run them on another database, e.g. a local Postgres.
+Tables are created at the start and dropped at the end of the session.
+"""
+
+import itertools
+import os
+from datetime import datetime, timedelta
+
+import models
+import pytest
+import schemas as schemes
+from crud import create_symptom, create_trigger
+from database import Base
+from enums import SleepQuality
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+
+BENCH_DATABASE_URL = os.getenv("BENCH_DATABASE_URL", "sqlite://")
+HISTORY_SIZES = [10, 1_000, 100_000]
+START_DATE = datetime(1900, 1, 1)
+
+
+@pytest.fixture(scope="session")
+def bench_engine():
+    if BENCH_DATABASE_URL.startswith("sqlite"):
+        engine = create_engine(
+            BENCH_DATABASE_URL,
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+    else:
+        engine = create_engine(BENCH_DATABASE_URL)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture(scope="session")
+def catalog(bench_engine):
+    """Symptom and trigger ids."""
+    with Session(bench_engine) as db:
+        symptoms = [
+            create_symptom(db, schemes.SymptomCreate(name=f"symptom {i}")).id
+            for i in range(10)
+        ]
+        triggers = [
+            create_trigger(
+                db, schemes.TriggerCreate(name=f"trigger {i}", category="food")
+            ).id
+            for i in range(10)
+        ]
+    return symptoms, triggers
+
+
+@pytest.fixture(scope="session", params=HISTORY_SIZES, ids=str)
+def history_size(request, bench_engine, catalog):
+    """Seed a user whose id equals the number of sleeps in their history."""
+    size = request.param
+    symptoms, _ = catalog
+    with Session(bench_engine) as db:
+        db.execute(
+            insert(models.Sleep),
+            [
+                {
+                    "user_id": size,
+                    "date": START_DATE + timedelta(days=day),
+                    "duration": 7,
+                    "quality": SleepQuality.GOOD,
+                    "comment": "benchmark",
+                }
+                for day in range(size)
+            ],
+        )
+        sleep_ids = db.scalars(
+            select(models.Sleep.id).where(models.Sleep.user_id == size)
+        )
+        db.execute(
+            insert(models.sleep_symptom_association),
+            [
+                {"sleep_id": sleep_id, "symptom_id": symptoms[sleep_id % 10]}
+                for sleep_id in sleep_ids
+            ],
+        )
+        db.commit()
+    return size
+
+
+@pytest.fixture
+def db(bench_engine):
+    with Session(bench_engine) as session:
+        yield session
+
+
+@pytest.fixture(scope="session")
+def unique_dates():
+    """Endless supply of dates, so repeated creates never hit the unique constraint."""
+    return (START_DATE + timedelta(days=i) for i in itertools.count())
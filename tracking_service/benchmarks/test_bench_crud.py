@@ -0,0 +1,117 @@
+"""
+Micro-benchmarks for tracking_service.crud.
+
+Run from the tracking_service directory:
+
+    pytest benchmarks --benchmark-autosave
+    pytest benchmarks --benchmark-compare --benchmark-compare-fail=mean:15%
+"""
+
+from datetime import datetime, timedelta
+
+import crud
+import models
+import pytest
+import schemas as schemes
+from enums import SleepQuality, TrackingType
+from sqlalchemy import insert
+
+
+BENCH_USER_ID = 1_000_000
+START_DATE = datetime(1900, 1, 1)
+
+
+def sleep_create(date, symptoms) -> schemes.SleepCreate:
+    return schemes.SleepCreate(
+        duration=7,
+        date=date,
+        quality=SleepQuality.GOOD,
+        comment="benchmark",
+        symptoms=symptoms[:2],
+    )
+
+
+def test_create_sleep(benchmark, db, catalog, unique_dates):
+    symptoms, _ = catalog
+    benchmark(
+        lambda: crud.create_tracking(
+            db, sleep_create(next(unique_dates), symptoms), TrackingType.SLEEP, 1
+        )
+    )
+
+
+def test_create_day(benchmark, db, catalog, unique_dates):
+    symptoms, triggers = catalog
+    benchmark(
+        lambda: crud.create_tracking(
+            db,
+            schemes.DayCreate(
+                date=next(unique_dates),
+                comment="benchmark",
+                triggers=triggers[:2],
+                late_morning_symptoms=symptoms[:1],
+                afternoon_symptoms=symptoms[:3],
+            ),
+            TrackingType.DAY,
+            1,
+        )
+    )
+
+
+def test_update_sleep(benchmark, db, catalog, unique_dates):
+    symptoms, _ = catalog
+    sleep = crud.create_tracking(
+        db, sleep_create(next(unique_dates), symptoms), TrackingType.SLEEP, 2
+    )
+    update = schemes.SleepUpdate(
+        duration=6, quality=SleepQuality.BAD, symptoms=symptoms[2:5], comment="x"
+    )
+    benchmark(
+        crud.update_tracking, db, update, TrackingType.SLEEP, sleep.id, sleep.user_id
+    )
+
+
+def test_add_values_to_model(benchmark, db, catalog):
+    symptoms, triggers = catalog
+    data = {
+        "triggers": triggers[:3],
+        "late_morning_symptoms": symptoms[:3],
+        "afternoon_symptoms": symptoms[3:6],
+    }
+    day = models.Day(user_id=3, date=START_DATE)
+    benchmark(
+        lambda: crud.add_values_to_model(db, day, dict(data), list(data.keys()))
+    )
+
+
+def test_get_trackings_by_user(benchmark, db, history_size):
+    # every request has a fresh session, so don't measure identity map hits
+    result = benchmark.pedantic(
+        crud.get_trackings_by_user,
+        args=(db, TrackingType.SLEEP, history_size),
+        setup=db.expunge_all,
+        rounds=max(5, 10_000 // history_size),
+    )
+    assert len(result) == history_size
+
+
+@pytest.mark.parametrize("size", [10, 1_000])
+def test_delete_trackings_by_user(benchmark, db, size):
+    def setup():
+        db.execute(
+            insert(models.Sleep),
+            [
+                {
+                    "user_id": BENCH_USER_ID,
+                    "date": START_DATE + timedelta(days=day),
+                    "duration": 7,
+                    "quality": SleepQuality.GOOD,
+                }
+                for day in range(size)
+            ],
+        )
+        db.commit()
+
+    benchmark.pedantic(
+        crud.delete_trackings_by_user, args=(db, BENCH_USER_ID), setup=setup, rounds=20
+    )
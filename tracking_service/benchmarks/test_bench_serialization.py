@@ -0,0 +1,43 @@
+"""
+Micro-benchmarks for serializing tracking histories.
+
+`response_model` is what FastAPI does for `response_model=list[SleepOut |
+DayOut]`: validate against the union, then dump to JSON. `fast_path` is
+serialization.trackings_response. Compare both per history size with:
+
+    pytest benchmarks/test_bench_serialization.py \
+        --benchmark-group-by=param:history_size
+"""
+
+import crud
+import orjson
+import pytest
+import serialization
+from enums import TrackingType
+from pydantic import TypeAdapter
+from schemas import DayOut, SleepOut
+
+
+RESPONSE_MODEL = TypeAdapter(list[SleepOut | DayOut])
+
+
+def response_model(trackings) -> bytes:
+    return RESPONSE_MODEL.dump_json(
+        RESPONSE_MODEL.validate_python(trackings, from_attributes=True)
+    )
+
+
+def fast_path(trackings) -> bytes:
+    return serialization.trackings_response(trackings).body
+
+
+@pytest.fixture
+def trackings(db, history_size):
+    return crud.get_trackings_by_user(db, TrackingType.SLEEP, history_size)
+
+
+@pytest.mark.parametrize("history_size", [10, 1_000], indirect=True, ids=str)
+@pytest.mark.parametrize("serialize", [response_model, fast_path])
+def test_serialize_trackings(benchmark, trackings, serialize):
+    body = benchmark(serialize, trackings)
+    assert orjson.loads(body) == orjson.loads(response_model(trackings))
@@ -0,0 +1,268 @@
+"""
+Message Broker Module
+
+This module hides the message broker behind a small interface, so the event
+code in `events.py` does not depend on a running RabbitMQ server.
+
+Key Components:
+- Broker: The interface every transport implements (publish, publish_batch,
+  subscribe, ack, close).
+- RabbitMQBroker: Fanout exchange on RabbitMQ, used in production. Events
+  are published on one long-lived connection, reopened once if it was
+  closed; consuming uses its own connection.
+- InMemoryBroker: Thread-safe in-process fanout, used in tests and
+  benchmarks.
+- get_broker: Returns the process wide broker selected by BROKER_BACKEND.
+
+Messages are JSON encoded on both transports, so handlers see exactly the
+same payloads regardless of the backend.
+"""
+
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Callable
+
+from loguru import logger
+
+
+BROKER_BACKEND = os.getenv("BROKER_BACKEND", "rabbitmq")
+RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "rabbitmq")
+EXCHANGE_NAME = "user_events_exchange"
+
+
+@dataclass
+class Message:
+    """A message delivered to a subscriber."""
+
+    body: dict
+    delivery_tag: int | None = None
+    published_at: float | None = None
+    headers: dict = field(default_factory=dict)
+
+
+MessageHandler = Callable[[Message], None]
+
+
+class Broker(ABC):
+    """Interface for publishing and consuming events on a fanout exchange."""
+
+    @abstractmethod
+    def publish(self, event: dict, headers: dict | None = None) -> None:
+        """Publish a single event to all subscribers."""
+
+    def publish_batch(self, events: list[dict]) -> None:
+        """Publish several events. Transports may reuse one connection."""
+        for event in events:
+            self.publish(event)
+
+    @abstractmethod
+    def subscribe(self, handler: MessageHandler) -> None:
+        """Consume messages and pass them to `handler`. Blocks until closed."""
+
+    @abstractmethod
+    def ack(self, message: Message, multiple: bool = False) -> None:
+        """Acknowledge a message (and all before it, if `multiple`)."""
+
+    def close(self) -> None:
+        """Stop consuming and release resources."""
+
+
+class RabbitMQBroker(Broker):
+    """Broker backed by a RabbitMQ fanout exchange."""
+
+    def __init__(self, host: str = RABBITMQ_HOST, exchange: str = EXCHANGE_NAME):
+        self.host = host
+        self.exchange = exchange
+        self._connection = None
+        self._channel = None
+        # pika connections are not thread safe, publishers take turns
+        self._publisher = None
+        self._publish_lock = threading.Lock()
+
+    def _connect(self):
+        import pika
+
+        connection = pika.BlockingConnection(pika.ConnectionParameters(self.host))
+        channel = connection.channel()
+        channel.exchange_declare(exchange=self.exchange, exchange_type="fanout")
+        return connection, channel
+
+    def _basic_publish(self, channel, event: dict, headers: dict | None) -> None:
+        import pika
+
+        headers = {**(headers or {}), "published_at": time.time()}
+        channel.basic_publish(
+            exchange=self.exchange,
+            routing_key="",
+            body=json.dumps(event),
+            properties=pika.BasicProperties(headers=headers),
+        )
+
+    def _publish(self, events: list[tuple[dict, dict | None]]) -> None:
+        import pika.exceptions
+
+        with self._publish_lock:
+            for attempt in range(2):
+                if self._publisher is None or not self._publisher[0].is_open:
+                    self._publisher = self._connect()
+                try:
+                    for event, headers in events:
+                        self._basic_publish(self._publisher[1], event, headers)
+                    return
+                except (
+                    pika.exceptions.AMQPConnectionError,
+                    pika.exceptions.AMQPChannelError,
+                ):
+                    # e.g. closed by the server while idle, reconnect once
+                    self._close_publisher()
+                    if attempt:
+                        raise
+
+    def _close_publisher(self) -> None:
+        publisher, self._publisher = self._publisher, None
+        if publisher is not None and publisher[0].is_open:
+            try:
+                publisher[0].close()
+            except Exception as e:
+                logger.warning(f"Closing the publisher connection failed: {e}")
+
+    def publish(self, event: dict, headers: dict | None = None) -> None:
+        self._publish([(event, headers)])
+
+    def publish_batch(self, events: list[dict]) -> None:
+        self._publish([(event, None) for event in events])
+
+    def subscribe(self, handler: MessageHandler) -> None:
+        connection, channel = self._connect()
+        self._connection, self._channel = connection, channel
+
+        # exclusive queue for this consumer, bound to the fanout exchange
+        result = channel.queue_declare(queue="", exclusive=True)
+        queue_name = result.method.queue
+        channel.queue_bind(exchange=self.exchange, queue=queue_name)
+
+        def on_message(ch, method, properties, body):
+            headers = dict(properties.headers or {})
+            message = Message(
+                body=json.loads(body),
+                delivery_tag=method.delivery_tag,
+                published_at=headers.pop("published_at", None),
+                headers=headers,
+            )
+            handler(message)
+
+        channel.basic_consume(queue=queue_name, on_message_callback=on_message)
+        try:
+            channel.start_consuming()
+        finally:
+            connection.close()
+
+    def ack(self, message: Message, multiple: bool = False) -> None:
+        self._channel.basic_ack(delivery_tag=message.delivery_tag, multiple=multiple)
+
+    def close(self) -> None:
+        # pika connections are not thread safe, stop from the consumer thread
+        if self._connection is not None and self._connection.is_open:
+            self._connection.add_callback_threadsafe(self._channel.stop_consuming)
+        with self._publish_lock:
+            self._close_publisher()
+
+
+class InMemoryBroker(Broker):
+    """
+    In-process fanout broker.
+
+    Like an exclusive RabbitMQ queue, a subscriber only receives messages
+    published after it subscribed. `subscribed` is set once the first
+    subscriber is registered.
+    """
+
+    def __init__(self):
+        self._queues: list[queue.Queue] = []
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._tags = itertools.count(1)
+        self.subscribed = threading.Event()
+        self.unacked: dict[int, Message] = {}
+
+    def publish(self, event: dict, headers: dict | None = None) -> None:
+        body = json.dumps(event)
+        with self._lock:
+            queues = list(self._queues)
+        for q in queues:
+            q.put((body, time.time(), dict(headers or {})))
+
+    def publish_batch(self, events: list[dict]) -> None:
+        for event in events:
+            self.publish(event)
+
+    def subscribe(self, handler: MessageHandler) -> None:
+        q: queue.Queue = queue.Queue()
+        with self._lock:
+            self._queues.append(q)
+        self.subscribed.set()
+
+        try:
+            while not self._closed.is_set():
+                try:
+                    body, published_at, headers = q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                message = Message(
+                    body=json.loads(body),
+                    delivery_tag=next(self._tags),
+                    published_at=published_at,
+                    headers=headers,
+                )
+                with self._lock:
+                    self.unacked[message.delivery_tag] = message
+                handler(message)
+        finally:
+            with self._lock:
+                self._queues.remove(q)
+
+    def ack(self, message: Message, multiple: bool = False) -> None:
+        with self._lock:
+            if multiple:
+                for tag in [t for t in self.unacked if t <= message.delivery_tag]:
+                    del self.unacked[tag]
+            else:
+                self.unacked.pop(message.delivery_tag, None)
+
+    def close(self) -> None:
+        self._closed.set()
+
+
+_broker: Broker | None = None
+
+
+def create_broker(backend: str = BROKER_BACKEND) -> Broker:
+    brokers = {
+        "rabbitmq": RabbitMQBroker,
+        "memory": InMemoryBroker,
+    }
+    try:
+        return brokers[backend]()
+    except KeyError:
+        raise ValueError(f"Unknown broker backend: {backend}")
+
+
+def get_broker() -> Broker:
+    """Return the broker of this process, created on first use."""
+    global _broker
+    if _broker is None:
+        _broker = create_broker()
+        logger.info(f"Using {type(_broker).__name__} as message broker.")
+    return _broker
+
+
+def set_broker(broker: Broker | None) -> None:
+    """Replace the broker of this process, e.g. in tests and benchmarks."""
+    global _broker
+    _broker = broker
@@ -0,0 +1,227 @@
+"""
+Tracking Cache Module
+
+In-process read-through cache of the recent trackings of the most active
+users, so their polls of `/trackings/me` do not touch the database.
+
+Per user the cache holds the data version (the ETag) and, per tracking
+type, the dumped entries dated within the last TRACKING_CACHE_WINDOW_DAYS
+days. Requests for a date range inside that window are answered from the
+cache. Users are evicted least recently used first when the entries exceed
+TRACKING_CACHE_MAX_BYTES (measured as their JSON size, the python objects
+take a few times more) and expire after TRACKING_CACHE_TTL seconds. Misses
+are filled from the primary database, a lagging read replica would leave
+outdated entries until the next write.
+
+The write paths in crud invalidate the user after committing, this includes
+deletions on USER_DELETED events, and broadcast the invalidation to the other
+replicas (see invalidation.py). A read which started before an invalidation
+does not store its (possibly stale) result.
+
+- TRACKING_CACHE_ENABLED: true (default) or false.
+- TRACKING_CACHE_MAX_BYTES: Memory cap, default 32 MiB.
+- TRACKING_CACHE_TTL: Seconds until an entry expires, default 300.
+- TRACKING_CACHE_WINDOW_DAYS: Days of recent entries cached, default 30.
+
+The symptom and trigger catalogs are shared by all users and cached in the
+cache backend of the service (see cache_backend.py), under SYMPTOMS_KEY and
+TRIGGERS_KEY for CATALOG_CACHE_TTL seconds (default 300).
+
+Key Components:
+- TrackingCache: LRU cache of users with hit, miss and eviction metrics.
+- trackings: The cache of this process.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import metrics
+import orjson
+
+
+TRACKING_CACHE_ENABLED = os.getenv("TRACKING_CACHE_ENABLED", "true").lower() in (
+    "1",
+    "true",
+)
+TRACKING_CACHE_MAX_BYTES = int(os.getenv("TRACKING_CACHE_MAX_BYTES", 32 * 1024**2))
+TRACKING_CACHE_TTL = float(os.getenv("TRACKING_CACHE_TTL", "300"))
+TRACKING_CACHE_WINDOW_DAYS = int(os.getenv("TRACKING_CACHE_WINDOW_DAYS", "30"))
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "300"))
+
+SYMPTOMS_KEY = "tracking:catalog:symptoms"
+TRIGGERS_KEY = "tracking:catalog:triggers"
+
+# invalidations remembered to reject stale fills, see TrackingCache.token
+MAX_INVALIDATIONS = 10_000
+# bytes accounted for a user entry without trackings, e.g. only the version
+ENTRY_SIZE = 200
+
+CACHE_HITS = metrics.Counter(
+    "tracking_cache_hits_total",
+    "Reads answered from the tracking cache.",
+    labelnames=("kind",),
+)
+CACHE_MISSES = metrics.Counter(
+    "tracking_cache_misses_total",
+    "Reads not found in the tracking cache.",
+    labelnames=("kind",),
+)
+CACHE_EVICTIONS = metrics.Counter(
+    "tracking_cache_evictions_total",
+    "Users evicted from the tracking cache to stay below the memory cap.",
+)
+CACHE_BYTES = metrics.Gauge(
+    "tracking_cache_bytes",
+    "JSON size of the entries in the tracking cache.",
+)
+CACHE_USERS = metrics.Gauge(
+    "tracking_cache_users",
+    "Users in the tracking cache.",
+)
+
+
+@dataclass
+class _UserEntry:
+    expires: float
+    version: int | None = None
+    # tracking type -> (window start, dumped trackings, their size)
+    trackings: dict[str, tuple[datetime, list[dict], int]] = field(
+        default_factory=dict
+    )
+    size: int = ENTRY_SIZE
+
+
+class TrackingCache:
+    def __init__(
+        self,
+        enabled: bool = TRACKING_CACHE_ENABLED,
+        max_bytes: int = TRACKING_CACHE_MAX_BYTES,
+        ttl: float = TRACKING_CACHE_TTL,
+    ):
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._users: OrderedDict[int, _UserEntry] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._clock = 0
+        # user id -> clock of the last invalidation, oldest first
+        self._invalidated: OrderedDict[int, int] = OrderedDict()
+        self._forgotten = 0
+        CACHE_BYTES.set_function(lambda: self._size)
+        CACHE_USERS.set_function(lambda: len(self._users))
+
+    def token(self) -> int:
+        """Take before reading the database, pass to the `set_...` methods."""
+        return self._clock
+
+    def get_version(self, user_id: int) -> int | None:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entry(user_id)
+            version = entry.version if entry is not None else None
+        (CACHE_MISSES if version is None else CACHE_HITS).labels("version").inc()
+        return version
+
+    def set_version(self, user_id: int, version: int, token: int) -> None:
+        with self._lock:
+            entry = self._writable_entry(user_id, token)
+            if entry is not None:
+                entry.version = version
+
+    def get_trackings(
+        self, user_id: int, tracking_type: str, start: datetime
+    ) -> list[dict] | None:
+        """The cached trackings dated from `window start`, if it is <= `start`."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entry(user_id)
+            cached = entry.trackings.get(tracking_type) if entry is not None else None
+        if cached is None or cached[0] > start:
+            CACHE_MISSES.labels("trackings").inc()
+            return None
+        CACHE_HITS.labels("trackings").inc()
+        return cached[1]
+
+    def set_trackings(
+        self,
+        user_id: int,
+        tracking_type: str,
+        window_start: datetime,
+        trackings: list[dict],
+        token: int,
+    ) -> None:
+        size = len(orjson.dumps(trackings))
+        if size + ENTRY_SIZE > self.max_bytes:
+            return
+        with self._lock:
+            entry = self._writable_entry(user_id, token)
+            if entry is None:
+                return
+            previous = entry.trackings.get(tracking_type)
+            growth = size - (previous[2] if previous is not None else 0)
+            entry.trackings[tracking_type] = (window_start, trackings, size)
+            entry.size += growth
+            self._size += growth
+            self._evict()
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._clock += 1
+            self._invalidated[user_id] = self._clock
+            self._invalidated.move_to_end(user_id)
+            if len(self._invalidated) > MAX_INVALIDATIONS:
+                _, self._forgotten = self._invalidated.popitem(last=False)
+            self._remove(user_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clock += 1
+            self._forgotten = self._clock
+            self._invalidated.clear()
+            self._users.clear()
+            self._size = 0
+
+    def _entry(self, user_id: int) -> _UserEntry | None:
+        entry = self._users.get(user_id)
+        if entry is None:
+            return None
+        if entry.expires < time.monotonic():
+            self._remove(user_id)
+            return None
+        self._users.move_to_end(user_id)
+        return entry
+
+    def _writable_entry(self, user_id: int, token: int) -> _UserEntry | None:
+        """The entry to store a read started at `token`, None if it is stale."""
+        if not self.enabled or self._forgotten > token:
+            return None
+        if self._invalidated.get(user_id, 0) > token:
+            return None
+        entry = self._entry(user_id)
+        if entry is None:
+            entry = self._users[user_id] = _UserEntry(time.monotonic() + self.ttl)
+            self._size += entry.size
+            self._evict()
+        return entry
+
+    def _evict(self) -> None:
+        """Evict least recently used users until the cache fits the cap."""
+        while self._size > self.max_bytes and len(self._users) > 1:
+            _, evicted = self._users.popitem(last=False)
+            self._size -= evicted.size
+            CACHE_EVICTIONS.inc()
+
+    def _remove(self, user_id: int) -> None:
+        entry = self._users.pop(user_id, None)
+        if entry is not None:
+            self._size -= entry.size
+
+
+trackings = TrackingCache()
@@ -9,10 +9,21 @@ defined to handle specific errors during the CRUD operations.
 Functions:
     - get_tracking_by_id: Retrieve a tracking by its ID.
     - update_tracking: Update an existing tracking entry.
+    - build_tracking: Build a new tracking entry without adding it.
     - create_tracking: Create a new tracking entry.
     - delete_tracking: Delete a tracking entry by its ID.
     - delete_trackings_by_user: Delete all tracking entries associated with a user.
-    - get_trackings_by_user: Retrieve trackings by user ID with optional date filters.
+    - delete_trackings_by_users: Delete all tracking entries of several users.
+    - get_tracking_user_ids: Retrieve distinct user IDs that own trackings.
+    - get_max_tracking_user_id: Retrieve the highest user ID owning trackings.
+    - get_trackings_by_user: Retrieve trackings by user ID with optional date filters
+      and sparse fields.
+    - get_changes: Retrieve trackings changed and deleted since a point in time.
+    - get_changes_cursor: Compute the cursor of the next delta sync.
+    - get_db_time: Retrieve the current time of the database clock.
+    - prune_tombstones: Delete tombstones older than the retention window.
+    - get_data_version: Retrieve the version of a user's trackings.
+    - bump_data_version: Increment the version of a user's trackings.
     - create_symptom: Create a new symptom entry.
     - get_symptoms: Retrieve symptom entries, optionally filtered by IDs.
     - create_trigger: Create a new trigger entry.
@@ -25,18 +36,33 @@ Exceptions:
     - TrackingNotDeletedError: Raised when a tracking entry cannot be deleted.
     - TrackingNotUpdatedError: Raised when a tracking entry cannot be updated.
     - TrackingNotAllowedError: Raised when a user is not allowed to modify a tracking.
+    - ChangesExpiredError: Raised when a delta sync starts before the oldest
+      retained tombstone.
 """
 
-import sys
-from datetime import datetime
+import os
+from collections.abc import Collection
+from datetime import datetime, timedelta
 
+import cache
+import invalidation
 import models
 import schemas as schemes
+from logging_config import rate_limited
 from loguru import logger
-from sqlalchemy.orm import Session
+from sqlalchemy import func, insert, literal, select, union
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, load_only, raiseload, selectinload
 
 
-logger.add(sys.stderr, format="{level} {time} {message}", colorize=True, level="INFO")
+# time a write transaction may take between setting `updated` and committing
+CHANGES_CURSOR_OVERLAP = timedelta(
+    seconds=float(os.getenv("CHANGES_CURSOR_OVERLAP", "60"))
+)
+# tombstones older than this are pruned, older cursors need a full sync
+TOMBSTONE_RETENTION = timedelta(
+    days=float(os.getenv("TOMBSTONE_RETENTION_DAYS", "90"))
+)
 
 
 class TrackingNotValidError(Exception):
@@ -59,6 +85,58 @@ class TrackingNotAllowedError(Exception):
     pass
 
 
+class ChangesExpiredError(Exception):
+    pass
+
+
+def get_data_version(db: Session, user_id: int) -> int:
+    """Version of the user's trackings, 0 if they were never written."""
+    return db.scalar(
+        select(models.UserDataVersion.version).where(
+            models.UserDataVersion.user_id == user_id
+        )
+    ) or 0
+
+
+def bump_data_version(db: Session, user_id: int) -> None:
+    """Increment the version of the user's trackings, committed with the write."""
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(models.UserDataVersion)
+    db.execute(
+        statement.values(user_id=user_id, version=1).on_conflict_do_update(
+            index_elements=["user_id"],
+            set_={"version": models.UserDataVersion.version + 1},
+        )
+    )
+
+
+def relationship_loaders(model) -> list:
+    """Eager loaders for all relationships of a tracking model (avoids N+1)."""
+    return [
+        selectinload(getattr(model, relation.key))
+        for relation in model.__mapper__.relationships
+    ]
+
+
+def field_loaders(model, fields: Collection[str] | None = None) -> list:
+    """
+    Loaders for the `fields` of a tracking model, all fields if None.
+
+    Only the id and the requested columns are selected and only the requested
+    relationships are loaded. Other attributes raise instead of lazy loading.
+    """
+    if fields is None:
+        return relationship_loaders(model)
+    relationships = model.__mapper__.relationships
+    columns, loaders = [], []
+    for field in fields:
+        if field in relationships:
+            loaders.append(selectinload(getattr(model, field)))
+        else:
+            columns.append(getattr(model, field))
+    return [load_only(model.id, *columns, raiseload=True), *loaders, raiseload("*")]
+
+
 def get_model_by_attribute(attribute):
     d = {
         "symptoms": models.Symptom,
@@ -134,8 +212,12 @@ def update_tracking(
             ],
             update=True,
         )
+        # also when only relationships changed, so delta syncs pick it up
+        db_tracking.updated = func.now()
+        bump_data_version(db, user_id)
 
         db.commit()
+        invalidation.bus.invalidate(user_ids=[user_id])
         db.refresh(db_tracking)
         return db_tracking
     except Exception as e:
@@ -146,13 +228,13 @@ def add_syptoms():
     pass
 
 
-def create_tracking(
+def build_tracking(
     db: Session,
     tracking: schemes.BaseModel,
     tracking_type: str,
     user_id: int,
 ) -> models.Tracking:
-    """Create a new tracking."""
+    """Build a new tracking with its symptoms and triggers, without adding it."""
     model = models.alchemy_model_factory(model_type=tracking_type)
     tracking_data = tracking.model_dump(
         exclude={
@@ -165,23 +247,34 @@ def create_tracking(
     tracking_data_org = tracking.model_dump()
     tracking_data["user_id"] = user_id
 
-    try:
-        db_tracking = model(**tracking_data)
+    db_tracking = model(**tracking_data)
+    add_values_to_model(
+        db,
+        db_tracking,
+        tracking_data_org,
+        attributes=[
+            "symptoms",
+            "triggers",
+            "late_morning_symptoms",
+            "afternoon_symptoms",
+        ],
+    )
+    return db_tracking
 
-        add_values_to_model(
-            db,
-            db_tracking,
-            tracking_data_org,
-            attributes=[
-                "symptoms",
-                "triggers",
-                "late_morning_symptoms",
-                "afternoon_symptoms",
-            ],
-        )
 
+def create_tracking(
+    db: Session,
+    tracking: schemes.BaseModel,
+    tracking_type: str,
+    user_id: int,
+) -> models.Tracking:
+    """Create a new tracking."""
+    try:
+        db_tracking = build_tracking(db, tracking, tracking_type, user_id)
         db.add(db_tracking)
+        bump_data_version(db, user_id)
         db.commit()
+        invalidation.bus.invalidate(user_ids=[user_id])
         db.refresh(db_tracking)
 
         return db_tracking
@@ -209,42 +302,143 @@ def delete_tracking(
 
     try:
         db.delete(db_tracking)
+        db.add(
+            models.DeletedTracking(
+                tracking_type=tracking_type,
+                tracking_id=tracking_id,
+                user_id=user_id,
+            )
+        )
+        bump_data_version(db, user_id)
         db.commit()
+        invalidation.bus.invalidate(user_ids=[user_id])
     except Exception as e:
         raise TrackingNotDeletedError(f"Tracking could not be deleted: {str(e)}")
 
     return db_tracking
 
 
+def log_deletions(db: Session, tracking_type: str, condition) -> None:
+    """Write tombstones for the trackings matching `condition`, in one statement."""
+    model = models.alchemy_model_factory(model_type=tracking_type)
+    db.execute(
+        insert(models.DeletedTracking).from_select(
+            ["tracking_type", "tracking_id", "user_id", "deleted"],
+            select(literal(tracking_type), model.id, model.user_id, func.now()).where(
+                condition
+            ),
+        )
+    )
+
+
 def delete_trackings_by_user(
     db: Session,
     user_id: int,
+    forget: bool = False,
 ) -> None:
-    """Delete all trackings by user_id."""
+    """
+    Delete all trackings by user_id. With `forget` (the user was deleted) no
+    tombstones are written and existing ones and the data version are deleted
+    as well.
+    """
     try:
-        db.query(models.Sleep).filter(models.Sleep.user_id == user_id).delete(
-            synchronize_session=False
-        )
-
-        db.query(models.Day).filter(models.Day.user_id == user_id).delete(
-            synchronize_session=False
-        )
+        for tracking_type in ("sleep", "day"):
+            model = models.alchemy_model_factory(model_type=tracking_type)
+            if not forget:
+                log_deletions(db, tracking_type, model.user_id == user_id)
+            db.query(model).filter(model.user_id == user_id).delete(
+                synchronize_session=False
+            )
+        if forget:
+            for model in (models.DeletedTracking, models.UserDataVersion):
+                db.query(model).filter(model.user_id == user_id).delete(
+                    synchronize_session=False
+                )
+        else:
+            bump_data_version(db, user_id)
         db.commit()
-        logger.info(f"Deleted all trackings for user {user_id} successfully.")
+        invalidation.bus.invalidate(user_ids=[user_id])
+        rate_limited("crud.delete_trackings_by_user").info(
+            f"Deleted all trackings for user {user_id} successfully."
+        )
 
     except Exception as e:
         logger.warning(f"Deletion of trackings for user {user_id} not happended.")
         raise Exception(f"Fehler beim Löschen der Trackings: {str(e)}")
 
 
+def delete_trackings_by_users(
+    db: Session,
+    user_ids: list[int],
+) -> int:
+    """
+    Delete all trackings, tombstones and data versions of the given (deleted)
+    users. Returns the deleted tracking count.
+    """
+    deleted = 0
+    for model in (models.Sleep, models.Day):
+        deleted += (
+            db.query(model)
+            .filter(model.user_id.in_(user_ids))
+            .delete(synchronize_session=False)
+        )
+    for model in (models.DeletedTracking, models.UserDataVersion):
+        db.query(model).filter(model.user_id.in_(user_ids)).delete(
+            synchronize_session=False
+        )
+    db.commit()
+    invalidation.bus.invalidate(user_ids=user_ids)
+    return deleted
+
+
+def get_tracking_user_ids(
+    db: Session,
+    after_id: int = 0,
+    limit: int = 1000,
+) -> list[int]:
+    """
+    Get distinct user ids owning sleep or day trackings in ascending order.
+
+    Keyset paginated by `after_id`. Each table is limited to its first `limit`
+    distinct user ids before the union, so a page is two short index range
+    scans on the (user_id, date) unique constraints instead of deduplicating
+    all remaining ids.
+    """
+    pages = [
+        select(model.user_id)
+        .where(model.user_id > after_id)
+        .distinct()
+        .order_by(model.user_id)
+        .limit(limit)
+        .subquery()
+        for model in (models.Sleep, models.Day)
+    ]
+    ids = union(*(select(page.c.user_id) for page in pages)).subquery()
+    query = select(ids.c.user_id).order_by(ids.c.user_id).limit(limit)
+    return db.execute(query).scalars().all()
+
+
+def get_max_tracking_user_id(db: Session) -> int | None:
+    """Get the highest user id owning sleep or day trackings, None if none."""
+    ids = [
+        db.scalar(select(func.max(model.user_id)))
+        for model in (models.Sleep, models.Day)
+    ]
+    return max((user_id for user_id in ids if user_id is not None), default=None)
+
+
 def get_trackings_by_user(
     db: Session,
     type: str,
     user_id: int,
     start_date: datetime | None = None,
     end_date: datetime | None = None,
+    fields: Collection[str] | None = None,
 ) -> list[models.Tracking]:
-    """Get trackings by user_id. Optionally filter by start and end dates."""
+    """
+    Get trackings by user_id. Optionally filter by start and end dates and
+    load only some `fields` (see field_loaders).
+    """
     model = models.alchemy_model_factory(model_type=type)
     queries = [model.user_id == user_id]
 
@@ -256,7 +450,101 @@ def get_trackings_by_user(
             queries.append(model.timestamp >= start_date)
             queries.append(model.timestamp <= end_date)
 
-    return db.query(model).filter(*queries).all()
+    return (
+        db.query(model).options(*field_loaders(model, fields)).filter(*queries).all()
+    )
+
+
+def get_db_time(db: Session) -> datetime:
+    """Get the current time of the database clock."""
+    # the columns are naive timestamps in the time zone of the database
+    return db.scalar(select(func.now())).replace(tzinfo=None)
+
+
+def get_changes(
+    db: Session,
+    user_id: int,
+    since: datetime | None = None,
+    now: datetime | None = None,
+) -> tuple[list[models.Tracking], list[models.DeletedTracking]]:
+    """
+    Get the trackings of a user created or updated at or after `since` and
+    the tombstones of trackings deleted at or after `since`. Without `since`
+    all trackings and no tombstones are returned (full sync).
+
+    Raises ChangesExpiredError if `since` is older than TOMBSTONE_RETENTION
+    before `now` (the database clock by default), because tombstones of that
+    period may already be pruned.
+    """
+    if since is not None:
+        now = now or get_db_time(db)
+        if since < now - TOMBSTONE_RETENTION:
+            raise ChangesExpiredError(
+                "Changes since this cursor are no longer available, "
+                "sync without a cursor"
+            )
+
+    trackings: list[models.Tracking] = []
+    for model in (models.Sleep, models.Day):
+        query = select(model).options(*relationship_loaders(model))
+        query = query.where(model.user_id == user_id)
+        if since is not None:
+            query = query.where(model.updated >= since)
+        trackings += db.scalars(query.order_by(model.updated)).all()
+
+    if since is None:
+        return trackings, []
+    deletions = db.scalars(
+        select(models.DeletedTracking)
+        .where(
+            models.DeletedTracking.user_id == user_id,
+            models.DeletedTracking.deleted >= since,
+        )
+        .order_by(models.DeletedTracking.deleted)
+    ).all()
+    return trackings, list(deletions)
+
+
+def get_changes_cursor(
+    db: Session,
+    trackings: list[models.Tracking],
+    deletions: list[models.DeletedTracking],
+    since: datetime | None = None,
+    now: datetime | None = None,
+) -> datetime | None:
+    """
+    Get the cursor of the next delta sync after `trackings` and `deletions`
+    were read, `since` if nothing changed.
+
+    `updated` and `deleted` are the start time of the writing transaction,
+    which may commit after the changes were read. The cursor therefore stays
+    CHANGES_CURSOR_OVERLAP behind the database clock (`now`), so changes
+    committed late are returned by the next sync.
+    """
+    changed = [tracking.updated for tracking in trackings if tracking.updated]
+    changed += [deletion.deleted for deletion in deletions]
+    cursor = max(changed, default=since)
+    if cursor is None:
+        return None
+    now = now or get_db_time(db)
+    return min(cursor, now - CHANGES_CURSOR_OVERLAP)
+
+
+def prune_tombstones(db: Session) -> int:
+    """
+    Delete the tombstones older than TOMBSTONE_RETENTION.
+
+    Returns:
+        int: The number of deleted tombstones.
+    """
+    cutoff = get_db_time(db) - TOMBSTONE_RETENTION
+    deleted = (
+        db.query(models.DeletedTracking)
+        .filter(models.DeletedTracking.deleted < cutoff)
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
 
 
 def get_trackings(
@@ -294,6 +582,7 @@ def create_symptom(
     db_symptom = models.Symptom(**symptom.model_dump())
     db.add(db_symptom)
     db.commit()
+    invalidation.bus.invalidate(keys=[cache.SYMPTOMS_KEY])
     db.refresh(db_symptom)
     return db_symptom
 
@@ -318,6 +607,7 @@ def create_trigger(
     db_trigger = models.Trigger(**trigger.model_dump())
     db.add(db_trigger)
     db.commit()
+    invalidation.bus.invalidate(keys=[cache.TRIGGERS_KEY])
     db.refresh(db_trigger)
     return db_trigger
 
@@ -1,14 +1,142 @@
 import os
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+import logging_config
+import metrics
+import tracing
+from loguru import logger
+from sqlalchemy import create_engine, event, make_url, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from sqlalchemy.pool import QueuePool
+from starlette.datastructures import MutableHeaders
 
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
+# optional read replica for read-only routes, the primary if unset
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true")
+# milliseconds, 0 disables the timeout
+DB_STATEMENT_TIMEOUT = int(os.getenv("DB_STATEMENT_TIMEOUT", "0"))
+
+POOL_CHECKOUT_WAIT = metrics.Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time to get a connection from the pool, including connecting.",
+    labelnames=("pool",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool recording the checkout wait in POOL_CHECKOUT_WAIT."""
+
+    pool_name = "primary"
+
+    def recreate(self) -> "TimedQueuePool":
+        pool = super().recreate()
+        pool.pool_name = self.pool_name
+        return pool
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            POOL_CHECKOUT_WAIT.labels(self.pool_name).observe(
+                time.perf_counter() - start
+            )
+
+
+def create_db_engine(url: str, pool_name: str = "primary") -> Engine:
+    """Create an engine with the pool settings from the environment."""
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # in-memory databases live in one connection, keep the default pool
+        return create_engine(url)
+
+    options = {
+        "poolclass": TimedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if DB_STATEMENT_TIMEOUT and url.get_backend_name() == "postgresql":
+        options["connect_args"] = {
+            "options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT}"
+        }
+    engine = create_engine(url, **options)
+    engine.pool.pool_name = pool_name
+    return engine
+
 
 Base = declarative_base()
-engine = create_engine(DATABASE_URL)  # , echo=True
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# engines are created on first use, creating one imports the database driver
+_engines: dict[str, Engine] = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(replica: bool = False) -> Engine:
+    """The engine of the primary, or of the read replica (the primary if unset)."""
+    if replica and not DATABASE_READ_URL:
+        replica = False
+    pool_name = "replica" if replica else "primary"
+    with _engines_lock:
+        if pool_name not in _engines:
+            url = DATABASE_READ_URL if replica else DATABASE_URL
+            _engines[pool_name] = create_db_engine(url, pool_name=pool_name)
+        return _engines[pool_name]
+
+
+def __getattr__(name: str):
+    # `engine` and `read_engine` are created when they are first accessed
+    if name == "engine":
+        return get_engine()
+    if name == "read_engine":
+        return get_engine(replica=True)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class LazySessionmaker(sessionmaker):
+    """sessionmaker binding to its engine when the first session is created."""
+
+    def __init__(self, replica: bool = False, **kw):
+        super().__init__(**kw)
+        self.replica = replica
+
+    def __call__(self, **local_kw) -> Session:
+        if self.kw.get("bind") is None:
+            self.configure(bind=get_engine(self.replica))
+        return super().__call__(**local_kw)
+
+
+SessionLocal = LazySessionmaker(autocommit=False, autoflush=False)
+ReadSessionLocal = LazySessionmaker(replica=True, autocommit=False, autoflush=False)
+
+
+def _pool_stat(name: str) -> int:
+    engine = _engines.get("primary")
+    return getattr(engine.pool, name, lambda: 0)() if engine is not None else 0
+
+
+metrics.Gauge(
+    "db_pool_checked_out",
+    "Database connections currently checked out of the pool.",
+).set_function(lambda: _pool_stat("checkedout"))
+metrics.Gauge(
+    "db_pool_size",
+    "Configured size of the database connection pool.",
+).set_function(lambda: _pool_stat("size"))
 
 
 def init_db():
@@ -16,7 +144,18 @@ def init_db():
 
     # create test db on the fly when testing
     if "test.db" in DATABASE_URL:
-        Base.metadata.create_all(bind=engine)
+        Base.metadata.create_all(bind=get_engine())
+
+
+def check_connection() -> bool:
+    """True if the database answers a trivial query, used by readiness checks."""
+    try:
+        with get_engine().connect() as connection:
+            connection.execute(text("SELECT 1"))
+        return True
+    except Exception as e:
+        logger.warning(f"Database not reachable: {e}")
+        return False
 
 
 def get_db():
@@ -25,3 +164,121 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_read_db():
+    """
+    Session on the read replica, for routes which only read. Replicas lag
+    behind the primary, so a read right after a write may miss it.
+    """
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@dataclass
+class QueryStats:
+    """SQL statistics of a single request."""
+
+    count: int = 0
+    duration: float = 0.0
+    slowest_duration: float = 0.0
+    slowest_statement: str | None = None
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.duration += duration
+        if duration > self.slowest_duration:
+            self.slowest_duration = duration
+            self.slowest_statement = statement
+
+    def server_timing(self) -> str:
+        return (
+            f'db;dur={self.duration * 1000:.2f};desc="{self.count} queries", '
+            f"db-slowest;dur={self.slowest_duration * 1000:.2f}"
+        )
+
+
+# set per request by SqlTimingMiddleware, None outside of requests
+query_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    span = tracing.begin_span(
+        f"SQL {statement.split(maxsplit=1)[0]}",
+        kind=tracing.SPAN_KIND_CLIENT,
+        attributes={"db.system": conn.dialect.name, "db.statement": statement},
+    )
+    conn.info.setdefault("query_start_time", []).append((time.perf_counter(), span))
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start, span = conn.info["query_start_time"].pop()
+    duration = time.perf_counter() - start
+    tracing.end_span(span)
+    stats = query_stats.get()
+    if stats is not None:
+        stats.record(statement, duration)
+
+
+@event.listens_for(Engine, "handle_error")
+def handle_error(context):
+    conn = context.connection
+    if context.statement and conn is not None and conn.info.get("query_start_time"):
+        _, span = conn.info["query_start_time"].pop()
+        tracing.end_span(span, error=True)
+
+
+class SqlTimingMiddleware:
+    """
+    ASGI middleware collecting SQL statistics per request and reporting them
+    as Server-Timing.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = QueryStats()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if stats.count:
+                    MutableHeaders(scope=message).append(
+                        "Server-Timing", stats.server_timing()
+                    )
+            await send(message)
+
+        token = query_stats.set(stats)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            query_stats.reset(token)
+            if stats.count:
+                self.log(scope, status_code, stats)
+
+    @staticmethod
+    def log(scope, status_code: int, stats: QueryStats) -> None:
+        method, path = scope["method"], scope["path"]
+        logging_config.sampled().bind(
+            method=method,
+            path=path,
+            status=status_code,
+            queries=stats.count,
+            db_ms=round(stats.duration * 1000, 2),
+            slowest_ms=round(stats.slowest_duration * 1000, 2),
+            slowest_statement=" ".join(stats.slowest_statement.split())[:200],
+        ).info(
+            f"{method} {path}: {stats.count} queries "
+            f"in {stats.duration * 1000:.2f} ms"
+        )
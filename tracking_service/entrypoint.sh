@@ -6,10 +6,10 @@
 # Wait for PostgreSQL database to be available
 ./wait-for-it.sh tracking_db:5432 -- echo "PostgreSQL is up and running"
 
-# Run Alembic migrations
+# Run Alembic migrations, skipped if the database is current
 echo "Starting the migration process...\n"
-alembic upgrade head
+python migrate.py || exit 1
 
 # Start the Uvicorn server
 echo "Starting the Uvicorn server...\n"
-exec uvicorn main:app --host 0.0.0.0 --port 8002 --reload
+exec python server.py --port 8002
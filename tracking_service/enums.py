@@ -18,3 +18,8 @@ class SleepQuality(StrEnum):
     BAD = "bad"
     MODERATE = "moderate"
     GOOD = "good"
+
+
+class ResponseFormat(StrEnum):
+    FULL = "full"
+    COMPACT = "compact"
@@ -1,8 +1,8 @@
-import psycopg2
 from fastapi import Depends, FastAPI, HTTPException, Request, Response, Security, status
 from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
+from loguru import logger
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
@@ -14,13 +14,15 @@ def format_sqlalchemy_error(error):
     """
     Format SQLAlchemy error messages for better readability.
     """
-    print("SQLAlchem error type:", type(error))
+    logger.debug(f"SQLAlchemy error type: {type(error)}")
     try:
+        import psycopg2  # only needed here, not at startup
+
         if getattr(error, "orig") and isinstance(error.orig, psycopg2.Error):
             pg_error = error.orig
             return f"{pg_error.pgcode} - {pg_error.pgerror.strip()}"
     except Exception as e:
-        print("format sql alchemy:", e)
+        logger.warning(f"SQLAlchemy error could not be formatted: {e}")
     return str(error)
 
 
@@ -1,109 +1,131 @@
-import json
-import sys
 import threading
+import time
 
 import crud
-import pika
+import invalidation
+import metrics
+import tracing
+from broker import Broker, Message, get_broker
 from database import get_db
+from logging_config import rate_limited
 from loguru import logger
 
 
-logger.add(sys.stderr, format="{level} {time} {message}", colorize=True, level="INFO")
+CONSUME_LAG = metrics.Histogram(
+    "broker_consume_lag_seconds",
+    "Time between publishing an event and the start of its handling.",
+    ("type",),
+)
 
 
-def callback(ch, method, properties, body):
+def handle_event(event: dict) -> None:
     """
-    Callback function to handle messages from the RabbitMQ queue.
+    Handle a single event from the user events exchange.
 
-    This function processes messages by checking if the event type is
-    "USER_DELETED". If so, it deletes user-related tracking data from
-    the database using the provided user ID.
+    If the event type is "USER_DELETED", all tracking data of the user is
+    deleted from the database. "CACHE_INVALIDATED" events of other replicas
+    evict cached data (see `invalidation.py`).
 
     Args:
-        ch (BlockingChannel): The channel object.
-        method (Basic.Deliver): Method frame containing delivery info.
-        properties (BasicProperties): Properties of the message.
-        body (bytes): The message body, containing the event data in JSON format.
+        event (dict): The decoded event, containing `type` and `user_id`.
 
     Returns:
         None
     """
-    event = json.loads(body)
-    user_id = int(event["user_id"])
-
     if event["type"] == "USER_DELETED":
+        user_id = int(event["user_id"])
         db = next(get_db())
-        crud.delete_trackings_by_user(db, user_id)
-        logger.info(f"Successfully deleted: {event['type']}")
+        try:
+            crud.delete_trackings_by_user(db, user_id, forget=True)
+        finally:
+            db.close()
+        rate_limited("events.handled").info(f"Successfully deleted: {event['type']}")
+    elif event["type"] == invalidation.EVENT_TYPE:
+        invalidation.handle_event(event)
     else:
         logger.info(f"Unknown event type: {event['type']}")
 
 
-def consume_events() -> None:
+def callback(message: Message, broker: Broker | None = None) -> None:
     """
-    Start consuming events from a queue bound to the 'user_events_exchange'
-    fanout exchange in RabbitMQ.
-
-    This function establishes a connection to the RabbitMQ server, declares
-    a fanout exchange named 'user_events_exchange', creates an exclusive
-    queue for the consumer, binds the queue to the fanout exchange, and
-    starts consuming messages from the queue.
+    Callback function to handle messages from the broker.
 
-    The callback function is used to process incoming messages, and
-    auto-acknowledgment is enabled to confirm message receipt.
+    The message is acknowledged after handling, also when handling fails,
+    so a broken event cannot block the queue.
 
-    If the connection or consumption fails, an error is logged, and the
-    process exits with status code 1.
+    Args:
+        message (Message): The delivered message.
+        broker (Broker): The broker the message was received from.
 
     Returns:
         None
     """
-    try:
-        logger.info("Consumer is prepareing to consume events.")
-        # Establish connection to RabbitMQ
-        connection = pika.BlockingConnection(pika.ConnectionParameters("rabbitmq"))
-        channel = connection.channel()
-
-        # Declare the fanout exchange
-        channel.exchange_declare(
-            exchange="user_events_exchange", exchange_type="fanout"
+    broker = broker or get_broker()
+    if message.published_at is not None:
+        CONSUME_LAG.labels(message.body.get("type")).observe(
+            time.time() - message.published_at
         )
+    try:
+        with tracing.start_span(
+            f"event {message.body.get('type')}",
+            kind=tracing.SPAN_KIND_CONSUMER,
+            parent=tracing.extract(message.headers),
+        ):
+            handle_event(message.body)
+    except Exception as e:
+        logger.error(f"Could not handle event {message.body}: {e}")
+    finally:
+        broker.ack(message)
+
+
+def consume_events(broker: Broker | None = None) -> None:
+    """
+    Start consuming events from the 'user_events_exchange' fanout exchange.
 
-        # Declare an exclusive queue for this consumer and bind it to the exchange
-        result = channel.queue_declare(queue="", exclusive=True)
-        queue_name = result.method.queue
-        channel.queue_bind(exchange="user_events_exchange", queue=queue_name)
-
-        # Start consuming messages from the queue
-        channel.basic_consume(
-            queue=queue_name, on_message_callback=callback, auto_ack=True
-        )
-        logger.info("Consumer is consuming events.")
-        channel.start_consuming()
-    except Exception:
-        logger.error("Consumer could not start. Exiting.")
-        exit(1)
+    The broker is selected by the BROKER_BACKEND environment variable
+    (see `broker.py`), so the consumer runs on RabbitMQ in production and
+    on the in-memory transport in tests and benchmarks.
 
+    If the connection or consumption fails, an error is logged and the
+    consumer stops, which the readiness check reports.
 
-def old_consume_events() -> None:
+    Returns:
+        None
+    """
+    broker = broker or get_broker()
     try:
-        connection = pika.BlockingConnection(pika.ConnectionParameters("rabbitmq"))
-        channel = connection.channel()
-        channel.queue_declare(queue="user_events")
-        channel.basic_consume(
-            queue="user_events", on_message_callback=callback, auto_ack=True
-        )
-        channel.start_consuming()
         logger.info("Consumer is consuming events.")
-    except Exception:
-        print("Couldot start consumer")
-        logger.error("Consumer Could not start. exit.")
-        exit(1)
+        broker.subscribe(lambda message: callback(message, broker))
+    except Exception as e:
+        logger.error(f"Consumer stopped: {e}")
+
+
+_consumer: tuple[threading.Thread, Broker] | None = None
 
 
-# Start the consumer in a separate thread
-def start_consuming_events() -> None:
-    print("start_consuming_events")
+def start_consuming_events(broker: Broker | None = None) -> threading.Thread:
+    """Start the consumer in a daemon thread, called on application startup."""
+    global _consumer
+    broker = broker or get_broker()
     logger.info("Starting consumer thread.")
-    thread = threading.Thread(target=consume_events)
+    thread = threading.Thread(
+        target=consume_events, args=(broker,), name="event-consumer", daemon=True
+    )
     thread.start()
+    _consumer = (thread, broker)
+    return thread
+
+
+def stop_consuming_events(timeout: float = 5.0) -> None:
+    """Stop the consumer thread, called on application shutdown."""
+    global _consumer
+    if _consumer is None:
+        return
+    thread, broker = _consumer
+    broker.close()
+    thread.join(timeout)
+    _consumer = None
+
+
+def consumer_alive() -> bool:
+    return _consumer is not None and _consumer[0].is_alive()
@@ -0,0 +1,219 @@
+"""
+Idempotency Module
+
+Clients on flaky networks retry POST requests whose response got lost. A
+request with an `Idempotency-Key` header to one of the configured paths is
+executed once per key: its response is stored together with a fingerprint
+of the request (method, path, query and body) for IDEMPOTENCY_TTL seconds
+(default 86400), and repeats are answered from the store before the
+request body is validated or the route runs. Replayed responses carry the
+header `Idempotent-Replayed: true`.
+
+- The same key with a different request is rejected with 422.
+- The same key while the first request still runs is rejected with 409, the
+  client retries later. The key is reserved for IDEMPOTENCY_LOCK_TTL
+  seconds (default 60), in case the process dies.
+- Responses with status >= 500 are not stored, the request can be retried.
+
+Keys are scoped by the user (the `sub` of the bearer token, which stays
+the same when the token is refreshed), so a user never gets the response of
+another user's request. Requests without a valid token are passed on
+without idempotency, the route rejects them. Only the `anonymous_paths`
+(e.g. the signup) are keyed by the Idempotency-Key alone. Entries are kept
+in the cache backend (see cache_backend.py), with Redis they are shared by
+all replicas.
+
+Key Components:
+- IdempotencyMiddleware: ASGI middleware, configured with the paths and the
+  token secret.
+"""
+
+import base64
+import hashlib
+import json
+import os
+from collections.abc import Iterable
+
+import anyio.to_thread
+import cache_backend
+import jwt
+import metrics
+from starlette.responses import JSONResponse
+
+
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_LOCK_TTL = float(os.getenv("IDEMPOTENCY_LOCK_TTL", "60"))
+
+MAX_KEY_LENGTH = 255
+
+IDEMPOTENT_REPLAYS = metrics.Counter(
+    "idempotent_replays_total",
+    "Requests answered with the stored response of their Idempotency-Key.",
+    labelnames=("path",),
+)
+
+
+async def _call(function, *args):
+    """Run a cache call, in a worker thread if it goes over the network."""
+    if isinstance(cache_backend.get_cache(), cache_backend.LocalBackend):
+        return function(*args)
+    return await anyio.to_thread.run_sync(function, *args)
+
+
+async def _read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body", False):
+            return body
+
+
+class IdempotencyMiddleware:
+    """
+    ASGI middleware answering repeated POSTs of an Idempotency-Key. Bearer
+    tokens are verified with `secret_key` to scope the keys by user.
+    """
+
+    def __init__(
+        self,
+        app,
+        prefix: str,
+        secret_key: str,
+        algorithm: str = "HS256",
+        paths: Iterable[str] = (),
+        anonymous_paths: Iterable[str] = (),
+        ttl: float = IDEMPOTENCY_TTL,
+    ):
+        self.app = app
+        self.anonymous_paths = set(anonymous_paths)
+        self.paths = set(paths) | self.anonymous_paths
+        self.prefix = prefix
+        self.secret_key = secret_key
+        self.algorithm = algorithm
+        self.ttl = ttl
+
+    def _owner(self, path: str, headers: dict[bytes, bytes]) -> str | None:
+        """The user the key belongs to, None if the request is not authenticated."""
+        if path in self.anonymous_paths:
+            return ""
+        scheme, _, token = headers.get(b"authorization", b"").decode().partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return None
+        try:
+            payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+        except jwt.PyJWTError:
+            return None
+        user_id = payload.get("sub")
+        return f"user:{user_id}" if user_id is not None else None
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or scope["path"] not in self.paths
+        ):
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        key = headers.get(b"idempotency-key")
+        if key is None:
+            return await self.app(scope, receive, send)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            response = JSONResponse(
+                {"detail": f"Idempotency-Key must have 1 to {MAX_KEY_LENGTH} chars"},
+                status_code=400,
+            )
+            return await response(scope, receive, send)
+
+        owner = self._owner(scope["path"], headers)
+        if owner is None:
+            return await self.app(scope, receive, send)
+
+        body = await _read_body(receive)
+        scoped_key = hashlib.sha256(owner.encode() + b"\0" + key)
+        store_key = f"{self.prefix}:idempotency:{scoped_key.hexdigest()}"
+        request = [scope["method"].encode(), scope["path"].encode()]
+        request += [scope.get("query_string", b""), body]
+        fingerprint = hashlib.sha256(b"\0".join(request)).hexdigest()
+
+        cache = cache_backend.get_cache()
+        reservation = json.dumps({"fingerprint": fingerprint}).encode()
+        if not await _call(cache.add, store_key, reservation, IDEMPOTENCY_LOCK_TTL):
+            stored = await _call(cache.get, store_key)
+            return await self._repeat(scope, receive, send, stored, fingerprint)
+
+        status_code = 500
+        response_headers: list[tuple[bytes, bytes]] = []
+        response_body = b""
+        body_sent = False
+
+        async def receive_body():
+            nonlocal body_sent
+            if body_sent:
+                return await receive()
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send_wrapper(message):
+            nonlocal status_code, response_headers, response_body
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                response_headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                response_body += message.get("body", b"")
+            await send(message)
+
+        try:
+            await self.app(scope, receive_body, send_wrapper)
+        except BaseException:
+            await _call(cache.delete, store_key)
+            raise
+
+        if status_code >= 500:
+            await _call(cache.delete, store_key)
+            return
+        record = {
+            "fingerprint": fingerprint,
+            "status": status_code,
+            "headers": [
+                [name.decode("latin-1"), value.decode("latin-1")]
+                for name, value in response_headers
+            ],
+            "body": base64.b64encode(response_body).decode(),
+        }
+        await _call(cache.set, store_key, json.dumps(record).encode(), self.ttl)
+
+    async def _repeat(
+        self, scope, receive, send, stored: bytes | None, fingerprint: str
+    ):
+        """Replay the stored response, or reject a conflicting repeat."""
+        record = json.loads(stored) if stored is not None else None
+        if record is not None and record["fingerprint"] != fingerprint:
+            response = JSONResponse(
+                {"detail": "Idempotency-Key was used for a different request"},
+                status_code=422,
+            )
+            return await response(scope, receive, send)
+        if record is None or "status" not in record:
+            response = JSONResponse(
+                {"detail": "A request with this Idempotency-Key is in progress"},
+                status_code=409,
+            )
+            return await response(scope, receive, send)
+
+        IDEMPOTENT_REPLAYS.labels(scope["path"]).inc()
+        headers = [
+            (name.encode("latin-1"), value.encode("latin-1"))
+            for name, value in record["headers"]
+        ]
+        headers.append((b"idempotent-replayed", b"true"))
+        await send(
+            {
+                "type": "http.response.start",
+                "status": record["status"],
+                "headers": headers,
+            }
+        )
+        await send(
+            {"type": "http.response.body", "body": base64.b64decode(record["body"])}
+        )
@@ -0,0 +1,162 @@
+"""
+Cache Invalidation Module
+
+A write handled by one replica must evict the cached data of all other
+replicas. The crud write paths call `bus.invalidate(...)`, which evicts the
+local entries right away and queues the user ids and cache keys for a
+broadcast on the user events exchange of the broker (see `broker.py`).
+Every replica's event consumer applies the CACHE_INVALIDATED events of the
+other replicas:
+
+    {"type": "CACHE_INVALIDATED", "origin": "<replica>", "user_ids": [1, 2],
+     "keys": ["tracking:catalog:symptoms"]}
+
+Write bursts do not flood the broker: a flusher thread publishes the queued
+invalidations every INVALIDATION_FLUSH_INTERVAL seconds (default 0.05), or
+as soon as INVALIDATION_MAX_BATCH (default 500) user ids and keys are
+queued. Repeated invalidations of a user or key within an interval are
+coalesced into one entry, and a flush publishes all its messages over one
+connection.
+
+Keys of a shared cache backend (Redis) are deleted once by the writing
+replica, the receivers only delete keys from their in-process backend.
+
+If publishing fails, the other replicas serve stale entries until they
+expire (TRACKING_CACHE_TTL, CATALOG_CACHE_TTL).
+
+Key Components:
+- InvalidationBus: Queues, coalesces and publishes invalidations.
+- bus: The bus of this process, started and stopped in the lifespan.
+- handle_event: Applies a CACHE_INVALIDATED event of another replica.
+"""
+
+import os
+import threading
+import uuid
+from collections.abc import Iterable
+
+import cache
+import cache_backend
+import metrics
+from broker import Broker, get_broker
+from logging_config import rate_limited
+from loguru import logger
+
+
+INVALIDATION_FLUSH_INTERVAL = float(os.getenv("INVALIDATION_FLUSH_INTERVAL", "0.05"))
+INVALIDATION_MAX_BATCH = int(os.getenv("INVALIDATION_MAX_BATCH", "500"))
+
+EVENT_TYPE = "CACHE_INVALIDATED"
+
+INVALIDATIONS = metrics.Counter(
+    "cache_invalidations_total",
+    "Invalidated user ids and cache keys, before coalescing.",
+)
+INVALIDATION_MESSAGES = metrics.Counter(
+    "cache_invalidation_messages_total",
+    "CACHE_INVALIDATED events by direction (published or applied).",
+    labelnames=("direction",),
+)
+
+
+def evict(user_ids: Iterable[int], keys: Iterable[str], shared: bool) -> None:
+    """Evict users from the tracking cache and keys from the cache backend."""
+    for user_id in user_ids:
+        cache.trackings.invalidate(user_id)
+    backend = cache_backend.get_cache()
+    keys = list(keys)
+    if keys and (shared or isinstance(backend, cache_backend.LocalBackend)):
+        backend.delete(*keys)
+
+
+class InvalidationBus:
+    def __init__(
+        self,
+        broker: Broker | None = None,
+        interval: float = INVALIDATION_FLUSH_INTERVAL,
+        max_batch: int = INVALIDATION_MAX_BATCH,
+    ):
+        self.broker = broker
+        self.interval = interval
+        self.max_batch = max_batch
+        # identifies the events of this replica, which it already applied
+        self.origin = uuid.uuid4().hex
+        self._user_ids: set[int] = set()
+        self._keys: set[str] = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def invalidate(
+        self, user_ids: Iterable[int] = (), keys: Iterable[str] = ()
+    ) -> None:
+        """Evict locally now and broadcast to the other replicas with the next flush."""
+        user_ids, keys = list(user_ids), list(keys)
+        evict(user_ids, keys, shared=True)
+        INVALIDATIONS.inc(len(user_ids) + len(keys))
+        with self._lock:
+            self._user_ids.update(user_ids)
+            self._keys.update(keys)
+            full = len(self._user_ids) + len(self._keys) >= self.max_batch
+        if full:
+            self._wake.set()
+
+    def flush(self) -> None:
+        """Publish the queued invalidations, in messages of at most max_batch."""
+        with self._lock:
+            entries = [("user_ids", user_id) for user_id in self._user_ids]
+            entries += [("keys", key) for key in self._keys]
+            self._user_ids, self._keys = set(), set()
+        if not entries:
+            return
+
+        messages = []
+        for start in range(0, len(entries), self.max_batch):
+            message = {"type": EVENT_TYPE, "origin": self.origin, "user_ids": []}
+            message["keys"] = []
+            for field, value in entries[start : start + self.max_batch]:
+                message[field].append(value)
+            messages.append(message)
+        try:
+            (self.broker or get_broker()).publish_batch(messages)
+            INVALIDATION_MESSAGES.labels("published").inc(len(messages))
+        except Exception as e:
+            rate_limited("invalidation.publish").warning(
+                f"Could not publish {len(entries)} cache invalidations: {e}"
+            )
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def start(self) -> None:
+        """Start the flusher thread, called on application startup."""
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="cache-invalidation", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the flusher thread and publish what is still queued."""
+        if self._thread is not None:
+            self._stopped.set()
+            self._wake.set()
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+
+bus = InvalidationBus()
+
+
+def handle_event(event: dict) -> None:
+    """Apply a CACHE_INVALIDATED event, unless this replica published it."""
+    if event.get("origin") == bus.origin:
+        return
+    evict(event.get("user_ids", []), event.get("keys", []), shared=False)
+    INVALIDATION_MESSAGES.labels("applied").inc()
+    logger.debug(f"Applied cache invalidation of replica {event.get('origin')}")
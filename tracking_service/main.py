@@ -1,15 +1,26 @@
 """
 Tracking Service - Main Module
 
+Importing this module only builds the application. Logging, the database,
+the event consumer and the loop monitor are started in the lifespan.
+
 Author: Bernd Fischer, 2024
 """
 
-import sys
+from contextlib import asynccontextmanager
 
+import auth
 import database
+import events
+import idempotency
+import invalidation
+import logging_config
+import loop_monitor
+import metrics
 import models
-from database import engine
-from events import start_consuming_events
+import profiling
+import tracing
+import write_buffer
 from fastapi import FastAPI, Request, status
 from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
@@ -20,7 +31,20 @@ from routers.trackings import router as trackings_router
 from routers.triggers import router as triggers_router
 
 
-database.init_db()  # Tabellen anlegen
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logging_config.configure()
+    database.init_db()  # Tabellen anlegen
+    events.start_consuming_events()
+    invalidation.bus.start()
+    if write_buffer.WRITE_BUFFER_ENABLED:
+        write_buffer.buffer.start()
+    await loop_monitor.monitor.start()
+    yield
+    await loop_monitor.monitor.stop()
+    write_buffer.buffer.stop()
+    invalidation.bus.stop()
+    events.stop_consuming_events()
 
 
 def get_app():
@@ -29,7 +53,24 @@ def get_app():
         docs_url="/trackings/docs",
         redoc_url="/trackings/redoc",
         title="Tracking Microservice",
+        lifespan=lifespan,
+    )
+
+    # innermost, so replayed responses are measured and traced as well
+    app.add_middleware(
+        idempotency.IdempotencyMiddleware,
+        paths={"/trackings/day", "/trackings/sleep"},
+        prefix="tracking",
+        secret_key=auth.SECRET_KEY,
+        algorithm=auth.ALGORITHM,
     )
+    app.add_middleware(database.SqlTimingMiddleware)
+    app.add_middleware(metrics.MetricsMiddleware)
+    app.add_route("/metrics", metrics.metrics_endpoint, include_in_schema=False)
+
+    tracing.configure(service_name="tracking-service")
+    app.add_middleware(tracing.TracingMiddleware)
+    app.add_middleware(profiling.ProfilingMiddleware)
 
     app.include_router(symptoms_router)
     app.include_router(triggers_router)
@@ -38,14 +79,6 @@ def get_app():
     return app
 
 
-logger.remove()  # remove default logger
-logger.add(
-    sys.stderr,
-    format="<level>{level}:</level> {module} {message}",
-    colorize=True,
-    level="INFO",
-)
-
 app = get_app()
 
 
@@ -68,9 +101,3 @@ async def validation_exception_handler(
             }
         ),
     )
-
-
-if __name__ == "__main__":
-    database.init_db()
-
-start_consuming_events()
@@ -18,6 +18,10 @@ Key Entities:
   or daily tracking entries.
 - Trigger: Represents a specific trigger that can be associated with
   daily activities.
+- DeletedTracking: Deletion log of sleep and day entries, read by clients
+  syncing their changes.
+- UserDataVersion: Counter per user, incremented by every tracking write of
+  the user, used as ETag of the user's trackings.
 
 The models define relationships such as many-to-many associations between
 symptoms, triggers, and tracking entries. Constraints are enforced to
@@ -30,9 +34,9 @@ Author: Bernd Fischer, 2024
 from database import Base
 from enums import SleepQuality, TriggerCategory
 from fastapi import HTTPException
-from sqlalchemy import Column, DateTime
+from sqlalchemy import BigInteger, Column, DateTime
 from sqlalchemy import Enum as SQLAEnum
-from sqlalchemy import ForeignKey, Integer, String, Table, UniqueConstraint
+from sqlalchemy import ForeignKey, Index, Integer, String, Table, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -123,6 +127,7 @@ class Day(Tracking):
             "date",
             name="day_uix_email_date",
         ),
+        Index("ix_days_user_id_updated", "user_id", "updated"),
     )
 
 
@@ -147,9 +152,35 @@ class Sleep(Tracking):
             "date",
             name="sleep_uix_email_date",
         ),
+        Index("ix_sleeps_user_id_updated", "user_id", "updated"),
     )
 
 
+class DeletedTracking(Base):
+    """Deletion log (tombstones) of sleep and day entries."""
+
+    __tablename__ = "deleted_trackings"
+
+    id = Column(Integer, primary_key=True)
+    tracking_type = Column(String, nullable=False)
+    tracking_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=False)
+    deleted = Column(DateTime, default=func.now(), nullable=False)
+    __table_args__ = (
+        Index("ix_deleted_trackings_user_id_deleted", "user_id", "deleted"),
+        Index("ix_deleted_trackings_deleted", "deleted"),
+    )
+
+
+class UserDataVersion(Base):
+    """Version of a user's trackings, incremented by every write."""
+
+    __tablename__ = "user_data_versions"
+
+    user_id = Column(Integer, primary_key=True, autoincrement=False)
+    version = Column(BigInteger, nullable=False, default=1)
+
+
 # reverse relationship
 Symptom.sleeps = relationship(
     "Sleep",
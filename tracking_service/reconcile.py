@@ -0,0 +1,177 @@
+"""
+Reconciliation of orphaned trackings.
+
+Events can get lost, so tracking_db may keep trackings of users that no
+longer exist in the user service. This command streams the sorted distinct
+user ids owning trackings and the sorted user ids of the user service
+(`/internal/users/ids`) page by page, merge-diffs both streams and deletes
+the trackings of the orphaned users in rate-limited chunks.
+
+The tracking stream stops at the highest user id owning trackings when the
+run starts. User ids only grow, so users created while the run is going
+(after the user service stream was read) are never taken for orphans.
+
+Memory stays bounded by the page and chunk sizes, independent of the
+number of rows.
+
+Afterwards the tombstones older than TOMBSTONE_RETENTION_DAYS are pruned,
+so run it periodically (e.g. daily).
+
+Usage (from the tracking_service directory):
+
+    python reconcile.py --dry-run
+    python reconcile.py --page-size 5000 --chunk-size 500 --max-chunks-per-second 2
+"""
+
+import argparse
+import os
+import time
+from collections.abc import Callable, Iterable, Iterator
+from itertools import takewhile
+
+import crud
+import httpx
+import invalidation
+from database import SessionLocal
+from loguru import logger
+
+
+USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "http://user-service:8001")
+INTERNAL_TOKEN = os.getenv("INTERNAL_TOKEN", "")
+
+
+def iter_ids(fetch_page: Callable[[int], list[int]]) -> Iterator[int]:
+    """Iterate over ascending ids, fetching keyset pages via `fetch_page(after_id)`."""
+    after_id = 0
+    while page := fetch_page(after_id):
+        yield from page
+        after_id = page[-1]
+
+
+def iter_orphans(
+    tracking_user_ids: Iterable[int],
+    existing_user_ids: Iterable[int],
+) -> Iterator[int]:
+    """
+    Yield ids of `tracking_user_ids` missing in `existing_user_ids`.
+
+    Both iterables must be sorted ascending and free of duplicates. They are
+    consumed lazily, so neither is loaded into memory.
+    """
+    existing = iter(existing_user_ids)
+    current = next(existing, None)
+    for user_id in tracking_user_ids:
+        while current is not None and current < user_id:
+            current = next(existing, None)
+        if current != user_id:
+            yield user_id
+
+
+def chunked(iterable: Iterable[int], size: int) -> Iterator[list[int]]:
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def fetch_user_service_ids(
+    client: httpx.Client,
+    page_size: int,
+) -> Callable[[int], list[int]]:
+    """Return a page fetcher for the id listing endpoint of the user service."""
+
+    def fetch_page(after_id: int) -> list[int]:
+        response = client.get(
+            f"{USER_SERVICE_URL}/internal/users/ids",
+            params={"after_id": after_id, "limit": page_size},
+        )
+        # never treat a failed request as "no users", that would delete everything
+        response.raise_for_status()
+        return response.json()["ids"]
+
+    return fetch_page
+
+
+def reconcile(
+    fetch_user_ids: Callable[[int], list[int]],
+    db_factory: Callable = SessionLocal,
+    page_size: int = 1000,
+    chunk_size: int = 500,
+    max_chunks_per_second: float = 1.0,
+    dry_run: bool = False,
+) -> int:
+    """
+    Delete the trackings of all users unknown to the user service.
+
+    Returns:
+        int: The number of orphaned users found.
+    """
+    read_db = db_factory()
+    write_db = db_factory()
+    interval = 1 / max_chunks_per_second if max_chunks_per_second else 0
+    orphans = 0
+
+    try:
+        last_id = crud.get_max_tracking_user_id(read_db) or 0
+        tracking_ids = takewhile(
+            lambda user_id: user_id <= last_id,
+            iter_ids(
+                lambda after_id: crud.get_tracking_user_ids(
+                    read_db, after_id, page_size
+                )
+            ),
+        )
+        orphaned = iter_orphans(tracking_ids, iter_ids(fetch_user_ids))
+        for chunk in chunked(orphaned, chunk_size):
+            orphans += len(chunk)
+            if dry_run:
+                logger.info(f"Orphaned users (dry run): {chunk}")
+                continue
+
+            started = time.monotonic()
+            deleted = crud.delete_trackings_by_users(write_db, chunk)
+            logger.info(f"Deleted {deleted} trackings of {len(chunk)} orphaned users.")
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+    finally:
+        read_db.close()
+        write_db.close()
+
+    logger.info(f"Reconciliation finished, {orphans} orphaned users found.")
+    return orphans
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Delete orphaned trackings.")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--max-chunks-per-second", type=float, default=1.0)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    headers = {"X-Internal-Token": INTERNAL_TOKEN}
+    with httpx.Client(timeout=30, headers=headers) as client:
+        reconcile(
+            fetch_user_ids=fetch_user_service_ids(client, args.page_size),
+            page_size=args.page_size,
+            chunk_size=args.chunk_size,
+            max_chunks_per_second=args.max_chunks_per_second,
+            dry_run=args.dry_run,
+        )
+    # replicas may still cache some of the deleted users
+    invalidation.bus.flush()
+
+    if not args.dry_run:
+        db = SessionLocal()
+        try:
+            pruned = crud.prune_tombstones(db)
+        finally:
+            db.close()
+        logger.info(f"Pruned {pruned} tombstones.")
+
+
+if __name__ == "__main__":
+    main()
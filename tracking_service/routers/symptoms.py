@@ -1,26 +1,20 @@
-import sys
-
+import cache
+import cache_backend
 import crud
 import schemas as schemes
 from database import get_db
 from error_handler import format_sqlalchemy_error
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from loguru import logger
+from pydantic import TypeAdapter
 from schemas import Symptom, SymptomCreate
 from sqlalchemy.orm import Session
 
 
-logger.remove()  # remove default logger
-logger.add(
-    sys.stderr,
-    format="<level>{level}:</level> {module} {message}",
-    colorize=True,
-    level="INFO",
-)
-
-
 router = APIRouter(prefix="/details/symptoms", tags=["Symptoms"])
 
+SYMPTOMS_ADAPTER = TypeAdapter(list[Symptom])
+
 
 @router.post(
     "/",
@@ -42,6 +36,20 @@ def create_symptom(
 
 
 @router.get("/", response_model=list[Symptom])
-def get_symptoms(db: Session = Depends(get_db)) -> list[Symptom]:
-    """public endpoint to get all symptoms."""
-    return crud.get_symptoms(db)
+def get_symptoms(db: Session = Depends(get_db)) -> Response:
+    """
+    public endpoint to get all symptoms, cached for all replicas. Misses are
+    read from the primary, a lagging replica would be cached for the TTL.
+    """
+
+    def load() -> bytes:
+        return SYMPTOMS_ADAPTER.dump_json(
+            SYMPTOMS_ADAPTER.validate_python(
+                crud.get_symptoms(db), from_attributes=True
+            )
+        )
+
+    content = cache_backend.get_cache().get_or_set(
+        cache.SYMPTOMS_KEY, load, cache.CATALOG_CACHE_TTL
+    )
+    return Response(content=content, media_type="application/json")
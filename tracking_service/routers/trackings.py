@@ -1,25 +1,31 @@
-import sys
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Annotated
 
+import cache
 import crud
+import database
+import events
+import models
+import serialization
+import write_buffer
 from auth import get_user_id_from_token
-from database import get_db
+from database import get_db, get_read_db
+from enums import ResponseFormat
 from error_handler import format_sqlalchemy_error
-from fastapi import APIRouter, Depends, HTTPException, Security, status
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Request,
+    Response,
+    Security,
+    status,
+)
 from loguru import logger
 from schemas import DayCreate, DayOut, DayUpdate, SleepCreate, SleepOut, SleepUpdate
 from sqlalchemy.orm import Session
 
 
-logger.remove()  # remove default logger
-logger.add(
-    sys.stderr,
-    format="<level>{level}:</level> {module} {message}",
-    colorize=True,
-    level="INFO",
-)
-
 TrackingOutSchemes = SleepOut | DayOut
 TrackingCreateSchemes = SleepCreate | DayCreate
 TrackingUpdateSchemes = SleepUpdate | DayUpdate
@@ -36,18 +42,104 @@ async def health_check_new() -> dict:
     return {"status": "ok"}
 
 
+@router.get("/health/live", include_in_schema=False)
+async def liveness() -> dict:
+    """The process is running and serves requests."""
+    return {"status": "ok"}
+
+
+@router.get("/health/ready", include_in_schema=False)
+def readiness(response: Response) -> dict:
+    """The database is reachable and the event consumer is running."""
+    checks = {
+        "database": database.check_connection(),
+        "broker": events.consumer_alive(),
+    }
+    ready = all(checks.values())
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {"status": "ok" if ready else "unavailable", "checks": checks}
+
+
 authenticate_dependency = Annotated[
     int, Security(get_user_id_from_token, scopes=["me"])
 ]
 
 
+def data_version_etag(
+    request: Request,
+    db: Session = Depends(get_db),
+    user_id: int = Security(get_user_id_from_token, scopes=["me"]),
+) -> str:
+    """
+    ETag of the user's trackings (their data version). Answers a matching
+    If-None-Match with 304 before the route queries any trackings.
+
+    A cache miss reads the version from the primary: read from a lagging
+    replica, an outdated version would be cached until the next write.
+    """
+    version = cache.trackings.get_version(user_id)
+    if version is None:
+        token = cache.trackings.token()
+        version = crud.get_data_version(db, user_id)
+        cache.trackings.set_version(user_id, version, token)
+    etag = f'"{version}"'
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        raise HTTPException(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers={"ETag": etag, "Cache-Control": "private, no-cache"},
+        )
+    return etag
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Whether an If-None-Match header matches `etag`: it is `*` or lists the
+    tag, compared weakly (`W/"8"` matches `"8"`).
+    """
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+def with_etag(response: Response, etag: str) -> Response:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def cached_trackings(
+    db: Session, type: str, user_id: int, start_date: datetime, end_date: datetime
+) -> list[dict] | None:
+    """
+    Dumped trackings of the user from the cache, read through on a miss from
+    `db`, a session on the primary (see data_version_etag). None if the date
+    range is not within the cached window.
+    """
+    if start_date.tzinfo is not None or end_date.tzinfo is not None:
+        return None
+    window_start = datetime.now() - timedelta(days=cache.TRACKING_CACHE_WINDOW_DAYS)
+    if start_date < window_start:
+        return None
+    dumped = cache.trackings.get_trackings(user_id, type, start_date)
+    if dumped is None:
+        token = cache.trackings.token()
+        dumped = serialization.dump_trackings(
+            crud.get_trackings_by_user(db, type, user_id, window_start, datetime.max)
+        )
+        cache.trackings.set_trackings(user_id, type, window_start, dumped, token)
+    return [
+        tracking for tracking in dumped if start_date <= tracking["date"] <= end_date
+    ]
+
+
 @router.get("/", response_model=list[TrackingOutSchemes])
 def get_all_trackings(
     user_id: int | None = None,
     start_date: datetime | None = None,
     end_date: datetime | None = None,
-    db: Session = Depends(get_db),
-) -> list[TrackingOutSchemes]:
+    format: ResponseFormat = ResponseFormat.FULL,
+    db: Session = Depends(get_read_db),
+) -> Response:
     """Endpoint to get all trackings in system. only for internal and admin analysis."""
     trackings = crud.get_trackings(db, user_id, start_date, end_date)
     if not trackings:
@@ -55,7 +147,7 @@ def get_all_trackings(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No trackings found",
         )
-    return trackings
+    return serialization.trackings_response(trackings, format)
 
 
 @router.delete("/me", status_code=status.HTTP_204_NO_CONTENT)
@@ -71,22 +163,89 @@ def delete_trackings_by_user(
 
 
 @router.get("/me", response_model=list[TrackingOutSchemes])
-async def get_trackings_by_user(
+def get_trackings_by_user(
     type: str,
     start_date: datetime | None = None,
     end_date: datetime | None = None,
-    db: Session = Depends(get_db),
+    format: ResponseFormat = ResponseFormat.FULL,
+    fields: str | None = None,
+    db: Session = Depends(get_read_db),
+    # the session of data_version_etag, dependencies are resolved once
+    primary_db: Session = Depends(get_db),
     user_id: int = Security(get_user_id_from_token, scopes=["me"]),
-) -> list[TrackingOutSchemes]:
-    """Endpoint to get all trackings for the current user."""
+    etag: str = Depends(data_version_etag),
+) -> Response:
+    """
+    Endpoint to get all trackings for the current user.
 
-    trackings = crud.get_trackings_by_user(db, type, user_id, start_date, end_date)
-    if not trackings:
+    With `format=compact`, symptoms and triggers are referenced by id and
+    listed once in the `symptoms` and `triggers` catalogs of the response.
+
+    `fields` (e.g. `date,quality,duration`) limits the entries to these
+    fields and the id. Columns and relationships which are not requested are
+    not loaded.
+
+    The ETag changes with every write of the user's trackings, a request
+    with a matching If-None-Match gets 304 without querying trackings.
+
+    Date ranges within the last TRACKING_CACHE_WINDOW_DAYS days are served
+    from the in-process tracking cache.
+    """
+    model = models.alchemy_model_factory(model_type=type)
+    try:
+        selected = serialization.parse_fields(model, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    dumped = None
+    if start_date and end_date:
+        dumped = cached_trackings(primary_db, type, user_id, start_date, end_date)
+    if dumped is None:
+        trackings = crud.get_trackings_by_user(
+            db, type, user_id, start_date, end_date, fields=selected
+        )
+        dumped = serialization.dump_trackings(trackings, selected)
+    else:
+        dumped = serialization.select_fields(model, dumped, selected)
+    if not dumped:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"No {type} trackings found for this user",
         )
-    return trackings
+    return with_etag(serialization.dumped_response(dumped, format), etag)
+
+
+@router.get("/me/changes")
+def get_tracking_changes(
+    since: datetime | None = None,
+    format: ResponseFormat = ResponseFormat.FULL,
+    db: Session = Depends(get_read_db),
+    user_id: int = Security(get_user_id_from_token, scopes=["me"]),
+    etag: str = Depends(data_version_etag),
+) -> Response:
+    """
+    Delta sync: sleep and day entries created or updated since the cursor
+    `since`, and tombstones (`deleted`) of the entries deleted since then.
+    Without `since`, all entries are returned.
+
+    Pass the returned `cursor` as `since` of the next sync. The cursor lags
+    the clock by CHANGES_CURSOR_OVERLAP so writes still committing are not
+    missed, entries changed after it are returned again. Clients must apply
+    changes idempotently (upsert by type and id).
+
+    Tombstones are kept for TOMBSTONE_RETENTION_DAYS. A `since` older than
+    that is answered with 410 Gone, the client must then sync without a
+    cursor and replace its copy.
+    """
+    now = crud.get_db_time(db)
+    try:
+        trackings, deletions = crud.get_changes(db, user_id, since, now)
+    except crud.ChangesExpiredError as e:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail=str(e))
+    cursor = crud.get_changes_cursor(db, trackings, deletions, since, now)
+    return with_etag(
+        serialization.changes_response(trackings, deletions, cursor, format), etag
+    )
 
 
 @router.post(
@@ -101,7 +260,11 @@ def create_day_tracking(
 ) -> DayOut:
     tracking_type = "day"
     try:
-        db_tracking = crud.create_tracking(db, tracking, tracking_type, user_id)
+        db_tracking = write_buffer.create_tracking(db, tracking, tracking_type, user_id)
+    except write_buffer.WriteBufferTimeoutError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e)
+        )
     except crud.TrackingNotValidError as e:
         error_message = format_sqlalchemy_error(e)
         raise HTTPException(
@@ -124,7 +287,11 @@ def create_sleep_tracking(
 ) -> SleepOut:
     tracking_type = "sleep"
     try:
-        db_tracking = crud.create_tracking(db, tracking, tracking_type, user_id)
+        db_tracking = write_buffer.create_tracking(db, tracking, tracking_type, user_id)
+    except write_buffer.WriteBufferTimeoutError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e)
+        )
     except crud.TrackingNotValidError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid data:" + str(e)
@@ -217,7 +384,7 @@ def delete_tracking(
 def get_tracking(
     tracking_type: str,
     tracking_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     user_id: int = Security(get_user_id_from_token, scopes=["me"]),
 ) -> TrackingOutSchemes:
     """Get tracking by tracking id, user_id and tracking type."""
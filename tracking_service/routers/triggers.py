@@ -1,14 +1,19 @@
+import cache
+import cache_backend
 import crud
 from database import get_db
 from error_handler import format_sqlalchemy_error
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from loguru import logger
+from pydantic import TypeAdapter
 from schemas import TriggerCreate, TriggerOut
 from sqlalchemy.orm import Session
 
 
 router = APIRouter(prefix="/details/triggers", tags=["Triggers"])
 
+TRIGGERS_ADAPTER = TypeAdapter(list[TriggerOut])
+
 
 @router.post(
     "/",
@@ -31,6 +36,20 @@ def create_trigger(
 
 
 @router.get("/", response_model=list[TriggerOut])
-def get_triggers(db: Session = Depends(get_db)) -> list[TriggerOut]:
-    """public endpoint to get all triggers."""
-    return crud.get_triggers(db)
+def get_triggers(db: Session = Depends(get_db)) -> Response:
+    """
+    public endpoint to get all triggers, cached for all replicas. Misses are
+    read from the primary, a lagging replica would be cached for the TTL.
+    """
+
+    def load() -> bytes:
+        return TRIGGERS_ADAPTER.dump_json(
+            TRIGGERS_ADAPTER.validate_python(
+                crud.get_triggers(db), from_attributes=True
+            )
+        )
+
+    content = cache_backend.get_cache().get_or_set(
+        cache.TRIGGERS_KEY, load, cache.CATALOG_CACHE_TTL
+    )
+    return Response(content=content, media_type="application/json")
@@ -0,0 +1,189 @@
+"""
+Serialization Module
+
+Fast path for responses with many trackings. FastAPI validates a returned
+list against `list[SleepOut | DayOut]`, which tries the union members for
+every element. Here the ORM class of a row is its type tag: consecutive rows
+of one class are validated at once with a precompiled `TypeAdapter` for
+that schema, and the result is encoded with orjson.
+
+The full format is identical to the response_model path, so routes keep
+their response_model for the OpenAPI schema and return
+`trackings_response(...)`.
+
+The compact format (`?format=compact`) replaces the embedded symptoms and
+triggers by their ids and adds each referenced catalog entry once:
+
+    {
+        "trackings": [{"id": 1, ..., "symptoms": [2, 3]}],
+        "symptoms": {"2": {"name": "Leg Pain"}, "3": {"name": "Restless Legs"}},
+        "triggers": {}
+    }
+
+With sparse fields (`?fields=date,quality`), rows are validated by an
+adapter for a schema with only these fields and the id, created on first
+use.
+
+Key Components:
+- ADAPTERS: List adapter per ORM tracking class.
+- parse_fields: Validates the requested sparse fields.
+- dump_trackings: Serializes trackings to plain python objects.
+- compact_trackings: Converts dumped trackings to the compact format.
+- select_fields: Limits dumped trackings to sparse fields.
+- trackings_response: JSON response of a list of trackings.
+- dumped_response: JSON response of dumped trackings.
+- changes_response: JSON response of the delta sync.
+"""
+
+from collections.abc import Iterable
+from datetime import datetime
+from functools import cache
+from itertools import groupby
+
+import models
+import orjson
+from enums import ResponseFormat
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter, create_model
+from schemas import DayOut, SleepOut
+
+
+SCHEMAS: dict[type, type[BaseModel]] = {
+    models.Sleep: SleepOut,
+    models.Day: DayOut,
+}
+ADAPTERS: dict[type, TypeAdapter] = {
+    model: TypeAdapter(list[schema]) for model, schema in SCHEMAS.items()
+}
+
+# fields embedding catalog entries, and the catalog they belong to
+CATALOG_FIELDS = {
+    "symptoms": "symptoms",
+    "late_morning_symptoms": "symptoms",
+    "afternoon_symptoms": "symptoms",
+    "triggers": "triggers",
+}
+
+
+def parse_fields(model: type, fields: str | None) -> tuple[str, ...] | None:
+    """
+    Parse comma separated field names of `model`'s schema, None for all.
+    Blank names are skipped. The names are sorted, so equal selections in a
+    different order share one partial_adapter. Raises ValueError for unknown
+    names.
+    """
+    if fields is None:
+        return None
+    schema_fields = SCHEMAS[model].model_fields
+    names = tuple(sorted({name.strip() for name in fields.split(",")} - {""}))
+    unknown = [name for name in names if name not in schema_fields]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+
+@cache
+def partial_adapter(model: type, fields: tuple[str, ...]) -> TypeAdapter:
+    """List adapter for a schema with only the id and `fields` of `model`."""
+    schema = SCHEMAS[model]
+    partial = create_model(
+        f"{schema.__name__}Partial",
+        **{
+            name: (info.annotation, info)
+            for name, info in schema.model_fields.items()
+            if name == "id" or name in fields
+        },
+    )
+    return TypeAdapter(list[partial])
+
+
+def dump_trackings(
+    trackings: Iterable[models.Tracking], fields: tuple[str, ...] | None = None
+) -> list[dict]:
+    """Validate and dump trackings in their order, one adapter call per run."""
+    dumped = []
+    for model, run in groupby(trackings, key=type):
+        adapter = ADAPTERS[model] if fields is None else partial_adapter(model, fields)
+        dumped += adapter.dump_python(
+            adapter.validate_python(list(run), from_attributes=True)
+        )
+    return dumped
+
+
+def select_fields(
+    model: type, dumped: list[dict], fields: tuple[str, ...] | None
+) -> list[dict]:
+    """Limit dumped trackings to the id and `fields`, as partial_adapter does."""
+    if fields is None:
+        return dumped
+    names = [
+        name for name in SCHEMAS[model].model_fields if name == "id" or name in fields
+    ]
+    return [{name: tracking[name] for name in names} for tracking in dumped]
+
+
+def compact_trackings(dumped: list[dict]) -> dict:
+    """Replace embedded catalog entries by their ids, `dumped` is not modified."""
+    catalogs: dict[str, dict[int, dict]] = {"symptoms": {}, "triggers": {}}
+    compacted = []
+    for tracking in dumped:
+        tracking = dict(tracking)
+        for field, catalog in CATALOG_FIELDS.items():
+            entries = tracking.get(field)
+            if entries is None:
+                continue
+            entries_catalog = catalogs[catalog]
+            for entry in entries:
+                if entry["id"] not in entries_catalog:
+                    entries_catalog[entry["id"]] = {
+                        key: value for key, value in entry.items() if key != "id"
+                    }
+            tracking[field] = [entry["id"] for entry in entries]
+        compacted.append(tracking)
+    return {"trackings": compacted, **catalogs}
+
+
+def trackings_response(
+    trackings: Iterable[models.Tracking],
+    format: ResponseFormat = ResponseFormat.FULL,
+    fields: tuple[str, ...] | None = None,
+    status_code: int = 200,
+) -> Response:
+    return dumped_response(dump_trackings(trackings, fields), format, status_code)
+
+
+def dumped_response(
+    dumped: list[dict],
+    format: ResponseFormat = ResponseFormat.FULL,
+    status_code: int = 200,
+) -> Response:
+    """JSON response of dumped trackings, e.g. from the cache."""
+    content = compact_trackings(dumped) if format == ResponseFormat.COMPACT else dumped
+    return Response(
+        content=orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS),
+        status_code=status_code,
+        media_type="application/json",
+    )
+
+
+def changes_response(
+    trackings: Iterable[models.Tracking],
+    deletions: Iterable[models.DeletedTracking],
+    cursor: datetime | None,
+    format: ResponseFormat = ResponseFormat.FULL,
+) -> Response:
+    """Changed trackings, tombstones of deleted ones and the next cursor."""
+    content = dump_trackings(trackings)
+    if format == ResponseFormat.COMPACT:
+        body = compact_trackings(content)
+    else:
+        body = {"trackings": content}
+    body["deleted"] = [
+        {"type": d.tracking_type, "id": d.tracking_id, "deleted": d.deleted}
+        for d in deletions
+    ]
+    body["cursor"] = cursor
+    return Response(
+        content=orjson.dumps(body, option=orjson.OPT_NON_STR_KEYS),
+        media_type="application/json",
+    )
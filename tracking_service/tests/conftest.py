@@ -1,23 +1,28 @@
 import os
+from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
 
 import auth
+import broker
+import cache
+import cache_backend
 import jwt
+import models
 import pytest
 import schemas as schemes
 from crud import create_symptom, create_tracking, create_trigger
-from database import get_db
+from database import Base, QueryStats, get_db, get_read_db
 from fastapi import Depends
 from fastapi.security import OAuth2PasswordBearer, SecurityScopes
 from fastapi.testclient import TestClient
-from main import app, start_consuming_events
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session, declarative_base
+from main import app
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
 from sqlalchemy_utils import create_database, database_exists
 
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
-Base = declarative_base()
 
 SECRET_KEY = "mysecretkeyo"
 ALGORITHM = "HS256"
@@ -30,10 +35,6 @@ def mock_get_user_id_from_token(scopes: SecurityScopes, token=Depends(oauth2_sch
     return TEST_USER_ID
 
 
-def mock_consume_events():
-    pass
-
-
 @pytest.fixture(scope="session")
 def token():
     """Simulate token generation for non-user services."""
@@ -70,11 +71,46 @@ def db(db_engine):
 @pytest.fixture(scope="function")
 def client(db):
     app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_read_db] = lambda: db
     app.dependency_overrides[auth.get_user_id_from_token] = mock_get_user_id_from_token
-    app.dependency_overrides[start_consuming_events] = mock_consume_events
+    broker.set_broker(broker.InMemoryBroker())
+    # tests roll back their writes, the cache would outlive them
+    cache.trackings.clear()
+    cache_backend.set_cache(cache_backend.LocalBackend())
 
     with TestClient(app) as c:
         yield c
+    broker.set_broker(None)
+
+
+@pytest.fixture
+def query_budget():
+    """
+    Fail the test if a block runs more SQL statements than declared.
+
+        with query_budget(4):
+            client.get("/trackings/me?type=day", headers=headers)
+    """
+
+    @contextmanager
+    def budget(max_queries: int):
+        stats = QueryStats()
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            stats.record(statement, 0.0)
+
+        event.listen(Engine, "after_cursor_execute", record)
+        try:
+            yield stats
+        finally:
+            event.remove(Engine, "after_cursor_execute", record)
+        if stats.count > max_queries:
+            pytest.fail(
+                f"Query budget exceeded: {stats.count} statements, "
+                f"{max_queries} allowed."
+            )
+
+    return budget
 
 
 @pytest.fixture
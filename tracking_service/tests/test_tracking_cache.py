@@ -0,0 +1,194 @@
+from datetime import datetime, timedelta
+
+import cache
+import crud
+import pytest
+from cache import TrackingCache
+from database import Base, get_db, get_read_db
+from main import app
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+
+START = datetime(2026, 1, 1)
+
+
+@pytest.fixture
+def recent_sleeps(client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    for days_ago in (1, 2, 3):
+        date = today - timedelta(days=days_ago)
+        response = client.post(
+            "/trackings/sleep",
+            json={
+                "date": date.isoformat(),
+                "duration": 7,
+                "quality": "good",
+                "comment": "",
+                "symptoms": [],
+            },
+            headers=headers,
+        )
+        assert response.status_code == 201
+    return today
+
+
+def test_cache_hit_and_miss():
+    tracking_cache = TrackingCache(max_bytes=10_000, ttl=60)
+    assert tracking_cache.get_trackings(1, "sleep", START) is None
+
+    token = tracking_cache.token()
+    tracking_cache.set_trackings(1, "sleep", START, [{"id": 1}], token)
+    assert tracking_cache.get_trackings(1, "sleep", START) == [{"id": 1}]
+    # the range starts before the cached window
+    assert tracking_cache.get_trackings(1, "sleep", START - timedelta(1)) is None
+    assert tracking_cache.get_trackings(1, "day", START) is None
+
+
+def test_cache_rejects_fill_started_before_invalidation():
+    tracking_cache = TrackingCache(max_bytes=10_000, ttl=60)
+    token = tracking_cache.token()
+    tracking_cache.invalidate(1)
+    tracking_cache.set_version(1, 3, token)
+    tracking_cache.set_version(2, 5, token)
+
+    assert tracking_cache.get_version(1) is None
+    assert tracking_cache.get_version(2) == 5
+
+
+def test_cache_invalidate_removes_user():
+    tracking_cache = TrackingCache(max_bytes=10_000, ttl=60)
+    tracking_cache.set_version(1, 3, tracking_cache.token())
+    tracking_cache.invalidate(1)
+    assert tracking_cache.get_version(1) is None
+
+    tracking_cache.set_version(1, 4, tracking_cache.token())
+    assert tracking_cache.get_version(1) == 4
+
+
+def test_cache_evicts_least_recently_used():
+    tracking_cache = TrackingCache(max_bytes=1_200, ttl=60)
+    trackings = [{"id": 1, "comment": "x" * 300}]
+    for user_id in (1, 2):
+        tracking_cache.set_trackings(
+            user_id, "sleep", START, trackings, tracking_cache.token()
+        )
+    tracking_cache.get_trackings(1, "sleep", START)
+    tracking_cache.set_trackings(3, "sleep", START, trackings, tracking_cache.token())
+
+    assert tracking_cache.get_trackings(2, "sleep", START) is None
+    assert tracking_cache.get_trackings(1, "sleep", START) == trackings
+    assert tracking_cache.get_trackings(3, "sleep", START) == trackings
+    assert tracking_cache._size <= tracking_cache.max_bytes
+
+
+def test_cache_skips_entries_above_cap():
+    tracking_cache = TrackingCache(max_bytes=100, ttl=60)
+    trackings = [{"id": 1, "comment": "x" * 300}]
+    tracking_cache.set_trackings(1, "sleep", START, trackings, tracking_cache.token())
+    assert tracking_cache.get_trackings(1, "sleep", START) is None
+
+
+def test_cache_expires_entries():
+    tracking_cache = TrackingCache(max_bytes=10_000, ttl=-1)
+    tracking_cache.set_version(1, 3, tracking_cache.token())
+    assert tracking_cache.get_version(1) is None
+    assert tracking_cache._size == 0
+
+
+def test_cache_disabled():
+    tracking_cache = TrackingCache(enabled=False)
+    tracking_cache.set_version(1, 3, tracking_cache.token())
+    assert tracking_cache.get_version(1) is None
+
+
+def test_recent_trackings_served_from_cache(
+    recent_sleeps, client, token, query_budget
+):
+    headers = {"Authorization": f"Bearer {token}"}
+    start = (recent_sleeps - timedelta(days=2)).isoformat()
+    end = recent_sleeps.isoformat()
+    url = f"/trackings/me?type=sleep&start_date={start}&end_date={end}"
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+
+    with query_budget(0):
+        cached = client.get(url, headers=headers)
+        sparse = client.get(f"{url}&fields=duration", headers=headers)
+        compact = client.get(f"{url}&format=compact", headers=headers)
+    assert cached.json() == response.json()
+    assert cached.headers["ETag"] == response.headers["ETag"]
+    assert sparse.json() == [
+        {"id": tracking["id"], "duration": 7} for tracking in response.json()
+    ]
+    assert compact.json()["trackings"][0]["symptoms"] == []
+
+
+def test_cache_invalidated_by_writes(recent_sleeps, client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    start = (recent_sleeps - timedelta(days=3)).isoformat()
+    end = recent_sleeps.isoformat()
+    url = f"/trackings/me?type=sleep&start_date={start}&end_date={end}"
+    response = client.get(url, headers=headers)
+    tracking_id = response.json()[0]["id"]
+
+    client.put(
+        f"/trackings/sleep/{tracking_id}",
+        json={"duration": 9, "quality": "good", "comment": "", "symptoms": []},
+        headers=headers,
+    )
+    updated = client.get(url, headers=headers)
+    assert updated.json()[0]["duration"] == 9
+    assert updated.headers["ETag"] != response.headers["ETag"]
+
+    client.delete(f"/trackings/sleep/{tracking_id}", headers=headers)
+    assert len(client.get(url, headers=headers).json()) == 2
+
+
+def test_cache_invalidated_by_user_deletion(recent_sleeps, client, token, db):
+    headers = {"Authorization": f"Bearer {token}"}
+    start = (recent_sleeps - timedelta(days=3)).isoformat()
+    end = recent_sleeps.isoformat()
+    url = f"/trackings/me?type=sleep&start_date={start}&end_date={end}"
+    assert client.get(url, headers=headers).status_code == 200
+
+    crud.delete_trackings_by_user(db, 1, forget=True)
+    assert client.get(url, headers=headers).status_code == 404
+    assert cache.trackings.get_version(1) == 0
+
+
+def test_cache_filled_from_primary(recent_sleeps, client, token):
+    """A lagging replica (here without any trackings) is not cached."""
+    replica = create_engine("sqlite://")
+    Base.metadata.create_all(bind=replica)
+    app.dependency_overrides[get_read_db] = lambda: Session(bind=replica)
+    headers = {"Authorization": f"Bearer {token}"}
+    start = (recent_sleeps - timedelta(days=3)).isoformat()
+    end = recent_sleeps.isoformat()
+    url = f"/trackings/me?type=sleep&start_date={start}&end_date={end}"
+
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    assert len(response.json()) == 3
+    assert response.headers["ETag"] == '"3"'
+    assert cache.trackings.get_version(1) == 3
+
+
+def test_cache_check_and_fill_share_one_session(recent_sleeps, client, token, db):
+    sessions = []
+
+    def get_primary():
+        sessions.append(db)
+        return db
+
+    app.dependency_overrides[get_db] = get_primary
+    start = (recent_sleeps - timedelta(days=3)).isoformat()
+    end = recent_sleeps.isoformat()
+    response = client.get(
+        f"/trackings/me?type=sleep&start_date={start}&end_date={end}",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 200
+    assert len(sessions) == 1
@@ -0,0 +1,169 @@
+import threading
+import time
+
+import cache_backend
+import pytest
+from cache_backend import LocalBackend, RedisBackend
+from database import Base, get_read_db
+from main import app
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+
+@pytest.fixture
+def redis_server():
+    fakeredis = pytest.importorskip("fakeredis")
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture(params=["memory", "redis"])
+def backend(request):
+    if request.param == "memory":
+        return LocalBackend(max_entries=100)
+    server = request.getfixturevalue("redis_server")
+    import fakeredis
+
+    return RedisBackend(client=fakeredis.FakeRedis(server=server))
+
+
+def test_get_and_set(backend):
+    assert backend.get("a") is None
+    backend.set("a", b"1", ttl=60)
+    assert backend.get("a") == b"1"
+
+    backend.delete("a", "missing")
+    assert backend.get("a") is None
+
+
+def test_get_many(backend):
+    backend.set_many({"a": b"1", "b": b"2"}, ttl=60)
+    assert backend.get_many(["a", "missing", "b"]) == [b"1", None, b"2"]
+    assert backend.get_many([]) == []
+
+
+def test_add_only_if_missing(backend):
+    assert backend.add("a", b"1", ttl=60)
+    assert not backend.add("a", b"2", ttl=60)
+    assert backend.get("a") == b"1"
+
+
+def test_ttl(backend):
+    backend.set("a", b"1", ttl=0.05)
+    time.sleep(0.1)
+    assert backend.get("a") is None
+
+
+def test_get_or_set_loads_once(backend):
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.05)
+        return b"value"
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(backend.get_or_set("key", loader, 60))
+        )
+        for _ in range(10)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [b"value"] * 10
+    assert len(calls) == 1
+    assert backend.get_or_set("key", loader, 60) == b"value"
+    assert len(calls) == 1
+
+
+def test_local_backend_evicts_least_recently_used():
+    backend = LocalBackend(max_entries=2)
+    backend.set_many({"a": b"1", "b": b"2"}, ttl=60)
+    backend.get("a")
+    backend.set("c", b"3", ttl=60)
+    assert backend.get_many(["a", "b", "c"]) == [b"1", None, b"3"]
+
+
+def test_redis_replicas_load_once(redis_server):
+    import fakeredis
+
+    replicas = [
+        RedisBackend(client=fakeredis.FakeRedis(server=redis_server)) for _ in range(3)
+    ]
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.1)
+        return b"value"
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda r=replica: results.append(r.get_or_set("key", loader, 60))
+        )
+        for replica in replicas
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [b"value"] * 3
+    assert len(calls) == 1
+    assert replicas[0].get("key:lock") is None
+
+
+def test_redis_lock_released_only_by_owner(redis_server):
+    import fakeredis
+
+    client = fakeredis.FakeRedis(server=redis_server)
+    backend = RedisBackend(client=client, lock_timeout=0.05)
+
+    def loader():
+        # the lock expires during the load and another replica takes it
+        time.sleep(0.1)
+        client.set("key:lock", b"other")
+        return b"value"
+
+    assert backend.get_or_set("key", loader, 60) == b"value"
+    assert client.get("key:lock") == b"other"
+
+
+def test_redis_failures_miss(redis_server):
+    import fakeredis
+
+    redis_server.connected = False
+    backend = RedisBackend(client=fakeredis.FakeRedis(server=redis_server))
+    backend.set("a", b"1", ttl=60)
+    assert backend.get("a") is None
+    assert backend.get_or_set("a", lambda: b"2", 60) == b"2"
+
+
+def test_create_cache_backend():
+    assert isinstance(cache_backend.create_cache_backend("memory"), LocalBackend)
+    with pytest.raises(ValueError):
+        cache_backend.create_cache_backend("memcached")
+
+
+def test_catalog_cached_until_created(items, client, query_budget):
+    response = client.get("/details/symptoms/")
+    assert len(response.json()) == 3
+
+    with query_budget(0):
+        assert client.get("/details/symptoms/").json() == response.json()
+
+    client.post("/details/symptoms/", json={"name": "Insomnia"})
+    assert len(client.get("/details/symptoms/").json()) == 4
+
+
+@pytest.mark.parametrize("path", ["/details/symptoms/", "/details/triggers/"])
+def test_catalog_cached_from_primary(items, client, path):
+    """A lagging replica (here an empty one) is not cached after a create."""
+    replica = create_engine("sqlite://")
+    Base.metadata.create_all(bind=replica)
+    app.dependency_overrides[get_read_db] = lambda: Session(bind=replica)
+    assert len(client.get(path).json()) > 0
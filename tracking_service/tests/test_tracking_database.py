@@ -0,0 +1,46 @@
+from types import SimpleNamespace
+
+import database
+import metrics
+from sqlalchemy import text
+
+
+def test_file_database_uses_timed_pool(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_POOL_SIZE", 3)
+    engine = database.create_db_engine(f"sqlite:///{tmp_path}/pool.db", "replica")
+
+    assert isinstance(engine.pool, database.TimedQueuePool)
+    assert engine.pool.size() == 3
+    assert engine.pool._pre_ping
+
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+    exposed = metrics.REGISTRY.expose()
+    assert 'db_pool_checkout_wait_seconds_count{pool="replica"} 1' in exposed
+
+
+def test_memory_database_keeps_default_pool():
+    engine = database.create_db_engine("sqlite://")
+    assert not isinstance(engine.pool, database.TimedQueuePool)
+
+
+def test_statement_timeout_for_postgres(monkeypatch):
+    monkeypatch.setattr(database, "DB_STATEMENT_TIMEOUT", 5000)
+    created = {}
+
+    def create_engine(url, **options):
+        created.update(options)
+        return SimpleNamespace(pool=SimpleNamespace())
+
+    monkeypatch.setattr(database, "create_engine", create_engine)
+    database.create_db_engine("postgresql://user:password@db/trackings")
+    assert created["connect_args"] == {"options": "-c statement_timeout=5000"}
+
+
+def test_engines_created_on_first_use(monkeypatch):
+    monkeypatch.setattr(database, "_engines", {})
+    monkeypatch.setattr(database, "DATABASE_READ_URL", None)
+    session_factory = database.LazySessionmaker()
+    with session_factory() as db:
+        assert db.get_bind() is database.engine is database.read_engine
+    assert list(database._engines) == ["primary"]
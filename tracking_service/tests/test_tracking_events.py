@@ -0,0 +1,104 @@
+import threading
+
+import crud
+import events
+import pika.exceptions
+from broker import InMemoryBroker, Message, RabbitMQBroker
+from enums import TrackingType
+
+
+def test_in_memory_broker_fans_out_and_acks():
+    bus = InMemoryBroker()
+    received = []
+    done = threading.Event()
+
+    def handler(message):
+        received.append(message)
+        if len(received) == 2:
+            done.set()
+
+    consumer = threading.Thread(target=bus.subscribe, args=(handler,))
+    consumer.start()
+    bus.subscribed.wait()
+
+    bus.publish_batch([{"type": "A", "user_id": 1}, {"type": "B", "user_id": 2}])
+    assert done.wait(timeout=5)
+    assert [m.body["type"] for m in received] == ["A", "B"]
+    assert received[0].published_at is not None
+    assert len(bus.unacked) == 2
+
+    bus.ack(received[1], multiple=True)
+    assert bus.unacked == {}
+
+    bus.close()
+    consumer.join(timeout=5)
+    assert not consumer.is_alive()
+
+
+class FakeConnection:
+    def __init__(self):
+        self.is_open = True
+        self.broken = False
+        self.published = []
+
+    def close(self):
+        self.is_open = False
+
+
+class FakeChannel:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def basic_publish(self, exchange, routing_key, body, properties):
+        if self.connection.broken:
+            raise pika.exceptions.ConnectionClosed(320, "closed by the server")
+        self.connection.published.append(body)
+
+
+def test_rabbitmq_publishers_share_one_connection(monkeypatch):
+    connections = []
+
+    def connect():
+        connections.append(FakeConnection())
+        return connections[-1], FakeChannel(connections[-1])
+
+    broker = RabbitMQBroker()
+    monkeypatch.setattr(broker, "_connect", connect)
+    broker.publish({"type": "A"})
+    broker.publish_batch([{"type": "B"}, {"type": "C"}])
+    assert len(connections) == 1
+    assert len(connections[0].published) == 3
+
+    # the server closed the idle connection, the publish reconnects
+    connections[0].broken = True
+    broker.publish({"type": "D"})
+    assert len(connections) == 2
+    assert not connections[0].is_open
+    assert connections[1].published == ['{"type": "D"}']
+
+    broker.close()
+    assert not connections[1].is_open
+
+
+def test_user_deleted_event_deletes_trackings(items, db, monkeypatch):
+    monkeypatch.setattr(events, "get_db", lambda: iter([db]))
+    bus = InMemoryBroker()
+    message = Message(body={"type": "USER_DELETED", "user_id": 1}, delivery_tag=1)
+    bus.unacked[1] = message
+
+    events.callback(message, bus)
+
+    assert crud.get_trackings_by_user(db, TrackingType.SLEEP, 1) == []
+    assert crud.get_trackings_by_user(db, TrackingType.DAY, 1) == []
+    assert len(crud.get_trackings_by_user(db, TrackingType.SLEEP, 2)) == 1
+    assert bus.unacked == {}
+
+
+def test_unknown_event_is_acked(monkeypatch):
+    bus = InMemoryBroker()
+    message = Message(body={"type": "USER_CREATED", "user_id": 1}, delivery_tag=1)
+    bus.unacked[1] = message
+
+    events.callback(message, bus)
+
+    assert bus.unacked == {}
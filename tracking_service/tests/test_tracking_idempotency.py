@@ -0,0 +1,190 @@
+from datetime import datetime, timedelta, timezone
+
+import anyio
+import auth
+import cache_backend
+import jwt
+import pytest
+from idempotency import IdempotencyMiddleware
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+
+DAY = {
+    "date": "2025-03-01",
+    "comment": "",
+    "triggers": [1],
+    "late_morning_symptoms": [2],
+    "afternoon_symptoms": [],
+}
+
+
+def user_token(user_id: int = 1, minutes: int = 15) -> str:
+    data = {
+        "exp": datetime.now(timezone.utc) + timedelta(minutes=minutes),
+        "sub": str(user_id),
+        "scopes": ["me"],
+    }
+    return jwt.encode(data, auth.SECRET_KEY, algorithm=auth.ALGORITHM)
+
+
+@pytest.fixture
+def token():
+    """A token the middleware can verify, the routes' check is mocked."""
+    return user_token()
+
+
+def test_create_day_replayed(items, client, token, query_budget):
+    headers = {"Authorization": f"Bearer {token}", "Idempotency-Key": "day-1"}
+    response = client.post("/trackings/day", json=DAY, headers=headers)
+    assert response.status_code == 201
+
+    with query_budget(0):
+        repeated = client.post("/trackings/day", json=DAY, headers=headers)
+    assert repeated.status_code == 201
+    assert repeated.json() == response.json()
+    assert repeated.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in response.headers
+
+
+def test_idempotency_key_reused_for_other_request(items, client, token):
+    headers = {"Authorization": f"Bearer {token}", "Idempotency-Key": "day-1"}
+    client.post("/trackings/day", json=DAY, headers=headers)
+    response = client.post(
+        "/trackings/day", json={**DAY, "comment": "changed"}, headers=headers
+    )
+    assert response.status_code == 422
+
+
+def test_invalid_request_replayed(items, client, token):
+    headers = {"Authorization": f"Bearer {token}", "Idempotency-Key": "day-2"}
+    day = {**DAY, "triggers": [99]}
+    assert client.post("/trackings/day", json=day, headers=headers).status_code == 400
+    repeated = client.post("/trackings/day", json=day, headers=headers)
+    assert repeated.status_code == 400
+    assert repeated.headers["Idempotent-Replayed"] == "true"
+
+
+def middleware_app(endpoint, anonymous: bool = False) -> TestClient:
+    cache_backend.set_cache(cache_backend.LocalBackend())
+    app = Starlette(routes=[Route("/items", endpoint, methods=["POST"])])
+    app.add_middleware(
+        IdempotencyMiddleware,
+        prefix="test",
+        secret_key=auth.SECRET_KEY,
+        paths=() if anonymous else {"/items"},
+        anonymous_paths={"/items"} if anonymous else (),
+    )
+    return TestClient(app, raise_server_exceptions=False)
+
+
+def test_keys_are_scoped_by_user():
+    calls = []
+
+    async def endpoint(request):
+        calls.append(request.headers["authorization"])
+        return JSONResponse({"calls": len(calls)}, status_code=201)
+
+    client = middleware_app(endpoint)
+    # a refreshed token of user 1 replays the response of the first one
+    tokens = [user_token(1), user_token(2), user_token(1, minutes=30)]
+    responses = [
+        client.post(
+            "/items",
+            content=b"{}",
+            headers={"Authorization": f"Bearer {token}", "Idempotency-Key": "k"},
+        )
+        for token in tokens
+    ]
+    assert calls == [f"Bearer {tokens[0]}", f"Bearer {tokens[1]}"]
+    assert responses[2].json() == {"calls": 1}
+
+
+def test_unauthenticated_requests_pass_through():
+    calls = []
+
+    async def endpoint(request):
+        calls.append(1)
+        return JSONResponse({}, status_code=201)
+
+    client = middleware_app(endpoint)
+    forged = jwt.encode({"sub": "1"}, "other secret", algorithm="HS256")
+    for headers in ({}, {"Authorization": f"Bearer {forged}"}):
+        for _ in range(2):
+            response = client.post(
+                "/items", content=b"{}", headers={**headers, "Idempotency-Key": "k"}
+            )
+            assert "Idempotent-Replayed" not in response.headers
+    assert len(calls) == 4
+
+
+def test_server_errors_are_not_stored():
+    calls = []
+
+    async def endpoint(request):
+        calls.append(1)
+        status_code = 503 if len(calls) == 1 else 201
+        return JSONResponse({}, status_code=status_code)
+
+    client = middleware_app(endpoint, anonymous=True)
+    headers = {"Idempotency-Key": "k"}
+    assert client.post("/items", content=b"{}", headers=headers).status_code == 503
+    assert client.post("/items", content=b"{}", headers=headers).status_code == 201
+    assert client.post("/items", content=b"{}", headers=headers).status_code == 201
+    assert len(calls) == 2
+
+
+def test_request_in_progress_conflicts():
+    started, release = anyio.Event(), anyio.Event()
+
+    async def endpoint(request):
+        started.set()
+        await release.wait()
+        return JSONResponse({}, status_code=201)
+
+    cache_backend.set_cache(cache_backend.LocalBackend())
+    app = Starlette(routes=[Route("/items", endpoint, methods=["POST"])])
+    app = IdempotencyMiddleware(
+        app, prefix="test", secret_key=auth.SECRET_KEY, anonymous_paths={"/items"}
+    )
+    statuses = []
+
+    async def request():
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"{}", "more_body": False}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            "type": "http",
+            "method": "POST",
+            "path": "/items",
+            "query_string": b"",
+            "headers": [(b"idempotency-key", b"k")],
+        }
+        await app(scope, receive, send)
+        statuses.append(sent[0]["status"])
+
+    async def main():
+        async with anyio.create_task_group() as tasks:
+            tasks.start_soon(request)
+            await started.wait()
+            await request()
+            release.set()
+
+    anyio.run(main)
+    assert statuses == [409, 201]
+
+
+def test_invalid_key_rejected():
+    async def endpoint(request):
+        return JSONResponse({}, status_code=201)
+
+    client = middleware_app(endpoint, anonymous=True)
+    response = client.post("/items", content=b"{}", headers={"Idempotency-Key": ""})
+    assert response.status_code == 400
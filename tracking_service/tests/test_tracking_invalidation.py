@@ -0,0 +1,117 @@
+import time
+
+import broker
+import cache
+import cache_backend
+import events
+import invalidation
+from broker import InMemoryBroker, Message
+from invalidation import InvalidationBus
+
+
+class RecordingBroker(InMemoryBroker):
+    def __init__(self):
+        super().__init__()
+        self.batches: list[list[dict]] = []
+
+    def publish_batch(self, events: list[dict]) -> None:
+        self.batches.append(events)
+
+
+def cache_user(user_id: int) -> None:
+    cache.trackings.set_version(user_id, 1, cache.trackings.token())
+
+
+def test_invalidations_are_coalesced():
+    recording = RecordingBroker()
+    bus = InvalidationBus(broker=recording)
+    for _ in range(3):
+        bus.invalidate(user_ids=[1])
+    bus.invalidate(user_ids=[2], keys=[cache.SYMPTOMS_KEY])
+    bus.flush()
+    bus.flush()
+
+    assert len(recording.batches) == 1
+    (message,) = recording.batches[0]
+    assert message["type"] == invalidation.EVENT_TYPE
+    assert message["origin"] == bus.origin
+    assert sorted(message["user_ids"]) == [1, 2]
+    assert message["keys"] == [cache.SYMPTOMS_KEY]
+
+
+def test_invalidations_are_split_into_batches():
+    recording = RecordingBroker()
+    bus = InvalidationBus(broker=recording, max_batch=2)
+    bus.invalidate(user_ids=[1, 2, 3, 4, 5])
+    bus.flush()
+
+    assert [len(m["user_ids"]) for m in recording.batches[0]] == [2, 2, 1]
+
+
+def test_full_batch_wakes_flusher():
+    recording = RecordingBroker()
+    bus = InvalidationBus(broker=recording, interval=60, max_batch=2)
+    bus.start()
+    try:
+        bus.invalidate(user_ids=[1, 2])
+        deadline = time.monotonic() + 5
+        while not recording.batches and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert recording.batches
+    finally:
+        bus.stop()
+
+
+def test_invalidate_evicts_locally():
+    cache.trackings.clear()
+    cache_user(7)
+    InvalidationBus(broker=RecordingBroker()).invalidate(user_ids=[7])
+    assert cache.trackings.get_version(7) is None
+
+
+def test_event_of_other_replica_is_applied():
+    cache.trackings.clear()
+    cache_backend.set_cache(cache_backend.LocalBackend())
+    cache_user(7)
+    cache_backend.get_cache().set(cache.TRIGGERS_KEY, b"[]", 60)
+    message = Message(
+        body={
+            "type": invalidation.EVENT_TYPE,
+            "origin": "other-replica",
+            "user_ids": [7],
+            "keys": [cache.TRIGGERS_KEY],
+        },
+        delivery_tag=1,
+    )
+    events.callback(message, InMemoryBroker())
+
+    assert cache.trackings.get_version(7) is None
+    assert cache_backend.get_cache().get(cache.TRIGGERS_KEY) is None
+
+
+def test_own_event_is_ignored():
+    cache.trackings.clear()
+    cache_user(7)
+    invalidation.handle_event(
+        {
+            "type": invalidation.EVENT_TYPE,
+            "origin": invalidation.bus.origin,
+            "user_ids": [7],
+            "keys": [],
+        }
+    )
+    assert cache.trackings.get_version(7) == 1
+
+
+def test_write_on_other_replica_reaches_consumer(client):
+    assert broker.get_broker().subscribed.wait(timeout=5)
+    cache_user(7)
+    other_replica = InvalidationBus(broker=broker.get_broker())
+    other_replica.invalidate(user_ids=[7])
+    cache_user(7)  # only evicted by the event
+    other_replica.flush()
+
+    deadline = time.monotonic() + 5
+    while cache.trackings.get_version(7) is not None:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
@@ -0,0 +1,55 @@
+import json
+
+import logging_config
+import pytest
+from loguru import logger
+
+
+@pytest.fixture
+def records():
+    records = []
+    yield records
+    logging_config.configure()
+
+
+def test_parse_levels():
+    assert logging_config.parse_levels("crud=warning, events=DEBUG,,x") == {
+        "crud": "WARNING",
+        "events": "DEBUG",
+    }
+
+
+def test_json_output_and_module_levels(records):
+    logging_config.configure(
+        level="INFO",
+        levels={__name__: "ERROR"},
+        sink=records.append,
+        enqueue=False,
+    )
+    logger.warning("dropped")
+    logger.error("written")
+
+    assert len(records) == 1
+    record = json.loads(records[0])["record"]
+    assert record["message"] == "written"
+    assert record["level"]["name"] == "ERROR"
+
+
+def test_rate_limited(records):
+    logging_config.configure(sink=records.append, format="text", enqueue=False)
+    for i in range(5):
+        logging_config.rate_limited("test", rate=0.001, burst=2).info(f"message {i}")
+    assert [r.record["message"] for r in records] == ["message 0", "message 1"]
+
+    bucket = logging_config._buckets["test"]
+    assert bucket.suppressed == 3
+    bucket.tokens = 1
+    logging_config.rate_limited("test").info("after")
+    assert records[-1].record["extra"]["suppressed"] == 3
+
+
+def test_sampled(records):
+    logging_config.configure(sink=records.append, enqueue=False)
+    logging_config.sampled(0.0).bind(x=1).info("never")
+    logging_config.sampled(1.0).info("always")
+    assert len(records) == 1
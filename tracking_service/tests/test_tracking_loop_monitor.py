@@ -0,0 +1,52 @@
+import asyncio
+import time
+
+import anyio.to_thread
+import loop_monitor
+from loguru import logger
+
+
+def blocking_callback():
+    time.sleep(0.3)
+
+
+def test_monitor_reports_blocked_loop():
+    messages = []
+    handler = logger.add(messages.append, level="WARNING")
+    blocked = loop_monitor.LOOP_BLOCKED._children[()].get()
+
+    async def run():
+        monitor = loop_monitor.LoopMonitor(interval=0.01, threshold=0.05)
+        await monitor.start()
+        await asyncio.sleep(0.05)
+        blocking_callback()
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+
+    try:
+        asyncio.run(run())
+    finally:
+        logger.remove(handler)
+
+    assert loop_monitor.LOOP_BLOCKED._children[()].get() == blocked + 1
+    assert len(messages) == 1
+    assert "blocking_callback" in messages[0]
+
+
+def test_monitor_sets_threadpool_size():
+    async def run():
+        monitor = loop_monitor.LoopMonitor(interval=0.01, threadpool_size=7)
+        await monitor.start()
+        await anyio.to_thread.run_sync(time.sleep, 0.03)
+        await monitor.stop()
+        return anyio.to_thread.current_default_thread_limiter().total_tokens
+
+    assert asyncio.run(run()) == 7
+    assert loop_monitor.THREADPOOL_LIMIT._children[()].get() == 7
+
+
+def test_loop_metrics_exposed(client):
+    body = client.get("/metrics").text
+    assert "event_loop_lag_seconds_bucket" in body
+    assert "threadpool_active_threads" in body
+    assert "threadpool_queue_wait_seconds_count" in body
@@ -0,0 +1,28 @@
+from pathlib import Path
+
+import migrate
+from sqlalchemy import create_engine, inspect
+
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+
+
+def test_migrate_upgrades_once(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path}/migrate.db"
+    monkeypatch.chdir(SERVICE_DIR)
+    monkeypatch.setenv("DATABASE_URL", url)
+
+    assert migrate.migrate(migrate.alembic_config()) is True
+    assert "sleeps" in inspect(create_engine(url)).get_table_names()
+
+    # the next replica finds the database current
+    assert migrate.migrate(migrate.alembic_config()) is False
+
+
+def test_alembic_config_escapes_database_url(monkeypatch):
+    monkeypatch.chdir(SERVICE_DIR)
+    monkeypatch.setenv("DATABASE_URL", "postgresql://user:p%40ss@db/trackings")
+    config = migrate.alembic_config()
+    assert config.get_main_option("sqlalchemy.url") == (
+        "postgresql://user:p%40ss@db/trackings"
+    )
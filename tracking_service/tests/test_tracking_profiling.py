@@ -0,0 +1,64 @@
+import time
+from collections import Counter
+
+import profiling
+import pytest
+
+
+@pytest.fixture
+def profiles(tmp_path):
+    profiling.configure(enabled=True, directory=tmp_path, sample_rate=0.0)
+    yield tmp_path
+    profiling.configure(enabled=False)
+
+
+def busy(seconds: float) -> None:
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_sampler_collects_collapsed_stacks():
+    sampler = profiling.Sampler(interval=0.001)
+    sampler.start()
+    busy(0.05)
+    stacks = sampler.stop()
+
+    assert sum(stacks.values()) > 0
+    assert any("busy (test_tracking_profiling.py" in stack for stack in stacks)
+
+
+def test_write_profile(profiles):
+    path = profiling.write_profile(Counter({"main;a (x.py:1)": 3}), "profile")
+    assert path.read_text() == "main;a (x.py:1) 3\n"
+
+
+def test_request_without_header_is_not_profiled(items, client, profiles):
+    response = client.get("/details/symptoms/")
+    assert response.status_code == 200
+    assert "x-profile" not in response.headers
+    assert list(profiles.iterdir()) == []
+
+
+def test_request_with_header_is_profiled(items, client, profiles):
+    response = client.get("/details/symptoms/", headers={"x-profile": "1"})
+    assert response.status_code == 200
+
+    name = response.headers["x-profile"]
+    assert "GET-details_symptoms" in name
+    assert [path.name for path in profiles.iterdir()] == [name]
+
+
+def test_profiling_token(items, client, profiles):
+    profiling.configure(enabled=True, directory=profiles, token="secret")
+
+    client.get("/details/symptoms/", headers={"x-profile": "wrong"})
+    assert list(profiles.iterdir()) == []
+
+    response = client.get("/details/symptoms/", headers={"x-profile": "secret"})
+    assert (profiles / response.headers["x-profile"]).exists()
+
+
+def test_disabled_profiling_ignores_header(items, client):
+    response = client.get("/details/symptoms/", headers={"x-profile": "1"})
+    assert "x-profile" not in response.headers
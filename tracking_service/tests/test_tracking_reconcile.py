@@ -0,0 +1,86 @@
+from datetime import datetime
+
+import crud
+import reconcile
+import schemas as schemes
+from enums import TrackingType
+
+
+def test_iter_orphans():
+    tracking_user_ids = [1, 2, 5, 7, 9, 12]
+    existing_user_ids = [2, 3, 4, 7, 8, 9]
+    assert list(reconcile.iter_orphans(tracking_user_ids, existing_user_ids)) == [
+        1,
+        5,
+        12,
+    ]
+
+
+def test_iter_orphans_is_lazy():
+    def endless():
+        n = 0
+        while True:
+            n += 2
+            yield n
+
+    orphans = reconcile.iter_orphans(endless(), iter([2, 6]))
+    assert [next(orphans) for _ in range(3)] == [4, 8, 10]
+
+
+def test_iter_ids_fetches_keyset_pages():
+    pages = {0: [1, 2], 2: [5, 8], 8: []}
+    assert list(reconcile.iter_ids(pages.__getitem__)) == [1, 2, 5, 8]
+
+
+def test_chunked():
+    assert list(reconcile.chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+
+def test_get_tracking_user_ids(items, db):
+    assert crud.get_tracking_user_ids(db) == [1, 2]
+    assert crud.get_tracking_user_ids(db, after_id=1) == [2]
+    assert crud.get_tracking_user_ids(db, limit=1) == [1]
+    assert crud.get_max_tracking_user_id(db) == 2
+
+
+def test_reconcile_deletes_orphans(items, db):
+    # user 2 does not exist in the user service anymore
+    orphans = reconcile.reconcile(
+        lambda after_id: [1, 3] if after_id == 0 else [],
+        db_factory=lambda: db,
+        page_size=1,
+        max_chunks_per_second=0,
+    )
+    assert orphans == 1
+    assert crud.get_trackings_by_user(db, TrackingType.SLEEP, 2) == []
+    assert len(crud.get_trackings_by_user(db, TrackingType.SLEEP, 1)) > 0
+
+
+def test_reconcile_dry_run(items, db):
+    orphans = reconcile.reconcile(
+        lambda after_id: [],
+        db_factory=lambda: db,
+        dry_run=True,
+    )
+    assert orphans == 2
+    assert len(crud.get_trackings_by_user(db, TrackingType.SLEEP, 2)) == 1
+
+
+def test_reconcile_keeps_users_created_during_the_run(items, db):
+    sleep = schemes.SleepCreate(
+        date=datetime(2025, 3, 1), duration=7, quality="good", comment="", symptoms=[]
+    )
+
+    def fetch_user_ids(after_id):
+        # user 3 signs up and tracks after the run started
+        if after_id == 0:
+            crud.create_tracking(db, sleep, TrackingType.SLEEP, 3)
+            return [1]
+        return []
+
+    orphans = reconcile.reconcile(
+        fetch_user_ids, db_factory=lambda: db, max_chunks_per_second=0
+    )
+    assert orphans == 1
+    assert crud.get_trackings_by_user(db, TrackingType.SLEEP, 2) == []
+    assert len(crud.get_trackings_by_user(db, TrackingType.SLEEP, 3)) == 1
@@ -0,0 +1,60 @@
+import crud
+import orjson
+import serialization
+from pydantic import TypeAdapter
+from routers.trackings import TrackingOutSchemes
+
+
+def test_dump_matches_response_model(items, db):
+    # sleeps and days interleaved, so the rows form several runs
+    trackings = crud.get_trackings(db)
+    trackings = trackings[::2] + trackings[1::2]
+
+    adapter = TypeAdapter(list[TrackingOutSchemes])
+    expected = adapter.dump_json(
+        adapter.validate_python(trackings, from_attributes=True)
+    )
+    response = serialization.trackings_response(trackings)
+
+    assert response.media_type == "application/json"
+    assert orjson.loads(response.body) == orjson.loads(expected)
+
+
+def test_get_all_trackings_keeps_order(items, client):
+    response = client.get("/trackings/", params={"user_id": 1})
+    assert response.status_code == 200
+    body = response.json()
+    assert ["duration" in tracking for tracking in body] == [True] * 3 + [False] * 5
+
+
+def test_compact_format_references_catalog_ids(items, client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    full = client.get("/trackings/me", params={"type": "day"}, headers=headers)
+    response = client.get(
+        "/trackings/me", params={"type": "day", "format": "compact"}, headers=headers
+    )
+    assert response.status_code == 200
+    compact = response.json()
+
+    assert compact["symptoms"] == {
+        "1": {"name": "Headache"},
+        "2": {"name": "Leg Pain"},
+        "3": {"name": "Restless Legs"},
+    }
+    assert compact["triggers"] == {
+        "1": {"name": "Süßigkeiten", "category": "food"},
+        "2": {"name": "Stress", "category": "lifestyle"},
+    }
+    assert compact["trackings"][0]["triggers"] == [1]
+    assert compact["trackings"][0]["afternoon_symptoms"] == [1, 2, 3]
+    assert compact["trackings"][0]["comment"] == full.json()[0]["comment"]
+    assert len(response.content) < len(full.content)
+
+
+def test_invalid_format(items, client, token):
+    response = client.get(
+        "/trackings/me",
+        params={"type": "day", "format": "xml"},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 400
@@ -0,0 +1,31 @@
+import server
+
+
+def test_development_reloads():
+    assert server.uvicorn_options({}) == {"reload": True}
+
+
+def test_production_options():
+    options = server.uvicorn_options(
+        {"APP_ENV": "production", "WEB_CONCURRENCY": "3", "LIMIT_CONCURRENCY": "100"}
+    )
+    assert "reload" not in options
+    assert options["workers"] == 3
+    assert options["limit_concurrency"] == 100
+    assert options["limit_max_requests"] is None
+    assert options["loop"] in ("uvloop", "asyncio")
+    assert options["http"] in ("httptools", "h11")
+    assert options["timeout_graceful_shutdown"] == 30
+    assert options["access_log"] is False
+
+
+def test_workers_default_to_available_cpus():
+    options = server.uvicorn_options({"APP_ENV": "production"})
+    assert options["workers"] == server.available_cpus() >= 1
+
+
+def test_cache_warning_for_workers_without_shared_cache():
+    options = server.uvicorn_options({"APP_ENV": "production", "WEB_CONCURRENCY": "4"})
+    assert "4 workers" in server.cache_warning(options, {})
+    assert server.cache_warning(options, {"CACHE_BACKEND": "redis"}) is None
+    assert server.cache_warning({"reload": True}, {}) is None
@@ -1,5 +1,9 @@
+from datetime import datetime, timedelta, timezone
+
 import crud
+import models
 import pytest
+import serialization
 from enums import SleepQuality, TrackingType
 
 
@@ -367,3 +371,235 @@ def test_delete_not_owned_tracking(db, items, client, token):
     tracking = crud.get_tracking_by_id(db, TrackingType.SLEEP, tracking_id)
     assert response.status_code == 401
     assert tracking.user_id == 2
+
+
+def test_server_timing_header(items, client):
+    response = client.get(SYMPTOMS_PATH)
+    assert response.status_code == 200
+    assert response.headers["Server-Timing"].startswith("db;dur=")
+    assert '"1 queries"' in response.headers["Server-Timing"]
+
+
+def test_get_day_trackings_query_budget(items, client, token, query_budget):
+    """
+    The data version, one query for the days plus one per relationship,
+    independent of rows.
+    """
+    headers = {"Authorization": f"Bearer {token}"}
+    with query_budget(5):
+        response = client.get("/trackings/me?type=day", headers=headers)
+    assert response.status_code == 200
+    assert len(response.json()) == 5
+
+
+def test_get_trackings_sparse_fields(items, client, token, query_budget):
+    """The data version and the requested columns, no relationship queries."""
+    headers = {"Authorization": f"Bearer {token}"}
+    with query_budget(2):
+        response = client.get(
+            "/trackings/me?type=sleep&fields=date,quality,duration", headers=headers
+        )
+    assert response.status_code == 200
+    assert response.json()[0] == {
+        "id": 1,
+        "date": "2024-09-10T00:00:00",
+        "quality": "good",
+        "duration": 8,
+    }
+
+
+def test_get_trackings_sparse_fields_blank_and_reordered(items, client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.get(
+        "/trackings/me?type=sleep&fields=quality, ,date,", headers=headers
+    )
+    assert response.status_code == 200
+    assert list(response.json()[0]) == ["id", "date", "quality"]
+    assert serialization.parse_fields(models.Sleep, "quality,date") == (
+        "date",
+        "quality",
+    )
+
+
+def test_get_trackings_sparse_relationship(items, client, token, query_budget):
+    headers = {"Authorization": f"Bearer {token}"}
+    with query_budget(3):
+        response = client.get("/trackings/me?type=day&fields=triggers", headers=headers)
+    assert response.status_code == 200
+    assert response.json()[1] == {
+        "id": 2,
+        "triggers": [
+            {"name": "Süßigkeiten", "category": "food", "id": 1},
+            {"name": "Stress", "category": "lifestyle", "id": 2},
+        ],
+    }
+
+
+def test_get_trackings_unknown_field(items, client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.get(
+        "/trackings/me?type=sleep&fields=date,triggers", headers=headers
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Unknown fields: triggers"
+
+
+def test_tracking_changes_full_sync(items, client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.get("/trackings/me/changes", headers=headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert len(body["trackings"]) == 8
+    assert body["deleted"] == []
+    assert body["cursor"] is not None
+
+
+def days_ago(days: int) -> datetime:
+    now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    return now - timedelta(days=days)
+
+
+def test_tracking_changes_since_cursor(items, db, client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    for model in (models.Sleep, models.Day):
+        db.query(model).update({"updated": days_ago(10)})
+    db.commit()
+    cursor = client.get("/trackings/me/changes", headers=headers).json()["cursor"]
+    assert cursor == days_ago(10).isoformat()
+
+    response = client.put(
+        "/trackings/sleep/2",
+        json={"duration": 6, "quality": "bad", "symptoms": [1], "comment": "bad"},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    response = client.delete("/trackings/day/1", headers=headers)
+    assert response.status_code == 204
+
+    since = days_ago(5).isoformat()
+    response = client.get(
+        "/trackings/me/changes", params={"since": since}, headers=headers
+    )
+    body = response.json()
+    assert [tracking["id"] for tracking in body["trackings"]] == [2]
+    assert [(d["type"], d["id"]) for d in body["deleted"]] == [("day", 1)]
+    assert body["cursor"] > since
+
+
+def test_tracking_changes_cursor_overlaps_recent_writes(items, db, client, token):
+    """Writes within the overlap may still commit, the next sync repeats them."""
+    headers = {"Authorization": f"Bearer {token}"}
+    for model in (models.Sleep, models.Day):
+        db.query(model).update({"updated": days_ago(10)})
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    db.query(models.Sleep).filter_by(id=2).update({"updated": now})
+    db.commit()
+
+    cursor = client.get("/trackings/me/changes", headers=headers).json()["cursor"]
+    assert days_ago(10).isoformat() < cursor < now.isoformat()
+    response = client.get(
+        "/trackings/me/changes", params={"since": cursor}, headers=headers
+    )
+    assert [tracking["id"] for tracking in response.json()["trackings"]] == [2]
+
+
+def test_delete_trackings_by_user_writes_tombstones(items, db, client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    client.delete("/trackings/me", headers=headers)
+    response = client.get(
+        "/trackings/me/changes",
+        params={"since": days_ago(1).isoformat()},
+        headers=headers,
+    )
+    body = response.json()
+    assert body["trackings"] == []
+    assert len(body["deleted"]) == 8
+
+
+def test_tracking_changes_since_beyond_retention(items, client, token):
+    """Tombstones of that period may be pruned, the client must resync."""
+    headers = {"Authorization": f"Bearer {token}"}
+    since = days_ago(crud.TOMBSTONE_RETENTION.days + 1).isoformat()
+    response = client.get(
+        "/trackings/me/changes", params={"since": since}, headers=headers
+    )
+    assert response.status_code == 410
+    assert "cursor" not in response.json()
+
+
+def test_prune_tombstones(items, db):
+    crud.delete_tracking(db, "sleep", 1, 1)
+    crud.delete_tracking(db, "sleep", 2, 1)
+    db.query(models.DeletedTracking).filter_by(tracking_id=1).update(
+        {"deleted": days_ago(crud.TOMBSTONE_RETENTION.days + 1)}
+    )
+    db.commit()
+
+    assert crud.prune_tombstones(db) == 1
+    assert [d.tracking_id for d in db.query(models.DeletedTracking)] == [2]
+
+
+def test_forget_user_drops_tombstones(items, db):
+    crud.delete_tracking(db, "sleep", 1, 1)
+    crud.delete_trackings_by_user(db, 1, forget=True)
+    assert db.query(models.DeletedTracking).filter_by(user_id=1).count() == 0
+
+
+def test_trackings_etag(items, client, token, query_budget):
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.get("/trackings/me?type=sleep", headers=headers)
+    etag = response.headers["ETag"]
+    assert etag == '"8"'  # eight trackings of user 1 created
+
+    with query_budget(1):
+        response = client.get(
+            "/trackings/me?type=sleep", headers={**headers, "If-None-Match": etag}
+        )
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+
+
+@pytest.mark.parametrize(
+    "if_none_match, status_code",
+    [
+        ('"1", "8"', 304),
+        ('"1","8"', 304),
+        ('W/"8"', 304),
+        ("*", 304),
+        ('"1", W/"2"', 200),
+        ('"80"', 200),
+    ],
+)
+def test_trackings_etag_if_none_match(
+    items, client, token, if_none_match, status_code
+):
+    headers = {"Authorization": f"Bearer {token}", "If-None-Match": if_none_match}
+    response = client.get("/trackings/me?type=sleep", headers=headers)
+    assert response.status_code == status_code
+
+
+def test_trackings_etag_changes_with_writes(items, client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    etag = client.get("/trackings/me/changes", headers=headers).headers["ETag"]
+
+    client.delete("/trackings/sleep/1", headers=headers)
+
+    response = client.get(
+        "/trackings/me/changes", headers={**headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_metrics_endpoint(items, client):
+    client.get(SYMPTOMS_PATH)
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "# TYPE http_request_duration_seconds histogram" in response.text
+    assert (
+        'http_request_duration_seconds_count{route="/details/symptoms/",'
+        'method="GET",status="200"}' in response.text
+    )
+    assert "db_pool_checked_out" in response.text
+    assert "broker_consume_lag_seconds" in response.text
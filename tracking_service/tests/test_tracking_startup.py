@@ -0,0 +1,66 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import database
+import events
+
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+IMPORT_BUDGET_SECONDS = 3.0
+
+IMPORT_MAIN = """
+import json, sys, threading, time
+start = time.perf_counter()
+import main
+print(json.dumps({
+    "seconds": time.perf_counter() - start,
+    "modules": [
+        m for m in ("passlib", "psycopg", "psycopg2", "pika") if m in sys.modules
+    ],
+    "threads": threading.active_count(),
+}))
+"""
+
+
+def test_import_main_is_fast_and_side_effect_free():
+    # the production URL, creating its engine would import the driver
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_MAIN],
+        cwd=SERVICE_DIR,
+        env={**os.environ, "DATABASE_URL": "postgresql://user:password@db/app"},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    report = json.loads(result.stdout.splitlines()[-1])
+
+    assert report["seconds"] < IMPORT_BUDGET_SECONDS
+    assert report["modules"] == []  # heavy modules and drivers load lazily
+    assert report["threads"] == 1  # no consumer or logging threads
+
+
+def test_liveness(client):
+    response = client.get("/trackings/health/live")
+    assert response.status_code == 200
+
+
+def test_readiness(client):
+    response = client.get("/trackings/health/ready")
+    assert response.status_code == 200
+    assert response.json()["checks"] == {"database": True, "broker": True}
+
+
+def test_readiness_fails_without_consumer(client):
+    events.stop_consuming_events()
+    response = client.get("/trackings/health/ready")
+    assert response.status_code == 503
+    assert response.json()["checks"]["broker"] is False
+
+
+def test_readiness_fails_without_database(client, monkeypatch):
+    monkeypatch.setattr(database, "check_connection", lambda: False)
+    response = client.get("/trackings/health/ready")
+    assert response.status_code == 503
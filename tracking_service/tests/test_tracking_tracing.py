@@ -0,0 +1,61 @@
+import pytest
+import tracing
+
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+TRACEPARENT = f"00-{TRACE_ID}-00f067aa0ba902b7-01"
+
+
+@pytest.fixture
+def exporter():
+    exporter = tracing.InMemoryExporter()
+    tracing.set_exporter(exporter)
+    yield exporter
+    tracing.set_exporter(None)
+
+
+def test_parse_traceparent():
+    context = tracing.parse_traceparent(TRACEPARENT)
+    assert context.trace_id == TRACE_ID
+    assert context.span_id == "00f067aa0ba902b7"
+    assert context.sampled
+    assert tracing.format_traceparent(context) == TRACEPARENT
+
+
+@pytest.mark.parametrize(
+    "header",
+    [None, "", "garbage", f"00-{'0' * 32}-00f067aa0ba902b7-01", "00-xyz-abc-01"],
+)
+def test_parse_invalid_traceparent(header):
+    assert tracing.parse_traceparent(header) is None
+
+
+def test_spans_disabled_without_exporter():
+    with tracing.start_span("noop") as span:
+        assert span is None
+    assert tracing.inject({}) == {}
+
+
+def test_nested_spans_and_inject(exporter):
+    with tracing.start_span("outer") as outer:
+        with tracing.start_span("inner") as inner:
+            headers = tracing.inject({})
+
+    assert [span.name for span in exporter.spans] == ["inner", "outer"]
+    assert inner.parent_id == outer.context.span_id
+    assert inner.context.trace_id == outer.context.trace_id
+    assert tracing.extract(headers).span_id == inner.context.span_id
+
+
+def test_request_continues_incoming_trace(items, client, exporter):
+    response = client.get("/details/symptoms/", headers={"traceparent": TRACEPARENT})
+    assert response.status_code == 200
+
+    server = next(s for s in exporter.spans if s.kind == tracing.SPAN_KIND_SERVER)
+    assert server.name == "GET /details/symptoms/"
+    assert server.context.trace_id == TRACE_ID
+    assert server.parent_id == "00f067aa0ba902b7"
+
+    sql = [s for s in exporter.spans if s.name.startswith("SQL")]
+    assert sql
+    assert all(s.parent_id == server.context.span_id for s in sql)
@@ -0,0 +1,163 @@
+from datetime import datetime
+
+import crud
+import pytest
+import schemas as schemes
+import write_buffer
+from sqlalchemy.orm import Session
+from write_buffer import GroupCommitter
+
+
+USER_ID = 50
+
+
+def sleep(day: int, symptoms: list[int] | None = None) -> schemes.SleepCreate:
+    return schemes.SleepCreate(
+        date=datetime(2025, 3, day),
+        duration=7,
+        quality="good",
+        comment="",
+        symptoms=symptoms or [],
+    )
+
+
+@pytest.fixture
+def session_factory(db, items):
+    """Sessions of the committer, in savepoints of the test's transaction."""
+    connection = db.get_bind()
+    return lambda: Session(bind=connection, join_transaction_mode="create_savepoint")
+
+
+@pytest.fixture
+def committer(session_factory):
+    committer = GroupCommitter(session_factory, window=0.2)
+    committer.start()
+    yield committer
+    committer.stop()
+
+
+def test_concurrent_creates_are_committed_together(committer, session_factory):
+    futures = [
+        committer.submit(sleep(day, [1, 2]), "sleep", USER_ID) for day in (1, 2, 3)
+    ]
+    trackings = [future.result(5) for future in futures]
+
+    assert [t.date.day for t in trackings] == [1, 2, 3]
+    assert all(t.id for t in trackings)
+    assert [s.name for s in trackings[0].symptoms] == ["Headache", "Leg Pain"]
+    # one transaction, so one version bump for the user
+    assert crud.get_data_version(session_factory(), USER_ID) == 1
+
+
+def test_failing_entry_gets_its_own_error(committer, session_factory):
+    fallbacks = write_buffer.FALLBACKS.labels().get()
+    futures = [
+        committer.submit(sleep(1), "sleep", USER_ID),
+        committer.submit(sleep(1), "sleep", USER_ID),  # same date, unique violation
+        committer.submit(sleep(2, [99]), "sleep", USER_ID),  # unknown symptom
+        committer.submit(sleep(3), "sleep", USER_ID),
+    ]
+
+    assert futures[0].result(5).date.day == 1
+    with pytest.raises(crud.TrackingNotValidError):
+        futures[1].result(5)
+    with pytest.raises(crud.TrackingNotValidError):
+        futures[2].result(5)
+    assert futures[3].result(5).date.day == 3
+    assert write_buffer.FALLBACKS.labels().get() == fallbacks + 1
+
+    db = session_factory()
+    assert len(crud.get_trackings_by_user(db, "sleep", USER_ID)) == 2
+
+
+def test_stop_commits_queued_creates(session_factory):
+    committer = GroupCommitter(session_factory, window=10)
+    committer.start()
+    future = committer.submit(sleep(1), "sleep", USER_ID)
+    committer.stop()
+    assert future.result(0).id
+
+
+def test_timed_out_create_is_cancelled(session_factory):
+    committer = GroupCommitter(session_factory, timeout=0.01)
+    with pytest.raises(write_buffer.WriteBufferTimeoutError):
+        committer.create(sleep(1), "sleep", USER_ID)
+
+    committer.start()
+    committer.stop()
+    assert crud.get_trackings_by_user(session_factory(), "sleep", USER_ID) == []
+
+
+def test_session_failure_fails_the_batch():
+    def session_factory():
+        raise RuntimeError("database unavailable")
+
+    committer = GroupCommitter(session_factory)
+    committer.start()
+    future = committer.submit(sleep(1), "sleep", USER_ID)
+    with pytest.raises(crud.TrackingNotValidError):
+        future.result(5)
+    assert committer.running
+    committer.stop()
+
+
+def test_committed_creates_survive_failing_load(committer, session_factory, db):
+    def fail(db, committed):
+        raise RuntimeError("connection lost")
+
+    committer._resolve = fail
+    future = committer.submit(sleep(1), "sleep", USER_ID)
+    with pytest.raises(write_buffer.TrackingNotLoadedError) as error:
+        future.result(5)
+
+    db_tracking = crud.get_tracking_by_id(db, "sleep", error.value.tracking_id)
+    assert db_tracking.user_id == USER_ID
+
+
+def test_create_tracking_loads_committed_tracking(db, monkeypatch):
+    class Buffer:
+        running = True
+
+        def create(self, tracking, tracking_type, user_id):
+            db_tracking = crud.create_tracking(db, tracking, tracking_type, user_id)
+            raise write_buffer.TrackingNotLoadedError("sleep", db_tracking.id)
+
+    monkeypatch.setattr(write_buffer, "buffer", Buffer())
+    db_tracking = write_buffer.create_tracking(db, sleep(1), "sleep", USER_ID)
+    assert db_tracking.date.day == 1
+
+
+def test_create_route_uses_running_buffer(client, token, committer, monkeypatch):
+    monkeypatch.setattr(write_buffer, "buffer", committer)
+    response = client.post(
+        "/trackings/sleep",
+        json={
+            "date": "2025-03-01",
+            "duration": 7,
+            "quality": "good",
+            "comment": "",
+            "symptoms": [1],
+        },
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 201
+    assert response.json()["symptoms"] == [{"id": 1, "name": "Headache"}]
+
+
+def test_create_route_timeout(client, token, monkeypatch):
+    def create_tracking(*args):
+        raise write_buffer.WriteBufferTimeoutError("timeout")
+
+    monkeypatch.setattr(write_buffer, "create_tracking", create_tracking)
+    response = client.post(
+        "/trackings/day",
+        json={
+            "date": "2025-03-01",
+            "comment": "",
+            "triggers": [],
+            "late_morning_symptoms": [],
+            "afternoon_symptoms": [],
+        },
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 503
@@ -0,0 +1,289 @@
+"""
+Write Buffer Module
+
+Optional group commit for tracking creation. At peak times every
+`POST /trackings/sleep` and `POST /trackings/day` would run its own
+transaction, and the database flushes its log once per commit. With
+WRITE_BUFFER_ENABLED the routes hand their creates to a worker thread
+instead, which gathers the creates arriving within WRITE_BUFFER_WINDOW_MS
+milliseconds (at most WRITE_BUFFER_MAX_BATCH) and commits them in one
+transaction, with one data version bump per user.
+
+Every caller still gets its own result or error:
+
+1. The batch is inserted and committed at once (fast path).
+2. If that fails, e.g. on a unique constraint violation of one entry, the
+   transaction is rolled back and the entries are inserted one by one,
+   each in a savepoint. Failing entries raise TrackingNotValidError in
+   their request, the others are committed together.
+3. Committed trackings are loaded with one query per type. If that fails,
+   each request loads its tracking in its own session, it is never
+   reported as failed.
+
+The batch size is bounded by the concurrent requests of the process (the
+threadpool of the sync routes), so the buffer helps when many requests
+arrive at once and adds up to the window of latency otherwise.
+
+- WRITE_BUFFER_ENABLED: false (default) or true.
+- WRITE_BUFFER_WINDOW_MS: Milliseconds to gather a batch, default 5.
+- WRITE_BUFFER_MAX_BATCH: Creates per transaction, default 100.
+- WRITE_BUFFER_TIMEOUT: Seconds a request waits for its batch, default 30.
+  A create still queued then is cancelled and the request fails with
+  WriteBufferTimeoutError (503). A create already being written may still
+  be committed, clients retry with their Idempotency-Key.
+
+Key Components:
+- GroupCommitter: The queue and worker thread committing batches.
+- buffer: The write buffer of this process, started in the lifespan.
+- create_tracking: Creates a tracking through the buffer if it runs.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Callable
+
+import crud
+import invalidation
+import metrics
+import models
+from database import SessionLocal
+from loguru import logger
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+
+WRITE_BUFFER_ENABLED = os.getenv("WRITE_BUFFER_ENABLED", "false").lower() in (
+    "1",
+    "true",
+)
+WRITE_BUFFER_WINDOW_MS = float(os.getenv("WRITE_BUFFER_WINDOW_MS", "5"))
+WRITE_BUFFER_MAX_BATCH = int(os.getenv("WRITE_BUFFER_MAX_BATCH", "100"))
+WRITE_BUFFER_TIMEOUT = float(os.getenv("WRITE_BUFFER_TIMEOUT", "30"))
+
+BATCH_SIZE = metrics.Histogram(
+    "write_buffer_batch_size",
+    "Trackings created per group commit.",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250),
+)
+FALLBACKS = metrics.Counter(
+    "write_buffer_fallbacks_total",
+    "Batches retried entry by entry after the batch commit failed.",
+)
+
+
+class WriteBufferTimeoutError(Exception):
+    pass
+
+
+class TrackingNotLoadedError(Exception):
+    """The tracking was committed, but loading it afterwards failed."""
+
+    def __init__(self, tracking_type: str, tracking_id: int):
+        super().__init__(f"Committed {tracking_type} tracking {tracking_id} not loaded")
+        self.tracking_type = tracking_type
+        self.tracking_id = tracking_id
+
+
+@dataclass
+class _Create:
+    tracking: BaseModel
+    tracking_type: str
+    user_id: int
+    future: Future = field(default_factory=Future)
+
+
+class GroupCommitter:
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        window: float = WRITE_BUFFER_WINDOW_MS / 1000,
+        max_batch: int = WRITE_BUFFER_MAX_BATCH,
+        timeout: float = WRITE_BUFFER_TIMEOUT,
+    ):
+        self.session_factory = session_factory
+        self.window = window
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self._queue: queue.Queue[_Create | None] = queue.Queue()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def submit(
+        self, tracking: BaseModel, tracking_type: str, user_id: int
+    ) -> Future:
+        create = _Create(tracking, tracking_type, user_id)
+        self._queue.put(create)
+        return create.future
+
+    def create(
+        self, tracking: BaseModel, tracking_type: str, user_id: int
+    ) -> models.Tracking:
+        """Create a tracking in the next batch, like crud.create_tracking."""
+        future = self.submit(tracking, tracking_type, user_id)
+        try:
+            return future.result(self.timeout)
+        except FutureTimeoutError:
+            # skipped by the worker if it did not start writing it yet
+            future.cancel()
+            raise WriteBufferTimeoutError(
+                f"Tracking not committed within {self.timeout} seconds"
+            )
+
+    def start(self) -> None:
+        """Start the worker thread, called on application startup."""
+        self._thread = threading.Thread(
+            target=self._run, name="write-buffer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Commit the queued creates and stop the worker thread."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            create = self._queue.get()
+            if create is None:
+                break
+            batch = [create]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                try:
+                    remaining = max(0.0, deadline - time.monotonic())
+                    create = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if create is None:
+                    stopping = True
+                    break
+                batch.append(create)
+            self._commit(batch)
+
+    def _commit(self, batch: list[_Create]) -> None:
+        # drop creates cancelled by their timed out caller, the others can
+        # no longer be cancelled
+        batch = [
+            create for create in batch if create.future.set_running_or_notify_cancel()
+        ]
+        if not batch:
+            return
+        BATCH_SIZE.observe(len(batch))
+        db = None
+        try:
+            db = self.session_factory()
+            try:
+                committed = self._write(db, batch, savepoints=False)
+            except Exception as e:
+                db.rollback()
+                FALLBACKS.inc()
+                logger.info(f"Group commit of {len(batch)} trackings failed: {e}")
+                committed = self._write(db, batch, savepoints=True)
+        except Exception as e:
+            for create in batch:
+                if not create.future.done():
+                    create.future.set_exception(
+                        crud.TrackingNotValidError(f"Tracking data not valid: {e}")
+                    )
+            if db is not None:
+                db.close()
+            return
+
+        try:
+            self._resolve(db, committed)
+        except Exception as e:
+            # the rows are saved, their requests load them in their own session
+            logger.warning(f"Loading {len(committed)} committed trackings failed: {e}")
+            for create, tracking_id in committed:
+                if not create.future.done():
+                    create.future.set_exception(
+                        TrackingNotLoadedError(create.tracking_type, tracking_id)
+                    )
+        finally:
+            db.close()
+
+    def _write(
+        self, db: Session, batch: list[_Create], savepoints: bool
+    ) -> list[tuple[_Create, int]]:
+        """
+        Insert and commit the batch, return the creates with their tracking
+        ids. With `savepoints`, entries failing are rolled back alone and
+        their callers get the error.
+        """
+        added = []
+        for create in batch:
+            if create.future.done():
+                continue
+            try:
+                with db.begin_nested() if savepoints else nullcontext():
+                    db_tracking = crud.build_tracking(
+                        db, create.tracking, create.tracking_type, create.user_id
+                    )
+                    db.add(db_tracking)
+                    if savepoints:
+                        db.flush()
+            except Exception as e:
+                if not savepoints:
+                    raise
+                create.future.set_exception(
+                    crud.TrackingNotValidError(f"Tracking data not valid: {e}")
+                )
+                continue
+            added.append((create, db_tracking))
+
+        user_ids = {create.user_id for create, _ in added}
+        for user_id in user_ids:
+            crud.bump_data_version(db, user_id)
+        db.flush()
+        # the ids before the commit expires the objects
+        committed = [(create, db_tracking.id) for create, db_tracking in added]
+        db.commit()
+        invalidation.bus.invalidate(user_ids=user_ids)
+        return committed
+
+    def _resolve(self, db: Session, committed: list[tuple[_Create, int]]) -> None:
+        """Load the committed trackings with one query per type, pass them on."""
+        by_model: dict[type, list[int]] = {}
+        for create, tracking_id in committed:
+            model = models.alchemy_model_factory(model_type=create.tracking_type)
+            by_model.setdefault(model, []).append(tracking_id)
+        loaded = {}
+        for model, ids in by_model.items():
+            for db_tracking in db.scalars(
+                select(model)
+                .options(*crud.relationship_loaders(model))
+                .where(model.id.in_(ids))
+            ):
+                loaded[model, db_tracking.id] = db_tracking
+        for create, tracking_id in committed:
+            model = models.alchemy_model_factory(model_type=create.tracking_type)
+            create.future.set_result(loaded[model, tracking_id])
+
+
+buffer = GroupCommitter()
+
+
+def create_tracking(
+    db: Session, tracking: BaseModel, tracking_type: str, user_id: int
+) -> models.Tracking:
+    """Create through the write buffer if it runs, else in the request's session."""
+    if buffer.running:
+        try:
+            return buffer.create(tracking, tracking_type, user_id)
+        except TrackingNotLoadedError as e:
+            return crud.get_tracking_by_id(db, e.tracking_type, e.tracking_id)
+    return crud.create_tracking(db, tracking, tracking_type, user_id)
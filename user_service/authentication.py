@@ -1,14 +1,15 @@
 import os
+import secrets
 from datetime import datetime, timedelta, timezone
+from functools import cache
 
 import jwt
 import models
 import schemes
-from database import get_db
-from fastapi import Depends, FastAPI, HTTPException, Security, status
+from database import get_db, get_read_db
+from fastapi import Depends, FastAPI, Header, HTTPException, Security, status
 from fastapi.security import OAuth2PasswordBearer, SecurityScopes
 from loguru import logger
-from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 
 
@@ -16,13 +17,22 @@ SECRET_KEY = os.getenv("SECRET_KEY", "mysecretkey")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE = 30
 SCOPES = ["me", "items"]
+# shared secret of the services calling the /internal routes, unset rejects all
+INTERNAL_TOKEN = os.getenv("INTERNAL_TOKEN")
 
 
 oauth2_scheme = OAuth2PasswordBearer(
     tokenUrl="token",
     scopes={"me": "Read personal information.", "items": "Read items."},
 )
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+@cache
+def get_pwd_context():
+    """passlib and bcrypt are imported on first use, not at startup."""
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 def verify_token(
@@ -66,10 +76,23 @@ def verify_token(
     return db, int(user_id)
 
 
+def verify_internal_token(x_internal_token: str | None = Header(default=None)) -> None:
+    """Allow only services sending the shared INTERNAL_TOKEN."""
+    if (
+        not INTERNAL_TOKEN
+        or x_internal_token is None
+        or not secrets.compare_digest(x_internal_token, INTERNAL_TOKEN)
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Internal token missing or invalid",
+        )
+
+
 def get_current_user(
     security_scopes: SecurityScopes,
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ) -> schemes.UserOut:
     if security_scopes.scopes:
         authenticate_value = f'Bearer scope="{security_scopes.scope_str}"'
@@ -130,8 +153,8 @@ def verify(password, hashed_password):
 
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
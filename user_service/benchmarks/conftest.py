@@ -0,0 +1,60 @@
+"""
+Fixtures for the crud micro-benchmarks.
+
+The benchmarks run on an in-memory SQLite database by default. Set
+BENCH_DATABASE_URL to run them on another database, e.g. a local Postgres.
+Tables are created at the start and dropped at the end of the session.
+"""
+
+import itertools
+import os
+
+import pytest
+import schemes
+from crud import create_user
+from database import Base
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+
+BENCH_DATABASE_URL = os.getenv("BENCH_DATABASE_URL", "sqlite://")
+
+
+@pytest.fixture(scope="session")
+def bench_engine():
+    if BENCH_DATABASE_URL.startswith("sqlite"):
+        engine = create_engine(
+            BENCH_DATABASE_URL,
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+    else:
+        engine = create_engine(BENCH_DATABASE_URL)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def db(bench_engine):
+    with Session(bench_engine) as session:
+        yield session
+
+
+@pytest.fixture(scope="session")
+def user(bench_engine):
+    with Session(bench_engine) as db:
+        return create_user(
+            db,
+            schemes.UserCreate(
+                email="bench@example.com", name="bench", password="password"
+            ),
+        )
+
+
+@pytest.fixture(scope="session")
+def unique_emails():
+    """Endless supply of emails, so repeated creates never hit the unique check."""
+    return (f"user{i}@example.com" for i in itertools.count())
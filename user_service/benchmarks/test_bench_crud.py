@@ -0,0 +1,48 @@
+"""
+Micro-benchmarks for user_service.crud and the token validation.
+
+Run from the user_service directory:
+
+    pytest benchmarks --benchmark-autosave
+    pytest benchmarks --benchmark-compare --benchmark-compare-fail=mean:15%
+"""
+
+import authentication
+import crud
+import schemes
+from fastapi.security import SecurityScopes
+
+
+def test_create_user(benchmark, db, unique_emails):
+    # dominated by bcrypt, so fewer rounds are enough
+    benchmark.pedantic(
+        lambda: crud.create_user(
+            db,
+            schemes.UserCreate(
+                email=next(unique_emails), name="bench", password="password"
+            ),
+        ),
+        rounds=10,
+    )
+
+
+def test_get_user_by_email(benchmark, db, user):
+    benchmark(crud.get_user_by_email, db, user.email)
+
+
+def test_update_user(benchmark, db, user):
+    update = schemes.UserUpdate(email=user.email, name="renamed")
+    benchmark(crud.update_user, db, update, user.id)
+
+
+def test_verify_token(benchmark, db, user):
+    token = authentication.create_access_token({"sub": str(user.id)})
+    scopes = SecurityScopes(scopes=["me"])
+    assert benchmark(authentication.verify_token, scopes, token, db) == (db, user.id)
+
+
+def test_verify_password(benchmark):
+    hashed = authentication.get_password_hash("password")
+    benchmark.pedantic(
+        authentication.verify_password, args=("password", hashed), rounds=10
+    )
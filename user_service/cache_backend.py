@@ -0,0 +1,340 @@
+"""
+Cache Backend Module
+
+A small key-value cache interface shared by all services, so caches can be
+moved from the process (one copy per worker and replica) to a shared Redis
+without changing the code using them.
+
+Values are bytes, callers encode them (e.g. with orjson). Every entry has a
+TTL in seconds.
+
+Key Components:
+- CacheBackend: The interface (get, get_many, set, set_many, add, delete,
+  get_or_set).
+- LocalBackend: Thread-safe in-process LRU cache, capped by entry count.
+- RedisBackend: Any server speaking the Redis protocol (Redis, Valkey,
+  KeyDB, fakeredis in tests). `get_many` is one MGET and `set_many` one
+  pipeline, so several keys cost a single round trip.
+- get_cache: Returns the process wide cache selected by CACHE_BACKEND.
+
+Stampede protection: `get_or_set` runs the loader of a missing key once per
+process, concurrent callers wait for its result. RedisBackend also takes a
+short lock key in Redis (SET NX), so only one replica loads; the others poll
+for the value and load themselves if it did not appear within
+CACHE_LOCK_TIMEOUT seconds. The lock holds a random token and is released
+only if it still holds it, a load outliving the lock does not release the
+lock of the next loader.
+
+Failures of the networked backend are counted and logged (rate limited),
+reads then miss and writes are dropped: the cache never fails a request.
+
+- CACHE_BACKEND: memory (default) or redis.
+- CACHE_URL: Redis URL, default redis://redis:6379/0.
+- CACHE_MAX_ENTRIES: Entries of the in-process backend, default 10000.
+- CACHE_LOCK_TIMEOUT: Seconds a load may hold the stampede lock, default 5.
+"""
+
+import os
+import secrets
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Callable
+
+import metrics
+from logging_config import rate_limited
+
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_URL = os.getenv("CACHE_URL", "redis://redis:6379/0")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_LOCK_TIMEOUT = float(os.getenv("CACHE_LOCK_TIMEOUT", "5"))
+
+# interval of replicas polling for a value another replica is loading
+LOCK_POLL_INTERVAL = 0.05
+
+# delete the lock key only if it still holds the token of the caller
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+CACHE_REQUESTS = metrics.Counter(
+    "cache_requests_total",
+    "Cache lookups by backend and result (hit or miss).",
+    labelnames=("backend", "result"),
+)
+CACHE_LOADS = metrics.Counter(
+    "cache_loads_total",
+    "Values loaded by get_or_set after a miss.",
+    labelnames=("backend",),
+)
+CACHE_EVICTIONS = metrics.Counter(
+    "cache_evictions_total",
+    "Entries evicted from the in-process cache to stay below its capacity.",
+)
+CACHE_ERRORS = metrics.Counter(
+    "cache_errors_total",
+    "Failed requests to the cache server.",
+    labelnames=("backend",),
+)
+
+
+class CacheBackend(ABC):
+    """Interface of a bytes cache with TTLs."""
+
+    name = "abstract"
+
+    def __init__(self):
+        self._flights: dict[str, threading.Lock] = {}
+        self._flights_lock = threading.Lock()
+
+    @abstractmethod
+    def get_many(self, keys: list[str]) -> list[bytes | None]:
+        """Values of `keys` in their order, None for missing keys."""
+
+    @abstractmethod
+    def set_many(self, items: dict[str, bytes], ttl: float) -> None:
+        """Store several values, each expiring after `ttl` seconds."""
+
+    @abstractmethod
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        """Store a value only if the key is missing, return if it was stored."""
+
+    @abstractmethod
+    def delete(self, *keys: str) -> None:
+        """Remove keys, missing keys are ignored."""
+
+    def get(self, key: str) -> bytes | None:
+        return self.get_many([key])[0]
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self.set_many({key: value}, ttl)
+
+    def get_or_set(self, key: str, loader: Callable[[], bytes], ttl: float) -> bytes:
+        """
+        The cached value of `key`, or the result of `loader` which is then
+        stored. Concurrent misses of a key run `loader` only once.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._flights_lock:
+            flight = self._flights.setdefault(key, threading.Lock())
+        with flight:
+            try:
+                # a concurrent caller may have loaded it while we waited
+                value = self.get(key)
+                if value is None:
+                    value = self._load(key, loader, ttl)
+            finally:
+                with self._flights_lock:
+                    if self._flights.get(key) is flight:
+                        del self._flights[key]
+        return value
+
+    def _load(self, key: str, loader: Callable[[], bytes], ttl: float) -> bytes:
+        value = loader()
+        CACHE_LOADS.labels(self.name).inc()
+        self.set(key, value, ttl)
+        return value
+
+    def _count(self, values: list[bytes | None]) -> list[bytes | None]:
+        hits = sum(value is not None for value in values)
+        CACHE_REQUESTS.labels(self.name, "hit").inc(hits)
+        CACHE_REQUESTS.labels(self.name, "miss").inc(len(values) - hits)
+        return values
+
+    def close(self) -> None:
+        """Release connections."""
+
+
+class LocalBackend(CacheBackend):
+    """In-process LRU cache, evicting the least recently used entry when full."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        super().__init__()
+        self.max_entries = max_entries
+        # key -> (expiry on the monotonic clock, value)
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: list[str]) -> list[bytes | None]:
+        now = time.monotonic()
+        values: list[bytes | None] = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] <= now:
+                    del self._entries[key]
+                    entry = None
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                values.append(entry[1] if entry is not None else None)
+        return self._count(values)
+
+    def set_many(self, items: dict[str, bytes], ttl: float) -> None:
+        expires = time.monotonic() + ttl
+        with self._lock:
+            for key, value in items.items():
+                self._entries[key] = (expires, value)
+                self._entries.move_to_end(key)
+            self._evict()
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                return False
+            self._entries[key] = (now + ttl, value)
+            self._entries.move_to_end(key)
+            self._evict()
+        return True
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            CACHE_EVICTIONS.inc()
+
+
+class RedisBackend(CacheBackend):
+    """Cache on a server speaking the Redis protocol."""
+
+    name = "redis"
+
+    def __init__(
+        self,
+        url: str = CACHE_URL,
+        client=None,
+        lock_timeout: float = CACHE_LOCK_TIMEOUT,
+    ):
+        super().__init__()
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url, socket_timeout=1.0)
+        self.client = client
+        self.lock_timeout = lock_timeout
+        self._release_lock = client.register_script(RELEASE_LOCK_SCRIPT)
+
+    def get_many(self, keys: list[str]) -> list[bytes | None]:
+        if not keys:
+            return []
+        try:
+            values = self.client.mget(keys)
+        except Exception as e:
+            self._failed("get", e)
+            values = [None] * len(keys)
+        return self._count(values)
+
+    def set_many(self, items: dict[str, bytes], ttl: float) -> None:
+        if not items:
+            return
+        try:
+            pipeline = self.client.pipeline(transaction=False)
+            for key, value in items.items():
+                pipeline.set(key, value, px=max(1, int(ttl * 1000)))
+            pipeline.execute()
+        except Exception as e:
+            self._failed("set", e)
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        try:
+            return bool(
+                self.client.set(key, value, nx=True, px=max(1, int(ttl * 1000)))
+            )
+        except Exception as e:
+            self._failed("add", e)
+            # without the server nothing can be reserved, let the caller proceed
+            return True
+
+    def delete(self, *keys: str) -> None:
+        if not keys:
+            return
+        try:
+            self.client.delete(*keys)
+        except Exception as e:
+            self._failed("delete", e)
+
+    def _load(self, key: str, loader: Callable[[], bytes], ttl: float) -> bytes:
+        lock_key = f"{key}:lock"
+        token = secrets.token_hex(16)
+        deadline = time.monotonic() + self.lock_timeout
+        try:
+            locked = self.client.set(
+                lock_key, token, nx=True, px=int(self.lock_timeout * 1000)
+            )
+        except Exception as e:
+            self._failed("lock", e)
+            return super()._load(key, loader, ttl)
+
+        if not locked:
+            # another replica is loading, wait for its value
+            while time.monotonic() < deadline:
+                time.sleep(LOCK_POLL_INTERVAL)
+                value = self.get(key)
+                if value is not None:
+                    return value
+            return super()._load(key, loader, ttl)
+
+        try:
+            return super()._load(key, loader, ttl)
+        finally:
+            try:
+                self._release_lock(keys=[lock_key], args=[token])
+            except Exception as e:
+                self._failed("unlock", e)
+
+    def _failed(self, operation: str, error: Exception) -> None:
+        CACHE_ERRORS.labels(self.name).inc()
+        rate_limited("cache_backend.failed").warning(
+            f"Cache {operation} failed: {error}"
+        )
+
+    def close(self) -> None:
+        self.client.close()
+
+
+_cache: CacheBackend | None = None
+
+
+def create_cache_backend(backend: str = CACHE_BACKEND) -> CacheBackend:
+    backends = {
+        "memory": LocalBackend,
+        "redis": RedisBackend,
+    }
+    try:
+        return backends[backend]()
+    except KeyError:
+        raise ValueError(f"Unknown cache backend: {backend}")
+
+
+def get_cache() -> CacheBackend:
+    """Return the cache of this process, created on first use."""
+    global _cache
+    if _cache is None:
+        _cache = create_cache_backend()
+    return _cache
+
+
+def set_cache(cache: CacheBackend | None) -> None:
+    """Replace the cache of this process, e.g. in tests."""
+    global _cache
+    _cache = cache
+
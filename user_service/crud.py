@@ -53,6 +53,17 @@ def get_user(db: Session) -> list[schemes.UserOut]:
     return db.execute(items).scalars().all()
 
 
+def get_user_ids(db: Session, after_id: int = 0, limit: int = 1000) -> list[int]:
+    """Get user ids in ascending order, keyset paginated by `after_id`."""
+    items = (
+        select(models.User.id)
+        .where(models.User.id > after_id)
+        .order_by(models.User.id)
+        .limit(limit)
+    )
+    return db.execute(items).scalars().all()
+
+
 def delete_user(db: Session, user_id: int) -> None:
     try:
         # Fetch the user instance to ensure it exists
@@ -5,11 +5,11 @@
 
 echo "PostgreSQL is up and running\n"
 
-# Run Alembic migrations
+# Run Alembic migrations, skipped if the database is current
 echo "Starting the migration process...\n"
-alembic upgrade head
+python migrate.py || exit 1
 
 # Start the Uvicorn server
 echo "Starting the Uvicorn server...\n"
-exec uvicorn main:app --host 0.0.0.0 --port 8001 --reload
+exec python server.py --port 8001
 
@@ -1,16 +1,11 @@
-import json
-import sys
-
-import pika
+import tracing
+from broker import get_broker
 from loguru import logger
 
 
-logger.add(sys.stderr, format="{level} {time} {message}", colorize=True, level="INFO")
-
-
 def publish_user_delete_event(event):
     """
-    Publishes a user deletion event to a RabbitMQ fanout exchange,
+    Publishes a user deletion event to the user events fanout exchange,
     broadcasting it to all consumers subscribed to the exchange.
 
     This function implements the publish side of the publish-subscribe
@@ -27,15 +22,11 @@ def publish_user_delete_event(event):
         user ID, timestamp, and deletion reason.
 
     Steps:
-        1. Establishes a connection to the RabbitMQ server using
-           `pika.BlockingConnection`.
-        2. Declares a fanout exchange named "user_events_exchange". If
-           it doesn't exist, RabbitMQ will create it.
-        3. Publishes the event to the exchange, broadcasting it to all
-           queues bound to this exchange. No routing key is needed for
-           fanout exchanges, so an empty string `routing_key=""` is
-           used.
-        4. Closes the connection to RabbitMQ after the message is sent.
+        1. Gets the broker of this process, selected by the
+           BROKER_BACKEND environment variable (see `broker.py`).
+        2. Publishes the event to the "user_events_exchange" fanout
+           exchange, broadcasting it to all queues bound to it. The
+           current trace context is sent as `traceparent` header.
 
     Notes:
         - Consumers must bind their queues to the
@@ -54,21 +45,5 @@ def publish_user_delete_event(event):
     """
     logger.info("publish_user_delete_event")
 
-    # Establish a connection to RabbitMQ
-    connection = pika.BlockingConnection(pika.ConnectionParameters("rabbitmq"))
-    channel = connection.channel()
-
-    # Declare a fanout exchange (broadcasts messages to all bound queues)
-    channel.exchange_declare(
-        exchange="user_events_exchange",
-        exchange_type="fanout",
-        # durable=True,
-    )
-
-    # Publish the event to the fanout exchange (no routing key needed for fanout)
-    channel.basic_publish(
-        exchange="user_events_exchange", routing_key="", body=json.dumps(event)
-    )
-
-    # Close the connection
-    connection.close()
+    with tracing.start_span("publish USER_DELETED", kind=tracing.SPAN_KIND_CLIENT):
+        get_broker().publish(event, headers=tracing.inject({}))
@@ -0,0 +1,128 @@
+"""
+Logging Configuration Module
+
+Configures loguru once per process, modules only import `logger`.
+
+All records go to a single sink on stderr. The sink is enqueued, so the
+request thread only puts the record on a queue and a background thread
+writes it. The output is JSON (one object per line) unless LOG_FORMAT is
+`text`.
+
+- LOG_LEVEL: Default minimum level (INFO).
+- LOG_LEVELS: Minimum levels per module, e.g. `crud=WARNING,events=DEBUG`.
+- LOG_FORMAT: `json` (default) or `text`.
+- LOG_SAMPLE_RATE: Fraction of hot path records (e.g. the per-request SQL
+  summary) which are written.
+
+Key Components:
+- configure: Replaces all sinks with the configured one.
+- rate_limited: Logger for a key, which drops records above a rate.
+- sampled: Logger which drops all but a fraction of the records.
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+
+from loguru import logger
+
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+
+TEXT_FORMAT = "<level>{level}</level> {time} {name} {message}"
+
+
+def parse_levels(spec: str) -> dict[str, str]:
+    """Parse `module=LEVEL,module=LEVEL` into a dict."""
+    levels = {}
+    for item in spec.split(","):
+        if "=" in item:
+            module, level = item.split("=", 1)
+            levels[module.strip()] = level.strip().upper()
+    return levels
+
+
+def configure(
+    level: str = LOG_LEVEL,
+    levels: str | dict[str, str] = LOG_LEVELS,
+    format: str = LOG_FORMAT,
+    sink=sys.stderr,
+    enqueue: bool = True,
+) -> None:
+    if isinstance(levels, str):
+        levels = parse_levels(levels)
+    module_levels = {"": level.upper(), **levels}
+    logger.remove()
+    logger.add(
+        sink,
+        # the per-module levels decide, the sink level only lets them through
+        level=min(logger.level(name).no for name in module_levels.values()),
+        filter=module_levels,
+        format=TEXT_FORMAT,
+        serialize=format == "json",
+        colorize=format == "text" and getattr(sink, "isatty", lambda: False)(),
+        enqueue=enqueue,
+    )
+
+
+class _Discard:
+    """Stands in for the logger when a record is dropped."""
+
+    def _discard(self, *args, **kwargs) -> None:
+        pass
+
+    debug = info = success = warning = error = exception = log = _discard
+
+    def bind(self, **kwargs) -> "_Discard":
+        return self
+
+
+_DISCARD = _Discard()
+
+
+class _Bucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.suppressed = 0
+
+
+_buckets: dict[str, _Bucket] = {}
+_lock = threading.Lock()
+
+
+def rate_limited(key: str, rate: float = 1.0, burst: int = 10):
+    """
+    Return the logger if records for `key` are below `rate` per second
+    (allowing bursts of `burst`), else a logger which drops the record.
+
+    Records after a suppressed period carry the number of dropped records in
+    the `suppressed` extra field.
+    """
+    with _lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = _buckets[key] = _Bucket(rate, burst)
+        now = time.monotonic()
+        bucket.tokens = min(
+            bucket.burst, bucket.tokens + (now - bucket.updated) * bucket.rate
+        )
+        bucket.updated = now
+        if bucket.tokens < 1:
+            bucket.suppressed += 1
+            return _DISCARD
+        bucket.tokens -= 1
+        suppressed, bucket.suppressed = bucket.suppressed, 0
+    return logger.bind(suppressed=suppressed) if suppressed else logger
+
+
+def sampled(rate: float = LOG_SAMPLE_RATE):
+    """Return the logger for a `rate` fraction of calls, else drop the record."""
+    return logger if random.random() < rate else _DISCARD
@@ -1,37 +1,64 @@
-import sys
+from contextlib import asynccontextmanager
 
+import authentication
 import database
+import idempotency
+import logging_config
+import loop_monitor
+import metrics
+import profiling
+import tracing
 from fastapi import FastAPI, Request, status
 from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 from loguru import logger
 from routers.auth import router as auth_router
+from routers.internal import router as internal_router
 from routers.user import router as user_router
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logging_config.configure()
+    database.init_db()
+    await loop_monitor.monitor.start()
+    yield
+    await loop_monitor.monitor.stop()
+
+
 def get_app():
     app = FastAPI(
         openapi_url="/users/openapi.json",
         docs_url="/users/docs",
         title="User Microservice",
+        lifespan=lifespan,
+    )
+
+    # innermost, so replayed responses are measured and traced as well
+    app.add_middleware(
+        idempotency.IdempotencyMiddleware,
+        prefix="user",
+        secret_key=authentication.SECRET_KEY,
+        algorithm=authentication.ALGORITHM,
+        anonymous_paths={"/users/"},
     )
+    app.add_middleware(database.SqlTimingMiddleware)
+    app.add_middleware(metrics.MetricsMiddleware)
+    app.add_route("/metrics", metrics.metrics_endpoint, include_in_schema=False)
+
+    tracing.configure(service_name="user-service")
+    app.add_middleware(tracing.TracingMiddleware)
+    app.add_middleware(profiling.ProfilingMiddleware)
 
     app.include_router(auth_router)
     app.include_router(user_router)
+    app.include_router(internal_router)
 
     return app
 
 
-logger.add(
-    sys.stderr,
-    format="<level>{level}</level> {time} {message}",
-    colorize=True,
-    level="INFO",
-)
-
 app = get_app()
-database.init_db()
 
 
 @app.exception_handler(RequestValidationError)
@@ -0,0 +1,102 @@
+"""
+Startup Migrations
+
+Brings the database to the head revision before the server starts, run by
+the entrypoint of every container. Replicas starting together must not all
+run `alembic upgrade head`, so:
+
+1. The current revision is compared with the head revision of the scripts,
+   one query on `alembic_version`. If they match, nothing else happens, so
+   up-to-date replicas start in parallel.
+2. Otherwise a Postgres advisory lock (MIGRATION_LOCK_ID) is taken, the
+   revision is checked again (another replica may have migrated meanwhile)
+   and the upgrade runs on the locked connection. Replicas waiting for the
+   lock find the database current afterwards and skip.
+
+The database is DATABASE_URL, or `sqlalchemy.url` of alembic.ini if unset.
+Databases other than Postgres are migrated without a lock.
+
+Usage (from the service directory):
+
+    python migrate.py
+"""
+
+import os
+import time
+import zlib
+
+import logging_config
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from loguru import logger
+from sqlalchemy import create_engine, pool, text
+from sqlalchemy.engine import Connection
+
+
+ALEMBIC_CONFIG = os.getenv("ALEMBIC_CONFIG", "alembic.ini")
+MIGRATION_LOCK_ID = int(
+    os.getenv("MIGRATION_LOCK_ID", zlib.crc32(b"alembic upgrade head"))
+)
+
+
+def alembic_config(path: str = ALEMBIC_CONFIG) -> Config:
+    config = Config(path)
+    url = os.getenv("DATABASE_URL")
+    if url:
+        # the ini file interpolates %, e.g. in url encoded passwords
+        config.set_main_option("sqlalchemy.url", url.replace("%", "%%"))
+    return config
+
+
+def is_current(connection: Connection, script: ScriptDirectory) -> bool:
+    """True if the database is at the head revision(s) of the scripts."""
+    context = MigrationContext.configure(connection)
+    return set(context.get_current_heads()) == set(script.get_heads())
+
+
+def migrate(config: Config, lock_id: int = MIGRATION_LOCK_ID) -> bool:
+    """Upgrade to head unless the database is current, return if it upgraded."""
+    script = ScriptDirectory.from_config(config)
+    engine = create_engine(
+        config.get_main_option("sqlalchemy.url"), poolclass=pool.NullPool
+    )
+    with engine.connect() as connection:
+        current = is_current(connection, script)
+        connection.rollback()
+        if current:
+            logger.info("Database is at the head revision, skipping migrations")
+            return False
+
+        locking = connection.dialect.name == "postgresql"
+        if locking:
+            start = time.perf_counter()
+            connection.execute(text("SELECT pg_advisory_lock(:id)"), {"id": lock_id})
+            connection.commit()
+            waited = time.perf_counter() - start
+            logger.info(f"Migration lock taken after {waited:.2f}s")
+        try:
+            if is_current(connection, script):
+                connection.rollback()
+                logger.info("Database was migrated by another replica")
+                return False
+            connection.rollback()
+            # env.py runs the migrations on this connection, inside the lock
+            config.attributes["connection"] = connection
+            command.upgrade(config, "head")
+            connection.commit()
+            logger.info("Database upgraded to the head revision")
+            return True
+        finally:
+            if locking:
+                connection.rollback()
+                connection.execute(
+                    text("SELECT pg_advisory_unlock(:id)"), {"id": lock_id}
+                )
+                connection.commit()
+
+
+if __name__ == "__main__":
+    logging_config.configure()
+    migrate(alembic_config())
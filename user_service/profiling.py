@@ -0,0 +1,177 @@
+"""
+Profiling Module
+
+Opt-in statistical profiler for single requests.
+
+When enabled (PROFILING_ENABLED), a request is profiled if it carries the
+`x-profile` header (with the value of PROFILING_TOKEN, if one is set) or is
+picked by PROFILING_SAMPLE_RATE. A background thread then samples the Python
+stacks of the process every PROFILING_INTERVAL seconds until the response is
+sent. The samples are written to PROFILING_DIR in the collapsed stack format
+(one `frame;frame;frame count` line per stack), which speedscope and
+flamegraph.pl read directly. The file name contains the route template and
+is returned in the `x-profile` response header.
+
+Samples cover all busy threads of the process, so concurrent requests show
+up in the profile as well. Only one request is profiled at a time. Requests
+which are not profiled cost a header lookup, or nothing if profiling is
+disabled.
+
+Key Components:
+- configure: Sets the options, defaults come from the environment.
+- Sampler: Thread sampling the stacks into collapsed stack counts.
+- ProfilingMiddleware: ASGI middleware profiling the selected requests.
+"""
+
+import os
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from loguru import logger
+
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true")
+PROFILING_DIR = os.getenv("PROFILING_DIR", "profiles")
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_INTERVAL = float(os.getenv("PROFILING_INTERVAL", "0.001"))
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN")
+PROFILE_HEADER = b"x-profile"
+
+# leaf functions of threads waiting for work, not worth a sample
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+}
+
+
+class Sampler:
+    """Samples the stacks of all other threads until stopped."""
+
+    def __init__(self, interval: float = PROFILING_INTERVAL, always: set | None = None):
+        self.interval = interval
+        # thread idents which are sampled even when idle, e.g. the event loop
+        self.always = always or set()
+        self.stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> Counter[str]:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                code = frame.f_code
+                leaf = (os.path.basename(code.co_filename), code.co_name)
+                if leaf in IDLE_FRAMES and ident not in self.always:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    filename = os.path.basename(code.co_filename)
+                    frames.append(f"{code.co_name} ({filename}:{frame.f_lineno})")
+                    frame = frame.f_back
+                frames.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(frames))] += 1
+
+
+_enabled = PROFILING_ENABLED
+_directory = Path(PROFILING_DIR)
+_sample_rate = PROFILING_SAMPLE_RATE
+_interval = PROFILING_INTERVAL
+_token = PROFILING_TOKEN
+_busy = threading.Lock()
+
+
+def configure(
+    enabled: bool = PROFILING_ENABLED,
+    directory: str | Path = PROFILING_DIR,
+    sample_rate: float = PROFILING_SAMPLE_RATE,
+    interval: float = PROFILING_INTERVAL,
+    token: str | None = PROFILING_TOKEN,
+) -> None:
+    global _enabled, _directory, _sample_rate, _interval, _token
+    _enabled = enabled
+    _directory = Path(directory)
+    _sample_rate = sample_rate
+    _interval = interval
+    _token = token
+
+
+def write_profile(stacks: Counter[str], name: str) -> Path:
+    """Write the samples in the collapsed stack format and return the path."""
+    _directory.mkdir(parents=True, exist_ok=True)
+    path = _directory / f"{name}.collapsed"
+    with open(path, "w") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    return path
+
+
+def _triggered(scope) -> bool:
+    for key, value in scope["headers"]:
+        if key == PROFILE_HEADER:
+            return _token is None or value.decode("latin-1") == _token
+    return _sample_rate > 0 and random.random() < _sample_rate
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling requests selected by header or sample rate."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not _enabled or scope["type"] != "http" or not _triggered(scope):
+            return await self.app(scope, receive, send)
+        if not _busy.acquire(blocking=False):
+            return await self.app(scope, receive, send)
+
+        profile_id = secrets.token_hex(4)
+        name = None
+
+        def profile_name() -> str:
+            # the route is known once the router matched the request
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            slug = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_") or "root"
+            timestamp = time.strftime("%Y%m%d-%H%M%S")
+            return f"{timestamp}-{scope['method']}-{slug}-{profile_id}"
+
+        async def send_wrapper(message):
+            nonlocal name
+            if message["type"] == "http.response.start":
+                name = profile_name()
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile", f"{name}.collapsed".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        sampler = Sampler(_interval, always={threading.get_ident()})
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            stacks = sampler.stop()
+            _busy.release()
+            try:
+                path = write_profile(stacks, name or profile_name())
+                logger.info(f"Profile of {scope['method']} {scope['path']}: {path}")
+            except OSError as e:
+                logger.error(f"Profile could not be written: {e}")
@@ -0,0 +1,40 @@
+"""
+Internal endpoints for service-to-service communication.
+
+These routes are not proxied by the API gateway, which only forwards the
+`users`, `token`, `trackings` and `details` prefixes. Callers must also send
+the shared INTERNAL_TOKEN as `X-Internal-Token` header, as the service may be
+reachable without the gateway.
+"""
+
+import crud
+from authentication import verify_internal_token
+from database import get_db
+from fastapi import APIRouter, Depends, Query
+from schemes import UserIdsOut
+from sqlalchemy.orm import Session
+
+
+router = APIRouter(
+    prefix="/internal",
+    tags=["Internal"],
+    include_in_schema=False,
+    dependencies=[Depends(verify_internal_token)],
+)
+
+
+@router.get("/users/ids", response_model=UserIdsOut)
+def get_user_ids(
+    after_id: int = 0,
+    limit: int = Query(default=1000, gt=0, le=10000),
+    db: Session = Depends(get_db),
+) -> UserIdsOut:
+    """
+    List user ids in ascending order, one page at a time.
+
+    Pass the returned `next_after_id` as `after_id` to get the next page.
+    `next_after_id` is null on the last page.
+    """
+    ids = crud.get_user_ids(db, after_id, limit)
+    next_after_id = ids[-1] if len(ids) == limit else None
+    return UserIdsOut(ids=ids, next_after_id=next_after_id)
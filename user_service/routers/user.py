@@ -1,10 +1,11 @@
 import authentication
 import crud
+import database
 from authentication import get_current_user
 from database import get_db
 from enums import Role
 from events import publish_user_delete_event
-from fastapi import APIRouter, Depends, HTTPException, Security, status
+from fastapi import APIRouter, Depends, HTTPException, Response, Security, status
 from loguru import logger
 from schemes import UserCreate, UserOut, UserUpdate
 from sqlalchemy.orm import Session
@@ -13,6 +14,22 @@ from sqlalchemy.orm import Session
 router = APIRouter(prefix="/users", tags=["User"])
 
 
+@router.get("/health/live", include_in_schema=False)
+async def liveness() -> dict:
+    """The process is running and serves requests."""
+    return {"status": "ok"}
+
+
+@router.get("/health/ready", include_in_schema=False)
+def readiness(response: Response) -> dict:
+    """The database is reachable."""
+    checks = {"database": database.check_connection()}
+    ready = all(checks.values())
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {"status": "ok" if ready else "unavailable", "checks": checks}
+
+
 @router.get("/me", response_model=UserOut)
 def read_users_me(
     current_user: UserOut = Security(get_current_user, scopes=["me"])
@@ -28,6 +28,11 @@ class UserOut(BaseModel):
     role: Role | None = None
 
 
+class UserIdsOut(BaseModel):
+    ids: list[int]
+    next_after_id: int | None = None
+
+
 class UserAuth(BaseModel):
     email: EmailStr
     password: constr(min_length=4)
@@ -0,0 +1,94 @@
+"""
+Server Launcher
+
+Starts uvicorn for this service. APP_ENV selects the mode:
+
+- development (default): one process, reloads on code changes.
+- production: WEB_CONCURRENCY worker processes (default: one per available
+  CPU), uvloop and httptools if they are installed, no access log, and
+  graceful draining: on SIGTERM the workers stop accepting connections and
+  finish running requests for up to GRACEFUL_TIMEOUT seconds.
+
+Further settings for production: KEEP_ALIVE_TIMEOUT (seconds an idle
+keep-alive connection is kept open, default 30, keep it above the idle
+timeout of the proxy in front), BACKLOG (pending connections, default 2048),
+LIMIT_CONCURRENCY (connections per worker before answering 503) and
+MAX_REQUESTS (restart a worker after that many requests).
+
+Several workers with CACHE_BACKEND=memory log a warning on startup: every
+worker then has its own cache, so Idempotency-Key records and cached entries
+are not shared between them.
+
+Usage:
+
+    python server.py --port 8002
+"""
+
+import argparse
+import importlib.util
+import logging
+import os
+
+import uvicorn
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on, respecting affinity (e.g. in containers)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _optional_int(value: str | None) -> int | None:
+    return int(value) if value else None
+
+
+def uvicorn_options(env=os.environ) -> dict:
+    """Return the uvicorn options for the mode selected by APP_ENV."""
+    if env.get("APP_ENV", "development") != "production":
+        return {"reload": True}
+
+    def installed(module: str) -> bool:
+        return importlib.util.find_spec(module) is not None
+
+    return {
+        "workers": int(env.get("WEB_CONCURRENCY", available_cpus())),
+        "loop": "uvloop" if installed("uvloop") else "asyncio",
+        "http": "httptools" if installed("httptools") else "h11",
+        "timeout_keep_alive": int(env.get("KEEP_ALIVE_TIMEOUT", "30")),
+        "backlog": int(env.get("BACKLOG", "2048")),
+        "limit_concurrency": _optional_int(env.get("LIMIT_CONCURRENCY")),
+        "limit_max_requests": _optional_int(env.get("MAX_REQUESTS")),
+        "timeout_graceful_shutdown": int(env.get("GRACEFUL_TIMEOUT", "30")),
+        "access_log": env.get("ACCESS_LOG", "false").lower() in ("1", "true"),
+        "proxy_headers": True,
+    }
+
+
+def cache_warning(options: dict, env=os.environ) -> str | None:
+    """Warning if several workers would each keep an in-process cache."""
+    workers = options.get("workers", 1)
+    if workers > 1 and env.get("CACHE_BACKEND", "memory") == "memory":
+        return (
+            f"{workers} workers with CACHE_BACKEND=memory do not share cached "
+            "entries and Idempotency-Key records, set CACHE_BACKEND=redis"
+        )
+    return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Start the service.")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    args = parser.parse_args()
+
+    options = uvicorn_options()
+    warning = cache_warning(options)
+    if warning:
+        logging.getLogger(__name__).warning(warning)
+    uvicorn.run("main:app", host=args.host, port=args.port, **options)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,22 @@
+from contextlib import contextmanager
+
+import cache_backend
 import events
+import models
 import pytest
 import routers
 from crud import create_user
-from database import get_db
+from database import Base, QueryStats, get_db, get_read_db
 from fastapi.testclient import TestClient
 from main import app
 from schemes import UserCreate
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session, declarative_base
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
 from sqlalchemy_utils import create_database, database_exists
 
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
-Base = declarative_base()
 
 
 def mock_publish_user_delete_event(event: dict):
@@ -44,15 +48,47 @@ def db(db_engine):
 @pytest.fixture(scope="function")
 def client(db):
     app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_read_db] = lambda: db
 
     app.dependency_overrides[
         routers.user.publish_user_delete_event
     ] = mock_publish_user_delete_event
+    cache_backend.set_cache(cache_backend.LocalBackend())
 
     with TestClient(app) as c:
         yield c
 
 
+@pytest.fixture
+def query_budget():
+    """
+    Fail the test if a block runs more SQL statements than declared.
+
+        with query_budget(4):
+            client.get("/users/me", headers=headers)
+    """
+
+    @contextmanager
+    def budget(max_queries: int):
+        stats = QueryStats()
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            stats.record(statement, 0.0)
+
+        event.listen(Engine, "after_cursor_execute", record)
+        try:
+            yield stats
+        finally:
+            event.remove(Engine, "after_cursor_execute", record)
+        if stats.count > max_queries:
+            pytest.fail(
+                f"Query budget exceeded: {stats.count} statements, "
+                f"{max_queries} allowed."
+            )
+
+    return budget
+
+
 @pytest.fixture(scope="function")
 def items(db):
     users = [
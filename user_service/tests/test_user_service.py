@@ -1,5 +1,7 @@
 from unittest.mock import MagicMock, patch
 
+import authentication
+import pytest
 from crud import get_user, get_user_by_email, get_user_by_id
 from fastapi import status
 
@@ -35,6 +37,27 @@ def test_create_user(client, db):
     assert get_user_by_email(db, "testuser@example.com").email == "testuser@example.com"
 
 
+def test_create_user_idempotency_key_replays_response(client, db, query_budget):
+    user = {
+        "name": "Test_User",
+        "email": "testuser@example.com",
+        "password": "password123",
+    }
+    headers = {"Idempotency-Key": "signup-1"}
+    response = client.post("/users/", json=user, headers=headers)
+    assert response.status_code == 201
+
+    # no lookup, no password hashing, no insert
+    with query_budget(0):
+        repeated = client.post("/users/", json=user, headers=headers)
+    assert repeated.status_code == 201
+    assert repeated.json() == response.json()
+    assert repeated.headers["Idempotent-Replayed"] == "true"
+
+    other = client.post("/users/", json={**user, "name": "Other"}, headers=headers)
+    assert other.status_code == 422
+
+
 def test_create_user_with_same_email(items, client, db):
     response = client.post(
         "/users/",
@@ -122,3 +145,51 @@ def test_delete_user(items, db, client, monkeypatch):
     # Verify that the user was actually deleted
     assert get_user_by_id(db, 2) is None
     mock_publish_event.assert_called_once_with({"type": "USER_DELETED", "user_id": 2})
+
+
+@pytest.fixture
+def internal_headers(monkeypatch):
+    monkeypatch.setattr(authentication, "INTERNAL_TOKEN", "internal")
+    return {"X-Internal-Token": "internal"}
+
+
+def test_get_user_ids_paginated(items, client, internal_headers):
+    response = client.get("/internal/users/ids?limit=1", headers=internal_headers)
+    assert response.status_code == 200
+    first_page = response.json()
+    assert len(first_page["ids"]) == 1
+
+    response = client.get(
+        f"/internal/users/ids?after_id={first_page['next_after_id']}&limit=1",
+        headers=internal_headers,
+    )
+    second_page = response.json()
+    assert second_page["ids"][0] > first_page["ids"][0]
+
+    response = client.get(
+        f"/internal/users/ids?after_id={second_page['next_after_id']}&limit=1",
+        headers=internal_headers,
+    )
+    assert response.json() == {"ids": [], "next_after_id": None}
+
+
+@pytest.mark.parametrize("headers", [{}, {"X-Internal-Token": "wrong"}])
+def test_get_user_ids_requires_internal_token(items, client, internal_headers, headers):
+    response = client.get("/internal/users/ids", headers=headers)
+    assert response.status_code == 401
+
+
+def test_get_user_ids_rejected_without_configured_token(items, client, monkeypatch):
+    monkeypatch.setattr(authentication, "INTERNAL_TOKEN", None)
+    response = client.get("/internal/users/ids", headers={"X-Internal-Token": ""})
+    assert response.status_code == 401
+
+
+def test_get_me_query_budget(items, client, query_budget):
+    data = {"username": "waldo@parillo.com", "password": "123456"}
+    token = client.post("/token", data=data).json()["access_token"]
+
+    with query_budget(1):
+        response = client.get("/users/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert "Server-Timing" in response.headers